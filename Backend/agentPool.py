@@ -0,0 +1,184 @@
+import asyncio
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class AgentPoolExhausted(Exception):
+    """Raised when no agent becomes free within the lease timeout"""
+
+
+class AgentPool:
+    """
+    Bounded pool of interchangeable agent wrappers shared by every session.
+
+    phi agents keep per-run state (run ids, memory), so an instance is leased to one
+    request at a time and reset before it goes back into the pool. Per-session state
+    lives in the session itself, never on the agent.
+
+    Agents are built lazily: the pool starts empty and only constructs a new agent
+    when a lease finds none idle and the pool is below its size, so startup and
+    session creation never pay for Groq client setup up front.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int, name: str = "agent"):
+        self.factory = factory
+        self.size = max(1, size)
+        self.name = name
+        # LIFO keeps the most recently used (warmest) agents in rotation
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._counters = {"leases": 0, "waits": 0, "timeouts": 0}
+        self._created = 0
+        # Model id and tool set of the agents. Read from the factory when it declares them, so the
+        # response cache works from the first request; otherwise known once the first agent is built
+        self.fingerprint = factory_fingerprint(factory)
+        self._construction = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0}
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """
+        Borrow an agent for the duration of a with-block.
+
+        Args:
+            timeout: Seconds to wait for a free agent. None waits indefinitely.
+
+        Raises:
+            AgentPoolExhausted: If no agent became free in time
+        """
+        try:
+            agent = self._idle.get_nowait()
+        except queue.Empty:
+            agent = self._create_if_room()
+
+        if agent is None:
+            with self._lock:
+                self._counters["waits"] += 1
+            try:
+                agent = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._counters["timeouts"] += 1
+                raise AgentPoolExhausted(f"No {self.name} agent available after {timeout}s")
+
+        with self._lock:
+            self._counters["leases"] += 1
+        try:
+            yield agent
+        finally:
+            _reset_agent(agent)
+            self._idle.put(agent)
+
+    @asynccontextmanager
+    async def alease(self, timeout: Optional[float] = None):
+        """
+        Async form of lease() for the ASGI app.
+
+        Construction runs in a worker thread, and waiting for a free agent polls the
+        idle queue with asyncio.sleep instead of blocking a thread, so a cancelled
+        request never leaves a thread behind holding an agent.
+
+        Raises:
+            AgentPoolExhausted: If no agent became free in time
+        """
+        try:
+            agent = self._idle.get_nowait()
+        except queue.Empty:
+            agent = await asyncio.to_thread(self._create_if_room)
+
+        if agent is None:
+            with self._lock:
+                self._counters["waits"] += 1
+            deadline = None if timeout is None else time.monotonic() + timeout
+            delay = 0.01
+            while agent is None:
+                try:
+                    agent = self._idle.get_nowait()
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        with self._lock:
+                            self._counters["timeouts"] += 1
+                        raise AgentPoolExhausted(f"No {self.name} agent available after {timeout}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.25)
+
+        with self._lock:
+            self._counters["leases"] += 1
+        try:
+            yield agent
+        finally:
+            _reset_agent(agent)
+            self._idle.put(agent)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["created"] = self._created
+            construction = dict(self._construction)
+        construction["avg_seconds"] = construction["total_seconds"] / construction["count"] if construction["count"] else 0.0
+        stats["construction"] = {key: round(value, 4) for key, value in construction.items()}
+        stats["size"] = self.size
+        stats["idle"] = self._idle.qsize()
+        return stats
+
+    def _create_if_room(self):
+        """Build a new agent if the pool has not reached its size yet, else return None"""
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            # Reserve the slot before the slow constructor runs outside the lock
+            self._created += 1
+
+        started = time.perf_counter()
+        try:
+            agent = self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            if self.fingerprint is None:
+                self.fingerprint = agent_fingerprint(agent)
+            self._construction["count"] += 1
+            self._construction["total_seconds"] += elapsed
+            self._construction["last_seconds"] = elapsed
+            self._construction["max_seconds"] = max(self._construction["max_seconds"], elapsed)
+        return agent
+
+
+def _describe(model_id, tools) -> str:
+    names = sorted(
+        getattr(tool, "name", None) or getattr(tool, "__name__", None) or type(tool).__name__
+        for tool in (tools or [])
+    )
+    return f"{model_id}|{','.join(names)}"
+
+
+def agent_fingerprint(agent) -> str:
+    """Describe what an agent answers with: its model id and the names of its tools"""
+    agent = getattr(agent, "agent", agent)
+    return _describe(getattr(getattr(agent, "model", None), "id", ""), getattr(agent, "tools", None))
+
+
+def factory_fingerprint(factory) -> Optional[str]:
+    """
+    agent_fingerprint of the agents a factory would build, read from its MODEL_ID and tools()
+    without building one; None if the factory does not declare them.
+    """
+    model_id = getattr(factory, "MODEL_ID", None)
+    tools = getattr(factory, "tools", None)
+    if model_id is None or not callable(tools):
+        return None
+    return _describe(model_id, tools())
+
+
+def _reset_agent(agent):
+    """Drop anything a run left behind so the next session starts clean"""
+    memory = getattr(getattr(agent, "agent", None), "memory", None)
+    if memory is not None and hasattr(memory, "clear"):
+        memory.clear()
+    agent.context = {}
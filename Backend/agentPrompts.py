@@ -0,0 +1,235 @@
+
+from itineraryTypes import ADJUSTMENT_JSON_SKELETON
+from promptEncoding import encode_itinerary_for_prompt
+
+# Prompts sent to the agents; app.py and asgiApp.py both build their queries here
+
+
+def suggest_places_query(destination, duration):
+    """Ask for numbered attractions; coordinates are added afterwards"""
+    return f"""Suggest top attractions and places to visit in {destination} for a {duration} trip.
+
+For each attraction you suggest:
+1. Provide a brief description
+2. Include the full name and location details
+3. Number each suggestion for easy reference (at least 5-7 attractions)
+
+IMPORTANT: DO NOT try to use any functions or tools in your response. Just list the attractions with descriptions.
+I will automatically get coordinates for all locations after receiving your response."""
+
+
+def suggest_accommodations_query(selected_places, destination):
+    """Ask for numbered accommodations near the selected places"""
+    return f"""Based on the user's interest in places {selected_places} in {destination}, suggest accommodation options in different budget ranges (budget, mid-range, luxury) that are conveniently located near these attractions.
+    
+    For each accommodation:
+    1. Provide name, description and approximate price range
+    2. Mention its proximity to selected attractions
+    3. Number each suggestion for easy reference (at least 3 options in different price ranges)
+    
+    IMPORTANT: DO NOT try to use any functions or tools in your response. Just list the accommodations with descriptions.
+    I will automatically get coordinates for all locations after receiving your response."""
+
+
+def itinerary_query(destination, duration, selected_places, selected_hotel, route_plan=None):
+    """Ask for the day-by-day itinerary from the user's selections, in routePlanner's order when there is one"""
+    route_section = ""
+    if route_plan:
+        route_section = f"""
+    VISIT ORDER (already grouped by day and ordered to keep travel short; straight-line distances):
+    {route_plan.replace(chr(10), chr(10) + "    ")}
+    Keep this day split and order unless opening hours make it impossible.
+    """
+    return f"""Create a detailed {duration} itinerary for {destination} including:
+    1. Day-by-day schedule visiting the places numbered {selected_places} that the user selected
+    2. Accommodation at hotel option {selected_hotel}
+    3. Transportation recommendations between attractions
+    4. Meal suggestions including local cuisine
+    5. Estimated budget breakdown for the entire trip
+    {route_section}
+    IMPORTANT: DO NOT try to use any functions or tools in your response. Just create the itinerary.
+    I will automatically add coordinates to the itinerary later.
+    
+    Organize by day and include estimated times for activities."""
+
+
+def transportation_query(itinerary):
+    """Ask for transportation between the destinations of an itinerary"""
+    return f"""Based on the following itinerary, search for and recommend the best transportation options (flights, trains, buses, etc.) between each destination:
+    {itinerary}
+    
+    For each leg of the journey:
+    1. Search for available transportation options (flight routes, train services, bus lines)
+    2. Find the websites where these can be booked
+    3. Include approximate costs, duration, and schedule information
+    4. Highlight the most convenient or cost-effective options
+    
+    Format your response by journey leg (e.g., "City A to City B") and include direct links to booking websites."""
+
+
+def accommodation_options_query(itinerary):
+    """Ask for bookable accommodation at each overnight stop"""
+    return f"""Based on the following itinerary, search for and recommend accommodation options at each destination:
+    {itinerary}
+    
+    For each destination where the traveler will stay overnight:
+    1. Search for hotel options in different price ranges (budget, mid-range, luxury)
+    2. Find the official websites or booking platforms where these accommodations can be reserved
+    3. Include approximate nightly rates, key amenities, and location advantages
+    4. Note any special deals or promotions currently available
+    
+    Format your response by destination and include direct links to booking websites for each recommended accommodation."""
+
+
+def local_transportation_query(itinerary):
+    """Ask for local transportation within each destination"""
+    return f"""Based on the following itinerary, search for and recommend local transportation options within each destination:
+    {itinerary}
+    
+    For each destination:
+    1. Search for public transportation options (metro, bus, tram, etc.)
+    2. Find information about ride-sharing services or taxis
+    3. Look for any transportation passes or cards that might save money
+    4. Include websites where tickets or passes can be purchased in advance
+    5. Mention transportation options between key attractions mentioned in the itinerary
+    
+    Format your response by destination and include direct links to official transportation websites or apps."""
+
+
+def comprehensive_plan_query(itinerary):
+    """Ask for the combined travel and booking guide"""
+    return f"""Create a comprehensive travel and booking plan based on this itinerary:
+    {itinerary}
+    
+    Include:
+    1. A complete day-by-day breakdown with all transportation and accommodation recommendations
+    2. Direct booking links for each recommended service
+    3. A suggested booking timeline (which bookings should be made first)
+    4. Estimated total budget for transportation and accommodations
+    5. Tips for getting the best deals on the recommended services
+    
+    Format this as a complete travel booking guide that the traveler can follow step by step."""
+
+
+def booking_plan_query(itinerary, transportation_options, accommodation_options, local_transportation):
+    """Merge already-researched booking options into the comprehensive plan without searching again"""
+    return f"""Create a comprehensive travel and booking plan for this itinerary:
+    {itinerary}
+    
+    The research is already done. Build the plan only from these findings:
+    
+    ## Transportation between destinations
+    {transportation_options}
+    
+    ## Accommodation options
+    {accommodation_options}
+    
+    ## Local transportation
+    {local_transportation}
+    
+    Include:
+    1. A complete day-by-day breakdown with all transportation and accommodation recommendations
+    2. Direct booking links for each recommended service, taken from the findings above
+    3. A suggested booking timeline (which bookings should be made first)
+    4. Estimated total budget for transportation and accommodations
+    5. Tips for getting the best deals on the recommended services
+    
+    IMPORTANT: DO NOT search again or use any tools. Everything you need is in the findings above.
+    
+    Format this as a complete travel booking guide that the traveler can follow step by step."""
+
+
+def _known_venues_section(location, radius_km, nearby_venues):
+    """Venues already known to be inside the radius, one "name | address | km" row each"""
+    if not nearby_venues:
+        return ""
+    rows = "\n".join(
+        f"        {venue['name']} | {venue.get('address') or '-'} | {venue['distance_km']} km"
+        for venue in nearby_venues
+    )
+    return f"""
+        KNOWN VENUES WITHIN {radius_km}km OF {location} (name | address | distance):
+{rows}
+        Prefer these venues when they suit the mood. Anything else you suggest must also be within {radius_km}km.
+        """
+
+
+def nearby_alternatives_query(activity_type, location, radius_km, mood_state, nearby_venues=None):
+    """Ask for venues near the traveler that suit their current mood"""
+    return f"""
+        Find alternative activities near {location} within {radius_km}km that match the mood: {mood_state}
+        
+        Original activity type: {activity_type}
+        {_known_venues_section(location, radius_km, nearby_venues)}
+        Search for:
+        1. Venues currently open
+        2. Activities suitable for "{mood_state}" mood
+        3. Real-time availability
+        4. Distance and travel time from {location}
+        5. Ratings and reviews
+        6. Price range
+        7. Booking requirements
+        
+        Provide at least 3-5 alternatives with complete details.
+        """
+
+
+# How adjust_itinerary_query asks for the answer: markdown sections for the legacy parser, or JSON
+# matching itineraryTypes.ItineraryAdjustment
+ADJUSTMENT_MARKDOWN_FORMAT = """        Format your response as:
+        ## 🚫 Activities to Cancel/Modify
+        [List with reasons]
+        
+        ## ✨ Recommended Alternatives
+        [Specific venues with details, availability, and booking info]
+        
+        ## 📅 Updated Schedule
+        [Revised timeline for rest of day]
+        
+        ## 💰 Cost Impact
+        [Any cost changes or savings]
+"""
+
+ADJUSTMENT_JSON_FORMAT = f"""        Respond with ONLY a JSON object, without markdown fences or any text around it, in exactly this shape:
+        {ADJUSTMENT_JSON_SKELETON}
+        List every remaining activity of the day in updated_schedule, in time order.
+"""
+
+
+def travel_times_section(travel_times):
+    """The session's travel-time table (travelTimes.TravelTimeMatrix.to_prompt), if there is one"""
+    if not travel_times:
+        return ""
+    table = travel_times.replace("\n", "\n        ")
+    return f"""
+        TRAVEL TIMES IN MINUTES (row = from, column = to; use these instead of estimating):
+        {table}
+        """
+
+
+def adjust_itinerary_query(current_itinerary, mood_state, current_time, current_location, structured=False,
+                           travel_times=None):
+    """Ask for a mood-driven change to the rest of the day"""
+    response_format = ADJUSTMENT_JSON_FORMAT if structured else ADJUSTMENT_MARKDOWN_FORMAT
+    return f"""
+        CURRENT SITUATION:
+        - Time: {current_time}
+        - Location: {current_location}
+        - Group Mood/State: {mood_state}
+        
+        REMAINING ITINERARY FOR TODAY (one activity per row, columns as in the header):
+        {encode_itinerary_for_prompt(current_itinerary, current_time, kind="adjust_itinerary")}
+        {travel_times_section(travel_times)}
+        TASK: The group has reported they are "{mood_state}" at {current_time}. Please:
+        
+        1. Identify which activities should be CANCELED or MODIFIED based on this mood
+        2. Search for and suggest ALTERNATIVE activities that better match their current state
+        3. Find available slots and booking options for alternatives
+        4. Re-optimize the remaining schedule to:
+           - Reduce travel time if tired
+           - Add more engaging activities if energetic
+           - Prioritize food if hungry
+           - Move indoor if weather is bad
+        5. Provide specific venue names, addresses, and booking links
+        
+{response_format}        """
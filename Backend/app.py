@@ -1,101 +1,234 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import json
+import os
+import queue
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-import re
 
 # Import from the travel agent modules
-from geolocation import InteractiveTravelAgent, get_location_coordinates
+from geolocation import InteractiveTravelAgent, geocode, geocode_many, geocode_rate_limiter, geocode_circuit_breaker, geocode_flight
 from bookingAgent import TravelOptionsFinder
-from liveItineraryAgent import LiveItineraryAgent
+from liveItineraryAgent import LiveItineraryAgent, adjustment_stats, adjust_itinerary_locally
+from geocodeCache import geocode_cache
+from venueIndex import venue_index, parse_coordinates
+from travelTimes import route_locations, update_matrix, travel_time_stats
+from responseCache import response_cache, normalize_prompt
+from promptEncoding import prompt_encoding_stats
+from singleFlight import SingleFlight
+from agentPool import AgentPool, AgentPoolExhausted
+from sessionStore import create_session_store, start_expiry_thread
+from chatHistory import ChatHistory
+from agentPrompts import suggest_places_query, suggest_accommodations_query, booking_plan_query
+from responseProcessing import process_function_calls
+from extraction import extract_attractions, extract_hotels
+from routeHelpers import (
+    BOOKING_QUERIES, BOOKING_PLAN_SECTIONS, new_session, add_to_chat_history, parse_paging, session_info,
+    session_summaries, wants_stream, sse_event, drain_agent_stream, attraction_queries, places_suggested,
+    hotels_to_locate, accommodations_suggested, missing_itinerary_error, route_plan_queries, route_plan_from,
+    create_itinerary_query, start_booking_query, booking_plan_recorded, live_context, mood_updated,
+    travel_time_lookups, itinerary_view, patch_session_itinerary, itinerary_to_adjust,
+    itinerary_adjusted, live_agent_failure, alternatives_request, alternatives_cache_key
+)
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Sessions storage
-sessions = {}
+# Agents are shared by all sessions; each request leases one for the duration of its LLM call
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", 4))
+AGENT_LEASE_TIMEOUT = float(os.getenv("AGENT_LEASE_TIMEOUT", 30))
+travel_agents = AgentPool(InteractiveTravelAgent, AGENT_POOL_SIZE, "travel")
+booking_agents = AgentPool(TravelOptionsFinder, AGENT_POOL_SIZE, "booking")
+live_itinerary_agents = AgentPool(LiveItineraryAgent, AGENT_POOL_SIZE, "live itinerary")
+
+# Identical prompts already running (e.g. a trending destination during a spike) share one agent run
+agent_flight = SingleFlight("agent")
+
+# Most known venues listed in a find-alternatives prompt
+NEARBY_VENUE_LIMIT = int(os.getenv("NEARBY_VENUE_LIMIT", 15))
+
+# The booking plan researches its three sections side by side, each on its own leased agent.
+# One worker per booking agent: sections beyond that wait in the executor's queue rather than
+# on threads that would only sit blocked in booking_agents.lease()
+booking_plan_executor = ThreadPoolExecutor(max_workers=booking_agents.size, thread_name_prefix="booking-plan")
+# Longest a booking plan waits for its sections before answering 503
+BOOKING_PLAN_TIMEOUT = float(os.getenv("BOOKING_PLAN_TIMEOUT", 120))
+
+# Streamed runs are drained into a per-stream buffer on their own thread, so an agent returns
+# to its pool when the model finishes, not when a slow client has read the last chunk.
+# Each buffer holds at most one model reply; STREAM_MAX_CONCURRENT caps how many exist at once.
+STREAM_MAX_CONCURRENT = int(os.getenv("STREAM_MAX_CONCURRENT", 4 * AGENT_POOL_SIZE))
+stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONCURRENT)
+stream_executor = ThreadPoolExecutor(max_workers=STREAM_MAX_CONCURRENT, thread_name_prefix="agent-stream")
+
+# Sessions storage; SESSION_STORE selects memory, sqlite or redis so several workers can share sessions
+session_store = create_session_store()
+
+# Chat history is a bounded ring buffer; long responses are stored compressed
+CHAT_HISTORY_MAX_ENTRIES = int(os.getenv("CHAT_HISTORY_MAX_ENTRIES", 200))
+CHAT_COMPRESS_MIN_BYTES = int(os.getenv("CHAT_COMPRESS_MIN_BYTES", 1024))
+
+# Idle sessions are evicted in the background in last-activity order; no admin sweep needed
+start_expiry_thread(session_store, float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", 60)))
 
 def create_new_session():
-    """Create a new session with initialized agents"""
+    """Create a new session; agents come from the shared pools, so only context is stored"""
     session_id = str(uuid.uuid4())
-    sessions[session_id] = {
-        "travel_agent": InteractiveTravelAgent(),
-        "booking_agent": TravelOptionsFinder(),
-        "live_itinerary_agent": LiveItineraryAgent(),
-        "chat_history": [],
-        "created_at": datetime.now().isoformat(),
-        "last_active": datetime.now().isoformat(),
-        "current_itinerary": None,
-        "current_location": None
-    }
+    session_store.save(session_id, new_session(CHAT_HISTORY_MAX_ENTRIES, CHAT_COMPRESS_MIN_BYTES))
     return session_id
 
 def get_session(session_id):
     """Get session by ID or return None if not found"""
-    return sessions.get(session_id)
+    session = session_store.get(session_id)
+    if session is not None:
+        session["chat_history"] = load_chat_history(session["chat_history"])
+    return session
 
-def update_session_activity(session_id):
-    """Update the last active timestamp for a session"""
-    if session_id in sessions:
-        sessions[session_id]["last_active"] = datetime.now().isoformat()
+def load_chat_history(state):
+    """Turn stored chat history (already live, serialized, or a legacy list) into a ChatHistory"""
+    return ChatHistory.from_state(state, CHAT_HISTORY_MAX_ENTRIES, CHAT_COMPRESS_MIN_BYTES)
 
-def add_to_chat_history(session_id, source, message, response=None):
-    """Add a message to the chat history"""
-    if session_id in sessions:
-        entry = {
-            "timestamp": datetime.now().isoformat(),
-            "source": source,
-            "message": message
-        }
-        if response:
-            entry["response"] = response
-        
-        sessions[session_id]["chat_history"].append(entry)
+def save_session(session_id, session):
+    """Persist changes made to a session loaded with get_session"""
+    session_store.save(session_id, session)
 
-def process_function_calls(text):
-    """
-    Process all function calls in the text and replace them with their results
-    The format is expected to be <function=get_location_coordinates{"location_name": "Location Name"}></function>
-    or get_location_coordinates("Location Name")
+def update_session_activity(session_id, session):
+    """Update the last active timestamp for a session and persist it"""
+    session["last_active"] = datetime.now().isoformat()
+    save_session(session_id, session)
+
+def run_agent_query(pool, query):
+    """Run a query on a leased agent and return its text, joining an identical run already in flight"""
+    def run():
+        with pool.lease(AGENT_LEASE_TIMEOUT) as agent:
+            return agent.agent.run(query).content
+    
+    return agent_flight.do((pool.name, normalize_prompt(query)), run)
+
+def run_cached_query(pool, query, near_parts=None):
     """
-    # Process format: <function=get_location_coordinates{"location_name": "Location Name"}></function>
-    function_pattern = r'<function=get_location_coordinates\{\"location_name\"\s*:\s*\"([^\"]+)\"\}\}</function>'
-    matches = re.findall(function_pattern, text)
+    Answer a query from the shared response cache, or run it on a leased agent and cache the reply
     
-    for location_name in matches:
-        result = get_location_coordinates(location_name)
-        text = text.replace(f'<function=get_location_coordinates{{"location_name": "{location_name}"}}</function>', 
-                           f'**Coordinates**: {result}')
+    Args:
+        pool: AgentPool whose agents would answer the query
+        query: Prompt to send
+        near_parts: Variable parts of the request (e.g. destination and duration) for near-duplicate matching
+    """
+    cached = response_cache.get(query, pool.fingerprint, near_parts)
+    if cached is not None:
+        return cached
     
-    # Process format: get_location_coordinates("Location Name")
-    function_pattern2 = r'get_location_coordinates\(\"([^\"]+)\"\)'
-    matches = re.findall(function_pattern2, text)
+    content = run_agent_query(pool, query)
+    response_cache.set(query, pool.fingerprint, content, near_parts)
+    return content
+
+def record_stream_result(session_id, source, message, response):
+    """Add a finished stream's reply to the session as it is stored now, not as it was when the stream began"""
+    session = get_session(session_id)
+    if session is None:
+        # Deleted or expired while the agent was running
+        return
+    add_to_chat_history(session, source, message, response)
+    update_session_activity(session_id, session)
+
+def stream_agent_response(session_id, session, pool, query, history_message, result_key):
+    """
+    Stream an agent run to the client as Server-Sent Events.
     
-    for location_name in matches:
-        result = get_location_coordinates(location_name)
-        text = text.replace(f'get_location_coordinates("{location_name}")', 
-                           f'**Coordinates**: {result}')
+    Coordinates are filled in line by line as the text arrives. The run is read on
+    a stream_executor thread into a buffer the response drains, so the agent is
+    released as soon as the model finishes however slowly the client reads. The
+    session (with the request's own changes) is saved before the run starts, and
+    the full response is added to a freshly loaded copy once it is complete.
     
-    # Handle any function waiting patterns
-    waiting_patterns = [
-        r'(Waiting for the result of the function call.*?\n)',
-        r'(Please wait for the function result.*?\n)',
-        r'(Once I have the coordinates.*?\n)',
-        r'(\(Please provide the result of the function call\))'
-    ]
+    Streams always run the model: they skip the response cache and do not join an
+    identical run already in flight through agent_flight, since neither can replay
+    a run chunk by chunk.
     
-    for pattern in waiting_patterns:
-        text = re.sub(pattern, '', text)
+    Events:
+        chunk: {"content": "..."} for each piece of processed text
+        done: {result_key: full processed response}, the same body the JSON endpoint returns
+        error: {"error": "..."} if the run fails part way
     
-    return text
+    Raises:
+        AgentPoolExhausted: If STREAM_MAX_CONCURRENT streams are already open
+    """
+    if not stream_slots.acquire(blocking=False):
+        raise AgentPoolExhausted(f"{STREAM_MAX_CONCURRENT} streams already open")
+    update_session_activity(session_id, session)
+    events = queue.Queue()
+    
+    def run():
+        try:
+            with pool.lease(AGENT_LEASE_TIMEOUT) as agent:
+                processed_response = drain_agent_stream(
+                    agent, query, lambda text: events.put(("chunk", {"content": text})))
+            record_stream_result(session_id, "system", history_message, processed_response)
+            events.put(("done", {result_key: processed_response}))
+        except Exception as e:
+            record_stream_result(session_id, "system", f"Error while streaming: {history_message}", str(e))
+            events.put(("error", {"error": str(e)}))
+        finally:
+            events.put(None)
+            stream_slots.release()
+    
+    stream_executor.submit(run)
+    
+    def generate():
+        # A client that disconnects stops reading; the run still finishes and is recorded
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield sse_event(*event)
+    
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def error_response(error):
+    """A (body, status) pair from routeHelpers as a Flask response"""
+    body, status = error
+    return jsonify(body), status
+
+@app.errorhandler(AgentPoolExhausted)
+def handle_agent_pool_exhausted(error):
+    """All agents are busy; ask the client to retry instead of holding the worker"""
+    return jsonify({"error": "Service busy, please retry shortly", "details": str(error)}), 503
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
     return jsonify({"status": "healthy", "message": "Travel API is running"}), 200
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Runtime counters for caches and outbound calls"""
+    return jsonify({
+        "geocode_cache": geocode_cache.stats(),
+        "geocode_rate_limiter": geocode_rate_limiter.stats(),
+        "geocode_circuit_breaker": geocode_circuit_breaker.stats(),
+        "response_cache": response_cache.stats(),
+        "itinerary_adjustments": adjustment_stats(),
+        "prompt_encoding": prompt_encoding_stats.stats(),
+        "venue_index": venue_index.stats(),
+        "travel_times": travel_time_stats(),
+        "single_flight": {
+            "agent": agent_flight.stats(),
+            "geocode": geocode_flight.stats()
+        },
+        "agent_pools": {
+            "travel": travel_agents.stats(),
+            "booking": booking_agents.stats(),
+            "live_itinerary": live_itinerary_agents.stats()
+        }
+    }), 200
+
 @app.route('/sessions', methods=['POST'])
 def create_session():
     """Create a new session and return its ID"""
@@ -107,41 +240,37 @@ def create_session():
 
 @app.route('/sessions/<session_id>', methods=['GET'])
 def get_session_info(session_id):
-    """Get session information and chat history"""
+    """
+    Get session information and a page of chat history
+    
+    Query parameters:
+        cursor: id of the last chat entry already seen (omit to start at the oldest retained entry)
+        limit: number of chat entries to return (default 50, max 200)
+    """
     session = get_session(session_id)
     if not session:
         return jsonify({"error": "Session not found"}), 404
     
-    # Clean the session data to make it serializable
-    return jsonify({
-        "session_id": session_id,
-        "created_at": session["created_at"],
-        "last_active": session["last_active"],
-        "chat_history": session["chat_history"],
-        "travel_agent_context": session["travel_agent"].context,
-        "booking_agent_context": session["booking_agent"].context
-    }), 200
+    try:
+        # Parsed by hand: args.get(type=int) turns bad input into None instead of raising
+        cursor, limit = parse_paging(request.args)
+    except ValueError:
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+    
+    return jsonify(session_info(session_id, session, cursor, limit)), 200
 
 @app.route('/sessions/<session_id>', methods=['DELETE'])
 def delete_session(session_id):
     """Delete a session"""
-    if session_id not in sessions:
+    if not session_store.delete(session_id):
         return jsonify({"error": "Session not found"}), 404
     
-    del sessions[session_id]
     return jsonify({"message": "Session deleted successfully"}), 200
 
 @app.route('/sessions', methods=['GET'])
 def list_sessions():
     """List all active sessions"""
-    session_list = [{
-        "session_id": sid,
-        "created_at": data["created_at"],
-        "last_active": data["last_active"],
-        "message_count": len(data["chat_history"])
-    } for sid, data in sessions.items()]
-    
-    return jsonify({"sessions": session_list}), 200
+    return jsonify({"sessions": session_summaries(session_store.items(), load_chat_history)}), 200
 
 @app.route('/sessions/<session_id>/coordinates', methods=['POST'])
 def get_coordinates(session_id):
@@ -155,15 +284,16 @@ def get_coordinates(session_id):
         return jsonify({"error": "Location name is required"}), 400
     
     location_name = data['location']
-    add_to_chat_history(session_id, "user", f"Get coordinates for: {location_name}")
+    add_to_chat_history(session, "user", f"Get coordinates for: {location_name}")
     
-    # Pass location_name as a string directly to match geolocation.py implementation
-    coordinates = get_location_coordinates(location_name)
+    geocode_result = geocode(location_name)
+    coordinates = geocode_result.to_legacy_string()
     
-    add_to_chat_history(session_id, "system", f"Returning coordinates", coordinates)
-    update_session_activity(session_id)
+    add_to_chat_history(session, "system", "Returning coordinates", coordinates)
+    update_session_activity(session_id, session)
     
-    return jsonify({"result": coordinates}), 200
+    # "result" keeps the legacy string form; "geo" carries float coordinates and status
+    return jsonify({"result": coordinates, "geo": geocode_result.to_dict()}), 200
 
 @app.route('/sessions/<session_id>/suggest-places', methods=['POST'])
 def suggest_places(session_id):
@@ -176,78 +306,32 @@ def suggest_places(session_id):
     if not data or 'destination' not in data or 'duration' not in data:
         return jsonify({"error": "Destination and duration are required"}), 400
     
-    travel_agent = session["travel_agent"]
+    travel_context = session["travel_context"]
     destination = data['destination']
     duration = data['duration']
     
-    add_to_chat_history(session_id, "user", f"Suggest places in {destination} for {duration}")
+    add_to_chat_history(session, "user", f"Suggest places in {destination} for {duration}")
     
     # Store the data in the agent's context
-    travel_agent.context["destination"] = destination
-    travel_agent.context["duration"] = duration
+    travel_context["destination"] = destination
+    travel_context["duration"] = duration
     
-    query = f"""Suggest top attractions and places to visit in {destination} for a {duration} trip.
-
-For each attraction you suggest:
-1. Provide a brief description
-2. Include the full name and location details
-3. Number each suggestion for easy reference (at least 5-7 attractions)
-
-IMPORTANT: DO NOT try to use any functions or tools in your response. Just list the attractions with descriptions.
-I will automatically get coordinates for all locations after receiving your response."""
-    
-    response = travel_agent.agent.run(query)
+    # Popular destinations are asked for constantly, so answers are shared across sessions
+    response = run_cached_query(travel_agents, suggest_places_query(destination, duration),
+                                ("suggest_places", destination, duration))
     
     # Process the response to replace any function calls with actual results
-    processed_response = process_function_calls(response.content)
-    
-    # Extract attraction names using regex - looking for numbered items with attraction names
-    attraction_pattern = r'\d+\.\s+\*\*([^*:]+)(?:\*\*|:)'
-    attractions = re.findall(attraction_pattern, processed_response)
-    
-    # Create a list to store attractions with coordinates
-    attractions_with_coords = []
+    processed_response = process_function_calls(response)
     
-    for attraction in attractions:
-        # Clean up the attraction name by removing any trailing asterisks and extra spaces
-        attraction_name = attraction.strip()
-        
-        # Only add the destination if it's not already included in the attraction name
-        if destination.lower() not in attraction_name.lower():
-            location_query = f"{attraction_name}, {destination}"
-        else:
-            location_query = attraction_name
-            
-        # Call get_coordinates function directly
-        coords_result = get_location_coordinates(location_query)
-        
-        # Add to our list
-        attractions_with_coords.append({
-            "name": attraction_name,
-            "location_query": location_query,
-            "coordinates": coords_result
-        })
-        
-        # Add coordinates after the attraction's description paragraph in the response
-        attraction_end = processed_response.find("\n\n", processed_response.find(attraction))
-        if attraction_end == -1:  # If we can't find a double newline, find the next numbered item
-            next_match = re.search(r'\d+\.\s+\*\*', processed_response[processed_response.find(attraction)+len(attraction):])
-            if next_match:
-                attraction_end = processed_response.find(attraction) + len(attraction) + next_match.start()
-            else:
-                attraction_end = len(processed_response)
-        
-        processed_response = processed_response[:attraction_end] + f"\n**Coordinates**: {coords_result}" + processed_response[attraction_end:]
+    # Every numbered attraction is geocoded in one concurrent batch
+    attractions = extract_attractions(processed_response)
+    location_queries = attraction_queries(attractions, destination)
+    coords_results = geocode_many(location_queries)
     
-    add_to_chat_history(session_id, "system", "Places suggestions", processed_response)
-    update_session_activity(session_id)
+    body = places_suggested(session, destination, duration, processed_response, attractions, location_queries, coords_results)
+    update_session_activity(session_id, session)
     
-    return jsonify({
-        "suggestions": processed_response,
-        "destination": destination,
-        "duration": duration,
-        "attractions_with_coordinates": attractions_with_coords
-    }), 200
+    return jsonify(body), 200
 
 @app.route('/sessions/<session_id>/select-places', methods=['POST'])
 def select_places(session_id):
@@ -260,12 +344,12 @@ def select_places(session_id):
     if not data or 'selected_places' not in data:
         return jsonify({"error": "Selected places are required"}), 400
     
-    travel_agent = session["travel_agent"]
+    travel_context = session["travel_context"]
     selected_places = data['selected_places']
     
-    add_to_chat_history(session_id, "user", f"Selected places: {selected_places}")
-    travel_agent.context["selected_places"] = selected_places
-    update_session_activity(session_id)
+    add_to_chat_history(session, "user", f"Selected places: {selected_places}")
+    travel_context["selected_places"] = selected_places
+    update_session_activity(session_id, session)
     
     return jsonify({
         "message": "Places selected successfully",
@@ -279,58 +363,31 @@ def suggest_accommodations(session_id):
     if not session:
         return jsonify({"error": "Session not found"}), 404
     
-    travel_agent = session["travel_agent"]
+    travel_context = session["travel_context"]
     
     # Check if required context is available
-    if "destination" not in travel_agent.context or "selected_places" not in travel_agent.context:
+    if "destination" not in travel_context or "selected_places" not in travel_context:
         return jsonify({"error": "Destination and selected places are required. Call /suggest-places and /select-places first"}), 400
     
-    add_to_chat_history(session_id, "user", "Request for accommodation suggestions")
-    
-    selected_places = travel_agent.context.get("selected_places", "")
-    destination = travel_agent.context.get("destination", "")
-    
-    query = f"""Based on the user's interest in places {selected_places} in {destination}, suggest accommodation options in different budget ranges (budget, mid-range, luxury) that are conveniently located near these attractions.
+    add_to_chat_history(session, "user", "Request for accommodation suggestions")
     
-    For each accommodation:
-    1. Provide name, description and approximate price range
-    2. Mention its proximity to selected attractions
-    3. Number each suggestion for easy reference (at least 3 options in different price ranges)
+    selected_places = travel_context.get("selected_places", "")
+    destination = travel_context.get("destination", "")
     
-    IMPORTANT: DO NOT try to use any functions or tools in your response. Just list the accommodations with descriptions.
-    I will automatically get coordinates for all locations after receiving your response."""
-    
-    response = travel_agent.agent.run(query)
+    response = run_cached_query(travel_agents, suggest_accommodations_query(selected_places, destination),
+                                ("suggest_accommodations", destination, selected_places))
     
     # Process the response to replace any function calls with actual results
-    processed_response = process_function_calls(response.content)
-    
-    # Post-process to add coordinates to each accommodation
-    # Extract hotel names using regex
-    hotel_pattern = r'\d+\.\s+\*\*([^:]+)(?:\*\*|:)'
-    hotels = re.findall(hotel_pattern, processed_response)
-    
-    for hotel in hotels:
-        # If coordinates for this hotel aren't already in the response
-        if f"{hotel}, {destination}" not in processed_response:
-            coords = get_location_coordinates(f"{hotel}, {destination}")
-            # Add coordinates after the hotel's description paragraph
-            hotel_end = processed_response.find("\n\n", processed_response.find(hotel))
-            if hotel_end == -1:  # If we can't find a double newline, find the next numbered item
-                next_match = re.search(r'\d+\.\s+\*\*', processed_response[processed_response.find(hotel)+len(hotel):])
-                if next_match:
-                    hotel_end = processed_response.find(hotel) + len(hotel) + next_match.start()
-                else:
-                    hotel_end = len(processed_response)
-            
-            processed_response = processed_response[:hotel_end] + f"\n**Coordinates**: {coords}" + processed_response[hotel_end:]
+    processed_response = process_function_calls(response)
     
-    add_to_chat_history(session_id, "system", "Accommodation suggestions", processed_response)
-    update_session_activity(session_id)
+    # Only look up hotels whose coordinates aren't already in the response, all in one batch
+    hotels, location_queries = hotels_to_locate(travel_context, processed_response, extract_hotels(processed_response))
+    hotel_coords = geocode_many(location_queries)
     
-    return jsonify({
-        "accommodations": processed_response
-    }), 200
+    body = accommodations_suggested(session, processed_response, hotels, hotel_coords)
+    update_session_activity(session_id, session)
+    
+    return jsonify(body), 200
 
 @app.route('/sessions/<session_id>/select-accommodation', methods=['POST'])
 def select_accommodation(session_id):
@@ -343,18 +400,25 @@ def select_accommodation(session_id):
     if not data or 'selected_hotel' not in data:
         return jsonify({"error": "Selected hotel is required"}), 400
     
-    travel_agent = session["travel_agent"]
+    travel_context = session["travel_context"]
     selected_hotel = data['selected_hotel']
     
-    add_to_chat_history(session_id, "user", f"Selected accommodation: {selected_hotel}")
-    travel_agent.context["selected_hotel"] = selected_hotel
-    update_session_activity(session_id)
+    add_to_chat_history(session, "user", f"Selected accommodation: {selected_hotel}")
+    travel_context["selected_hotel"] = selected_hotel
+    update_session_activity(session_id, session)
     
     return jsonify({
         "message": "Accommodation selected successfully",
         "selected_hotel": selected_hotel
     }), 200
 
+def plan_itinerary_route(travel_context):
+    """Day-by-day visit order for the selected places, or None if the session has no stored suggestions"""
+    queries = route_plan_queries(travel_context)
+    if queries is None:
+        return None
+    return route_plan_from(travel_context, geocode_many(queries))
+
 @app.route('/sessions/<session_id>/create-itinerary', methods=['POST'])
 def create_itinerary(session_id):
     """Create a detailed itinerary based on all selections"""
@@ -362,47 +426,55 @@ def create_itinerary(session_id):
     if not session:
         return jsonify({"error": "Session not found"}), 404
     
-    travel_agent = session["travel_agent"]
+    travel_context = session["travel_context"]
     
     # Check if required context is available
-    required_keys = ["destination", "duration", "selected_places", "selected_hotel"]
-    missing_keys = [key for key in required_keys if key not in travel_agent.context]
+    missing = missing_itinerary_error(travel_context)
+    if missing:
+        return error_response(missing)
     
-    if missing_keys:
-        return jsonify({
-            "error": f"Missing required information: {', '.join(missing_keys)}. Complete previous steps first."
-        }), 400
+    add_to_chat_history(session, "user", "Request to create itinerary")
     
-    add_to_chat_history(session_id, "user", "Request to create itinerary")
+    route_plan = plan_itinerary_route(travel_context)
+    query = create_itinerary_query(travel_context, route_plan)
     
-    destination = travel_agent.context.get("destination", "")
-    duration = travel_agent.context.get("duration", "")
-    selected_places = travel_agent.context.get("selected_places", "")
-    selected_hotel = travel_agent.context.get("selected_hotel", "")
+    if wants_stream(request.args, request.headers):
+        return stream_agent_response(session_id, session, travel_agents, query, "Generated itinerary", "itinerary")
+    
+    # Process the response to replace any function calls with actual results
+    processed_response = process_function_calls(run_agent_query(travel_agents, query))
     
-    query = f"""Create a detailed {duration} itinerary for {destination} including:
-    1. Day-by-day schedule visiting the places numbered {selected_places} that the user selected
-    2. Accommodation at hotel option {selected_hotel}
-    3. Transportation recommendations between attractions
-    4. Meal suggestions including local cuisine
-    5. Estimated budget breakdown for the entire trip
+    add_to_chat_history(session, "system", "Generated itinerary", processed_response)
+    update_session_activity(session_id, session)
     
-    IMPORTANT: DO NOT try to use any functions or tools in your response. Just create the itinerary.
-    I will automatically add coordinates to the itinerary later.
+    return jsonify({
+        "itinerary": processed_response,
+        "route_plan": route_plan.to_dict() if route_plan else None
+    }), 200
+
+def answer_booking_query(session_id, session, kind, itinerary=None):
+    """
+    Shared body of the single-prompt booking endpoints: run (or stream) the query and record the result
     
-    Organize by day and include estimated times for activities."""
+    Args:
+        kind: Key of routeHelpers.BOOKING_QUERIES
+        itinerary: Itinerary from the request; None uses the one stored by /find-transportation-options
+    """
+    booking_query = start_booking_query(session, kind, itinerary)
+    if booking_query is None:
+        return jsonify({"error": "Itinerary is required. Call /find-transportation-options first"}), 400
+    query, history_message, result_key = booking_query
     
-    response = travel_agent.agent.run(query)
+    if wants_stream(request.args, request.headers):
+        return stream_agent_response(session_id, session, booking_agents, query, history_message, result_key)
     
-    # Process the response to replace any function calls with actual results
-    processed_response = process_function_calls(response.content)
+    # Process any function calls that might be in the response
+    processed_response = process_function_calls(run_agent_query(booking_agents, query))
     
-    add_to_chat_history(session_id, "system", "Generated itinerary", processed_response)
-    update_session_activity(session_id)
+    add_to_chat_history(session, "system", history_message, processed_response)
+    update_session_activity(session_id, session)
     
-    return jsonify({
-        "itinerary": processed_response
-    }), 200
+    return jsonify({result_key: processed_response}), 200
 
 @app.route('/sessions/<session_id>/find-transportation-options', methods=['POST'])
 def find_transportation_options(session_id):
@@ -415,34 +487,7 @@ def find_transportation_options(session_id):
     if not data or 'itinerary' not in data:
         return jsonify({"error": "Itinerary is required"}), 400
     
-    booking_agent = session["booking_agent"]
-    itinerary = data['itinerary']
-    
-    add_to_chat_history(session_id, "user", "Request for transportation options")
-    booking_agent.context["itinerary"] = itinerary
-    
-    query = f"""Based on the following itinerary, search for and recommend the best transportation options (flights, trains, buses, etc.) between each destination:
-    {itinerary}
-    
-    For each leg of the journey:
-    1. Search for available transportation options (flight routes, train services, bus lines)
-    2. Find the websites where these can be booked
-    3. Include approximate costs, duration, and schedule information
-    4. Highlight the most convenient or cost-effective options
-    
-    Format your response by journey leg (e.g., "City A to City B") and include direct links to booking websites."""
-    
-    response = booking_agent.agent.run(query)
-    
-    # Process any function calls that might be in the response
-    processed_response = process_function_calls(response.content)
-    
-    add_to_chat_history(session_id, "system", "Transportation options", processed_response)
-    update_session_activity(session_id)
-    
-    return jsonify({
-        "transportation_options": processed_response
-    }), 200
+    return answer_booking_query(session_id, session, "transportation", data['itinerary'])
 
 @app.route('/sessions/<session_id>/find-accommodation-options', methods=['POST'])
 def find_accommodation_options(session_id):
@@ -451,37 +496,7 @@ def find_accommodation_options(session_id):
     if not session:
         return jsonify({"error": "Session not found"}), 404
     
-    booking_agent = session["booking_agent"]
-    
-    if "itinerary" not in booking_agent.context:
-        return jsonify({"error": "Itinerary is required. Call /find-transportation-options first"}), 400
-    
-    add_to_chat_history(session_id, "user", "Request for accommodation booking options")
-    
-    itinerary = booking_agent.context.get("itinerary", "")
-    
-    query = f"""Based on the following itinerary, search for and recommend accommodation options at each destination:
-    {itinerary}
-    
-    For each destination where the traveler will stay overnight:
-    1. Search for hotel options in different price ranges (budget, mid-range, luxury)
-    2. Find the official websites or booking platforms where these accommodations can be reserved
-    3. Include approximate nightly rates, key amenities, and location advantages
-    4. Note any special deals or promotions currently available
-    
-    Format your response by destination and include direct links to booking websites for each recommended accommodation."""
-    
-    response = booking_agent.agent.run(query)
-    
-    # Process any function calls that might be in the response
-    processed_response = process_function_calls(response.content)
-    
-    add_to_chat_history(session_id, "system", "Accommodation booking options", processed_response)
-    update_session_activity(session_id)
-    
-    return jsonify({
-        "accommodation_options": processed_response
-    }), 200
+    return answer_booking_query(session_id, session, "accommodation")
 
 @app.route('/sessions/<session_id>/find-local-transportation', methods=['POST'])
 def find_local_transportation(session_id):
@@ -490,38 +505,7 @@ def find_local_transportation(session_id):
     if not session:
         return jsonify({"error": "Session not found"}), 404
     
-    booking_agent = session["booking_agent"]
-    
-    if "itinerary" not in booking_agent.context:
-        return jsonify({"error": "Itinerary is required. Call /find-transportation-options first"}), 400
-    
-    add_to_chat_history(session_id, "user", "Request for local transportation options")
-    
-    itinerary = booking_agent.context.get("itinerary", "")
-    
-    query = f"""Based on the following itinerary, search for and recommend local transportation options within each destination:
-    {itinerary}
-    
-    For each destination:
-    1. Search for public transportation options (metro, bus, tram, etc.)
-    2. Find information about ride-sharing services or taxis
-    3. Look for any transportation passes or cards that might save money
-    4. Include websites where tickets or passes can be purchased in advance
-    5. Mention transportation options between key attractions mentioned in the itinerary
-    
-    Format your response by destination and include direct links to official transportation websites or apps."""
-    
-    response = booking_agent.agent.run(query)
-    
-    # Process any function calls that might be in the response
-    processed_response = process_function_calls(response.content)
-    
-    add_to_chat_history(session_id, "system", "Local transportation options", processed_response)
-    update_session_activity(session_id)
-    
-    return jsonify({
-        "local_transportation": processed_response
-    }), 200
+    return answer_booking_query(session_id, session, "local_transportation")
 
 @app.route('/sessions/<session_id>/create-comprehensive-plan', methods=['POST'])
 def create_comprehensive_plan(session_id):
@@ -530,38 +514,54 @@ def create_comprehensive_plan(session_id):
     if not session:
         return jsonify({"error": "Session not found"}), 404
     
-    booking_agent = session["booking_agent"]
-    
-    if "itinerary" not in booking_agent.context:
-        return jsonify({"error": "Itinerary is required. Call /find-transportation-options first"}), 400
-    
-    add_to_chat_history(session_id, "user", "Request for comprehensive travel plan")
-    
-    itinerary = booking_agent.context.get("itinerary", "")
+    return answer_booking_query(session_id, session, "comprehensive")
+
+def run_booking_query(query):
+    """Run one query on a leased booking agent and fill in any coordinates"""
+    response = run_agent_query(booking_agents, query)
+    return process_function_calls(response)
+
+@app.route('/sessions/<session_id>/create-booking-plan', methods=['POST'])
+def create_booking_plan(session_id):
+    """
+    Research transportation, accommodation and local transportation concurrently,
+    then merge the findings into the comprehensive plan in one final call
     
-    query = f"""Create a comprehensive travel and booking plan based on this itinerary:
-    {itinerary}
+    Uses the itinerary in the request body, or the one stored by /find-transportation-options.
+    """
+    session = get_session(session_id)
+    if not session:
+        return jsonify({"error": "Session not found"}), 404
     
-    Include:
-    1. A complete day-by-day breakdown with all transportation and accommodation recommendations
-    2. Direct booking links for each recommended service
-    3. A suggested booking timeline (which bookings should be made first)
-    4. Estimated total budget for transportation and accommodations
-    5. Tips for getting the best deals on the recommended services
+    data = request.get_json(silent=True) or {}
+    booking_context = session["booking_context"]
+    itinerary = data.get('itinerary', booking_context.get("itinerary"))
+    if not itinerary:
+        return jsonify({"error": "Itinerary is required"}), 400
     
-    Format this as a complete travel booking guide that the traveler can follow step by step."""
+    add_to_chat_history(session, "user", "Request for booking plan")
+    booking_context["itinerary"] = itinerary
     
-    response = booking_agent.agent.run(query)
+    started = time.perf_counter()
+    futures = [booking_plan_executor.submit(run_booking_query, BOOKING_QUERIES[kind][1](itinerary))
+               for kind in BOOKING_PLAN_SECTIONS]
+    # Let every section finish before reporting a failure, so no agent is left running unobserved,
+    # unless that takes too long: sections still queued are dropped, running ones return their agents
+    _, pending = wait(futures, timeout=BOOKING_PLAN_TIMEOUT)
+    if pending:
+        for future in pending:
+            future.cancel()
+        raise AgentPoolExhausted(f"Booking plan research did not finish within {BOOKING_PLAN_TIMEOUT}s")
+    sections = [future.result() for future in futures]
+    researched = time.perf_counter()
     
-    # Process any function calls that might be in the response
-    processed_response = process_function_calls(response.content)
+    comprehensive_plan = run_booking_query(booking_plan_query(itinerary, *sections))
+    finished = time.perf_counter()
     
-    add_to_chat_history(session_id, "system", "Comprehensive travel plan", processed_response)
-    update_session_activity(session_id)
+    body = booking_plan_recorded(session, sections, comprehensive_plan, started, researched, finished)
+    update_session_activity(session_id, session)
     
-    return jsonify({
-        "comprehensive_plan": processed_response
-    }), 200
+    return jsonify(body), 200
 
 @app.route('/sessions/<session_id>/reset', methods=['POST'])
 def reset_session_context(session_id):
@@ -571,11 +571,11 @@ def reset_session_context(session_id):
         return jsonify({"error": "Session not found"}), 404
     
     # Reset the contexts but keep the chat history
-    session["travel_agent"].context = {}
-    session["booking_agent"].context = {}
+    session["travel_context"] = {}
+    session["booking_context"] = {}
     
-    add_to_chat_history(session_id, "system", "Session context reset")
-    update_session_activity(session_id)
+    add_to_chat_history(session, "system", "Session context reset")
+    update_session_activity(session_id, session)
     
     return jsonify({
         "message": "Session context reset successfully"
@@ -592,12 +592,8 @@ def add_chat_message(session_id):
     if not data or 'message' not in data or 'source' not in data:
         return jsonify({"error": "Message and source are required"}), 400
     
-    message = data['message']
-    source = data['source']
-    response = data.get('response', None)
-    
-    add_to_chat_history(session_id, source, message, response)
-    update_session_activity(session_id)
+    add_to_chat_history(session, data['source'], data['message'], data.get('response', None))
+    update_session_activity(session_id, session)
     
     return jsonify({
         "message": "Chat message added successfully"
@@ -614,24 +610,55 @@ def update_mood(session_id):
     if not data or 'mood_state' not in data:
         return jsonify({"error": "Mood state is required"}), 400
     
-    mood_state = data['mood_state']
-    current_time = data.get('current_time', datetime.now().strftime("%H:%M"))
-    current_location = data.get('current_location', session.get('current_location', 'Current location'))
+    body = mood_updated(session, data)
+    update_session_activity(session_id, session)
     
-    # Update session with current state
-    session['current_mood'] = mood_state
-    session['current_time'] = current_time
-    session['current_location'] = current_location
+    return jsonify(body), 200
+
+def refresh_travel_times(session, itinerary, current_time, current_location, cached_only=False):
+    """
+    Bring the session's travel-time matrix up to date; only places it has not seen are geocoded.
     
-    add_to_chat_history(session_id, "user", f"Mood update: {mood_state} at {current_time}")
-    update_session_activity(session_id)
+    With cached_only, new places are only taken from the geocode cache, so the call never
+    waits on the provider; the others are added by the next full refresh.
+    """
+    travel_times, locations, queries = travel_time_lookups(session, itinerary, current_time, current_location)
+    if cached_only:
+        results = [geocode_cache.get(query) for query in queries]
+    else:
+        results = geocode_many(queries) if queries else []
+    session["travel_times"] = update_matrix(travel_times, locations, results)
+    return travel_times
+
+@app.route('/sessions/<session_id>/itinerary', methods=['GET'])
+def get_itinerary(session_id):
+    """The live itinerary, or only the diffs after ?since=<version> when they are still kept"""
+    session = get_session(session_id)
+    if not session:
+        return jsonify({"error": "Session not found"}), 404
     
-    return jsonify({
-        "message": "Mood state updated successfully",
-        "mood_state": mood_state,
-        "current_time": current_time,
-        "current_location": current_location
-    }), 200
+    return jsonify(itinerary_view(session, request.args.get('since'))), 200
+
+@app.route('/sessions/<session_id>/itinerary', methods=['PATCH'])
+def patch_itinerary(session_id):
+    """Apply small changes (e.g. an activity completed) to the live itinerary without re-planning"""
+    session = get_session(session_id)
+    if not session:
+        return jsonify({"error": "Session not found"}), 404
+    
+    data = request.json
+    if not data or 'changes' not in data:
+        return jsonify({"error": "Changes are required"}), 400
+    
+    itinerary, diff = patch_session_itinerary(session, data)
+    if itinerary is None:
+        return error_response(diff)
+    
+    # Places added here are geocoded now, so the next adjust-itinerary finds them in the matrix
+    refresh_travel_times(session, itinerary.plain(), session.get('current_time'), session.get('current_location'))
+    update_session_activity(session_id, session)
+    
+    return jsonify({"version": itinerary.version, "diff": diff}), 200
 
 @app.route('/sessions/<session_id>/adjust-itinerary', methods=['POST'])
 def adjust_itinerary(session_id):
@@ -641,46 +668,62 @@ def adjust_itinerary(session_id):
         return jsonify({"error": "Session not found"}), 404
     
     data = request.json
-    if not data or 'current_itinerary' not in data or 'mood_state' not in data:
+    if not data or 'mood_state' not in data:
         return jsonify({"error": "Current itinerary and mood state are required"}), 400
     
-    live_agent = session["live_itinerary_agent"]
-    current_itinerary = data['current_itinerary']
-    mood_state = data['mood_state']
-    current_time = data.get('current_time', datetime.now().strftime("%H:%M"))
-    current_location = data.get('current_location', session.get('current_location', 'Current location'))
+    # The client either sends the whole day or patches the server's copy of it
+    itinerary, error = itinerary_to_adjust(session, data)
+    if itinerary is None:
+        return error_response(error)
     
-    # Store current itinerary in session
-    session['current_itinerary'] = current_itinerary
+    current_itinerary = itinerary.plain()
+    mood_state, current_time, current_location = live_context(session, data)
     
-    add_to_chat_history(session_id, "user", f"Request to adjust itinerary based on mood: {mood_state}")
+    add_to_chat_history(session, "user", f"Request to adjust itinerary based on mood: {mood_state}")
     
-    # Call the live itinerary agent to adjust the schedule
+    # Simple moods are rescheduled by rule; everything else goes to the live itinerary agent
     try:
-        result = live_agent.adjust_itinerary(
-            current_itinerary=current_itinerary,
-            mood_state=mood_state,
-            current_time=current_time,
-            current_location=current_location
-        )
+        result = adjust_itinerary_locally(current_itinerary, mood_state, current_time)
+        if result is not None:
+            # The rules answer at once; new places only get legs if the geocode cache already knows them
+            travel_times = refresh_travel_times(session, current_itinerary, current_time, current_location, cached_only=True)
+        else:
+            travel_times = refresh_travel_times(session, current_itinerary, current_time, current_location)
+            with live_itinerary_agents.lease(AGENT_LEASE_TIMEOUT) as live_agent:
+                result = live_agent.adjust_itinerary(
+                    current_itinerary=current_itinerary,
+                    mood_state=mood_state,
+                    current_time=current_time,
+                    current_location=current_location,
+                    travel_times=travel_times.to_prompt(route_locations(current_itinerary, current_time, current_location))
+                )
         
-        # Update session with the adjusted itinerary
-        session['current_itinerary'] = result.get('updated_schedule', current_itinerary)
+        body = itinerary_adjusted(session, itinerary, result, travel_times, data.get('response'))
+        update_session_activity(session_id, session)
         
-        add_to_chat_history(session_id, "system", "Itinerary adjusted", result)
-        update_session_activity(session_id)
-        
-        return jsonify({
-            "message": "Itinerary adjusted successfully",
-            "result": result
-        }), 200
+        return jsonify(body), 200
         
+    except AgentPoolExhausted:
+        # Left to the errorhandler, which answers 503
+        raise
     except Exception as e:
-        add_to_chat_history(session_id, "system", f"Error adjusting itinerary: {str(e)}")
-        return jsonify({
-            "error": "Failed to adjust itinerary",
-            "details": str(e)
-        }), 500
+        body = live_agent_failure(session, "Error adjusting itinerary", "Failed to adjust itinerary", e)
+        save_session(session_id, session)
+        return jsonify(body), 500
+
+def nearby_venues(location, radius_km):
+    """Geocoded venues within radius_km of a location, nearest first; [] if the location cannot be placed"""
+    try:
+        radius_km = float(radius_km)
+    except (TypeError, ValueError):
+        return []
+    point = parse_coordinates(location)
+    if point is None:
+        result = geocode(location)
+        if not result.ok:
+            return []
+        point = result.point
+    return venue_index.within(point.latitude, point.longitude, radius_km, NEARBY_VENUE_LIMIT, exclude=location)
 
 @app.route('/sessions/<session_id>/find-alternatives', methods=['POST'])
 def find_alternatives(session_id):
@@ -693,36 +736,42 @@ def find_alternatives(session_id):
     if not data or 'activity_type' not in data:
         return jsonify({"error": "Activity type is required"}), 400
     
-    live_agent = session["live_itinerary_agent"]
-    activity_type = data['activity_type']
-    location = data.get('location', session.get('current_location', 'Current location'))
-    radius_km = data.get('radius_km', 5)
-    mood_state = data.get('mood_state', session.get('current_mood', 'neutral'))
-    
-    add_to_chat_history(session_id, "user", f"Request alternatives for {activity_type} near {location}")
+    activity_type, location, radius_km, mood_state = alternatives_request(session, data)
     
     try:
-        alternatives = live_agent.find_nearby_alternatives(
-            activity_type=activity_type,
-            location=location,
-            radius_km=radius_km,
-            mood_state=mood_state
-        )
+        # Known venues inside the radius go into the prompt, so suggestions are really distance-bounded
+        venues = nearby_venues(location, radius_km)
+        query, near_parts = alternatives_cache_key(activity_type, location, radius_km, mood_state, venues)
+        alternatives = response_cache.get(query, live_itinerary_agents.fingerprint, near_parts)
+        if alternatives is None:
+            def find():
+                with live_itinerary_agents.lease(AGENT_LEASE_TIMEOUT) as live_agent:
+                    return live_agent.find_nearby_alternatives(
+                        activity_type=activity_type,
+                        location=location,
+                        radius_km=radius_km,
+                        mood_state=mood_state,
+                        nearby_venues=venues
+                    )
+            
+            alternatives = agent_flight.do((live_itinerary_agents.name, normalize_prompt(query)), find)
+            response_cache.set(query, live_itinerary_agents.fingerprint, alternatives, near_parts)
         
-        add_to_chat_history(session_id, "system", "Found alternatives", alternatives)
-        update_session_activity(session_id)
+        add_to_chat_history(session, "system", "Found alternatives", alternatives)
+        update_session_activity(session_id, session)
         
         return jsonify({
             "message": "Alternatives found successfully",
             "alternatives": alternatives
         }), 200
         
+    except AgentPoolExhausted:
+        # Left to the errorhandler, which answers 503
+        raise
     except Exception as e:
-        add_to_chat_history(session_id, "system", f"Error finding alternatives: {str(e)}")
-        return jsonify({
-            "error": "Failed to find alternatives",
-            "details": str(e)
-        }), 500
+        body = live_agent_failure(session, "Error finding alternatives", "Failed to find alternatives", e)
+        save_session(session_id, session)
+        return jsonify(body), 500
 
 @app.route('/sessions/<session_id>/emergency-reroute', methods=['POST'])
 def emergency_reroute(session_id):
@@ -735,34 +784,33 @@ def emergency_reroute(session_id):
     if not data or 'current_situation' not in data or 'destination' not in data:
         return jsonify({"error": "Current situation and destination are required"}), 400
     
-    live_agent = session["live_itinerary_agent"]
     current_situation = data['current_situation']
-    destination = data['destination']
-    urgency_level = data.get('urgency_level', 'high')
     
-    add_to_chat_history(session_id, "user", f"Emergency reroute request: {current_situation}")
+    add_to_chat_history(session, "user", f"Emergency reroute request: {current_situation}")
     
     try:
-        reroute_plan = live_agent.emergency_reroute(
-            current_situation=current_situation,
-            destination=destination,
-            urgency_level=urgency_level
-        )
+        with live_itinerary_agents.lease(AGENT_LEASE_TIMEOUT) as live_agent:
+            reroute_plan = live_agent.emergency_reroute(
+                current_situation=current_situation,
+                destination=data['destination'],
+                urgency_level=data.get('urgency_level', 'high')
+            )
         
-        add_to_chat_history(session_id, "system", "Emergency reroute plan", reroute_plan)
-        update_session_activity(session_id)
+        add_to_chat_history(session, "system", "Emergency reroute plan", reroute_plan)
+        update_session_activity(session_id, session)
         
         return jsonify({
             "message": "Emergency reroute completed",
             "reroute_plan": reroute_plan
         }), 200
         
+    except AgentPoolExhausted:
+        # Left to the errorhandler, which answers 503
+        raise
     except Exception as e:
-        add_to_chat_history(session_id, "system", f"Error with emergency reroute: {str(e)}")
-        return jsonify({
-            "error": "Failed to create emergency reroute",
-            "details": str(e)
-        }), 500
+        body = live_agent_failure(session, "Error with emergency reroute", "Failed to create emergency reroute", e)
+        save_session(session_id, session)
+        return jsonify(body), 500
 
 @app.route('/cleanup-sessions', methods=['POST'])
 def cleanup_old_sessions():
@@ -772,17 +820,8 @@ def cleanup_old_sessions():
     data = request.json
     hours = data.get('hours', 24) if data else 24
     
-    # Calculate cutoff time
-    cutoff = datetime.now()
-    cutoff = cutoff.replace(hour=cutoff.hour - hours)
-    
-    # Find sessions older than cutoff
-    old_sessions = []
-    for session_id, session_data in list(sessions.items()):
-        last_active = datetime.fromisoformat(session_data["last_active"])
-        if last_active < cutoff:
-            old_sessions.append(session_id)
-            del sessions[session_id]
+    # Remove sessions idle for longer than the window, oldest first
+    old_sessions = session_store.expire_idle(float(hours) * 3600)
     
     return jsonify({
         "message": f"Cleaned up {len(old_sessions)} old sessions",
@@ -0,0 +1,810 @@
+import asyncio
+import functools
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Import from the travel agent modules
+from geolocation import InteractiveTravelAgent, geocode_rate_limiter, geocode_circuit_breaker
+from asyncGeolocation import ageocode, ageocode_many, ageocode_flight
+from bookingAgent import TravelOptionsFinder
+from liveItineraryAgent import LiveItineraryAgent, adjustment_stats, adjust_itinerary_locally
+from geocodeCache import geocode_cache
+from venueIndex import venue_index, parse_coordinates
+from travelTimes import route_locations, update_matrix, travel_time_stats
+from responseCache import response_cache, normalize_prompt
+from promptEncoding import prompt_encoding_stats
+from singleFlight import AsyncSingleFlight
+from agentPool import AgentPool, AgentPoolExhausted
+from sessionStore import AsyncSessionStore, create_session_store, start_expiry_thread
+from chatHistory import ChatHistory
+from httpClient import close_async_http_client
+from agentPrompts import suggest_places_query, suggest_accommodations_query, booking_plan_query
+from responseProcessing import aprocess_function_calls
+from extraction import extract_attractions, extract_hotels
+from routeHelpers import (
+    BOOKING_QUERIES, BOOKING_PLAN_SECTIONS, new_session, add_to_chat_history, parse_paging, session_info,
+    session_summaries, wants_stream, sse_event, drain_agent_stream, attraction_queries, places_suggested,
+    hotels_to_locate, accommodations_suggested, missing_itinerary_error, route_plan_queries, route_plan_from,
+    create_itinerary_query, start_booking_query, booking_plan_recorded, live_context, mood_updated,
+    travel_time_lookups, itinerary_view, patch_session_itinerary, itinerary_to_adjust,
+    itinerary_adjusted, live_agent_failure, alternatives_request, alternatives_cache_key
+)
+
+# Async serving mode: the same routes and JSON as app.py, served from one event loop.
+# Run with `uvicorn asgiApp:app --port 5000` (or `python asgiApp.py`). The route logic
+# itself lives in routeHelpers, shared with app.py; this file only awaits the I/O.
+#
+# Geocoding in the routes goes through httpx, and waiting for a free agent or a session
+# read holds no thread. Agent runs do: phi executes tool calls (DuckDuckGo, Newspaper4k,
+# get_location_coordinates with its rate limiter) synchronously even inside agent.arun,
+# so one search would stall every request on the loop. Each run therefore goes to an
+# agent_executor thread while the event loop carries on.
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_async_http_client()
+
+# Initialize FastAPI app
+app = FastAPI(title="Roameo Travel API", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+# Leasing waits on the event loop rather than in a thread, so the pools can be larger than in app.py
+ASYNC_AGENT_POOL_SIZE = int(os.getenv("ASYNC_AGENT_POOL_SIZE", 32))
+AGENT_LEASE_TIMEOUT = float(os.getenv("AGENT_LEASE_TIMEOUT", 30))
+travel_agents = AgentPool(InteractiveTravelAgent, ASYNC_AGENT_POOL_SIZE, "travel")
+booking_agents = AgentPool(TravelOptionsFinder, ASYNC_AGENT_POOL_SIZE, "booking")
+live_itinerary_agents = AgentPool(LiveItineraryAgent, ASYNC_AGENT_POOL_SIZE, "live itinerary")
+
+# One thread per agent across the three pools, so a leased agent never waits for a thread to run on
+agent_executor = ThreadPoolExecutor(max_workers=3 * ASYNC_AGENT_POOL_SIZE, thread_name_prefix="agent-run")
+
+# Identical prompts already running share one agent run
+agent_flight = AsyncSingleFlight("agent")
+
+# Longest a booking plan waits for its sections before answering 503 (see app.py)
+BOOKING_PLAN_TIMEOUT = float(os.getenv("BOOKING_PLAN_TIMEOUT", 120))
+booking_plan_stragglers = set()
+
+# Most known venues listed in a find-alternatives prompt
+NEARBY_VENUE_LIMIT = int(os.getenv("NEARBY_VENUE_LIMIT", 15))
+
+# Streamed runs are drained into a buffer by their own task, as in app.py
+STREAM_MAX_CONCURRENT = int(os.getenv("STREAM_MAX_CONCURRENT", 4 * ASYNC_AGENT_POOL_SIZE))
+open_streams = set()
+
+# Same SESSION_STORE backends as app.py; use sqlite or redis to share sessions between the two
+sync_session_store = create_session_store()
+session_store = AsyncSessionStore(sync_session_store)
+
+CHAT_HISTORY_MAX_ENTRIES = int(os.getenv("CHAT_HISTORY_MAX_ENTRIES", 200))
+CHAT_COMPRESS_MIN_BYTES = int(os.getenv("CHAT_COMPRESS_MIN_BYTES", 1024))
+
+start_expiry_thread(sync_session_store, float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", 60)))
+
+def respond(body, status_code=200):
+    return JSONResponse(body, status_code=status_code)
+
+def error_response(error):
+    """A (body, status) pair from routeHelpers as a response"""
+    return respond(*error)
+
+async def read_json(request):
+    """Request body as a dict, or None when it is missing or not a JSON object"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+async def create_new_session():
+    """Create a new session; agents come from the shared pools, so only context is stored"""
+    session_id = str(uuid.uuid4())
+    await session_store.save(session_id, new_session(CHAT_HISTORY_MAX_ENTRIES, CHAT_COMPRESS_MIN_BYTES))
+    return session_id
+
+async def get_session(session_id):
+    """Get session by ID or return None if not found"""
+    session = await session_store.get(session_id)
+    if session is not None:
+        session["chat_history"] = load_chat_history(session["chat_history"])
+    return session
+
+def load_chat_history(state):
+    """Turn stored chat history (already live, serialized, or a legacy list) into a ChatHistory"""
+    return ChatHistory.from_state(state, CHAT_HISTORY_MAX_ENTRIES, CHAT_COMPRESS_MIN_BYTES)
+
+async def save_session(session_id, session):
+    """Persist changes made to a session loaded with get_session"""
+    await session_store.save(session_id, session)
+
+async def update_session_activity(session_id, session):
+    """Update the last active timestamp for a session and persist it"""
+    session["last_active"] = datetime.now().isoformat()
+    await save_session(session_id, session)
+
+async def in_agent_thread(function, *args, **kwargs):
+    """Run a blocking agent call on agent_executor and await its result"""
+    return await asyncio.get_running_loop().run_in_executor(agent_executor, functools.partial(function, *args, **kwargs))
+
+async def run_agent(pool, query):
+    """Lease an agent, run the query in an agent thread and return the text; identical runs in flight are joined"""
+    async def run():
+        async with pool.alease(AGENT_LEASE_TIMEOUT) as agent:
+            response = await in_agent_thread(agent.agent.run, query)
+        return response.content
+
+    return await agent_flight.do((pool.name, normalize_prompt(query)), run)
+
+async def run_cached_agent(pool, query, near_parts=None):
+    """run_agent behind the shared response cache (see app.run_cached_query)"""
+    cached = response_cache.get(query, pool.fingerprint, near_parts)
+    if cached is not None:
+        return cached
+
+    content = await run_agent(pool, query)
+    response_cache.set(query, pool.fingerprint, content, near_parts)
+    return content
+
+async def record_stream_result(session_id, source, message, response):
+    """Add a finished stream's reply to the session as it is stored now (see app.record_stream_result)"""
+    session = await get_session(session_id)
+    if session is None:
+        return
+    add_to_chat_history(session, source, message, response)
+    await update_session_activity(session_id, session)
+
+async def stream_agent_response(session_id, session, pool, query, history_message, result_key):
+    """
+    Async counterpart of app.stream_agent_response; emits the same chunk, done and error events.
+
+    The run is read in an agent thread on behalf of a task of its own, so the agent is
+    released when the model finishes rather than when the client has read everything.
+    Like app.py, streams skip the response cache and agent_flight.
+
+    Raises:
+        AgentPoolExhausted: If STREAM_MAX_CONCURRENT streams are already open
+    """
+    if len(open_streams) >= STREAM_MAX_CONCURRENT:
+        raise AgentPoolExhausted(f"{STREAM_MAX_CONCURRENT} streams already open")
+    await update_session_activity(session_id, session)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(text):
+        # Called from the agent thread; the queue belongs to the loop
+        loop.call_soon_threadsafe(events.put_nowait, ("chunk", {"content": text}))
+
+    async def run():
+        try:
+            async with pool.alease(AGENT_LEASE_TIMEOUT) as agent:
+                processed_response = await in_agent_thread(drain_agent_stream, agent, query, emit)
+            await record_stream_result(session_id, "system", history_message, processed_response)
+            events.put_nowait(("done", {result_key: processed_response}))
+        except Exception as e:
+            await record_stream_result(session_id, "system", f"Error while streaming: {history_message}", str(e))
+            events.put_nowait(("error", {"error": str(e)}))
+        finally:
+            events.put_nowait(None)
+
+    # The set keeps a reference to each task until it finishes, and its size is the open stream count
+    task = asyncio.create_task(run())
+    open_streams.add(task)
+    task.add_done_callback(open_streams.discard)
+
+    async def generate():
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            yield sse_event(*event)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.exception_handler(AgentPoolExhausted)
+async def handle_agent_pool_exhausted(request, error):
+    """All agents are busy; ask the client to retry instead of queueing indefinitely"""
+    return respond({"error": "Service busy, please retry shortly", "details": str(error)}, 503)
+
+@app.get('/health')
+async def health_check():
+    """Simple health check endpoint"""
+    return respond({"status": "healthy", "message": "Travel API is running"})
+
+@app.get('/metrics')
+async def get_metrics():
+    """Runtime counters for caches and outbound calls"""
+    return respond({
+        "geocode_cache": geocode_cache.stats(),
+        "geocode_rate_limiter": geocode_rate_limiter.stats(),
+        "geocode_circuit_breaker": geocode_circuit_breaker.stats(),
+        "response_cache": response_cache.stats(),
+        "itinerary_adjustments": adjustment_stats(),
+        "prompt_encoding": prompt_encoding_stats.stats(),
+        "venue_index": venue_index.stats(),
+        "travel_times": travel_time_stats(),
+        "single_flight": {
+            "agent": agent_flight.stats(),
+            "geocode": ageocode_flight.stats()
+        },
+        "agent_pools": {
+            "travel": travel_agents.stats(),
+            "booking": booking_agents.stats(),
+            "live_itinerary": live_itinerary_agents.stats()
+        }
+    })
+
+@app.post('/sessions')
+async def create_session():
+    """Create a new session and return its ID"""
+    session_id = await create_new_session()
+    return respond({
+        "session_id": session_id,
+        "message": "New session created successfully"
+    }, 201)
+
+@app.get('/sessions/{session_id}')
+async def get_session_info(session_id: str, request: Request):
+    """Get session information and a page of chat history (cursor and limit as in app.py)"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    try:
+        cursor, limit = parse_paging(request.query_params)
+    except ValueError:
+        return respond({"error": "cursor and limit must be integers"}, 400)
+
+    return respond(session_info(session_id, session, cursor, limit))
+
+@app.delete('/sessions/{session_id}')
+async def delete_session(session_id: str):
+    """Delete a session"""
+    if not await session_store.delete(session_id):
+        return respond({"error": "Session not found"}, 404)
+
+    return respond({"message": "Session deleted successfully"})
+
+@app.get('/sessions')
+async def list_sessions():
+    """List all active sessions"""
+    return respond({"sessions": session_summaries(await session_store.items(), load_chat_history)})
+
+@app.post('/sessions/{session_id}/coordinates')
+async def get_coordinates(session_id: str, request: Request):
+    """Get coordinates for a location name"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'location' not in data:
+        return respond({"error": "Location name is required"}, 400)
+
+    location_name = data['location']
+    add_to_chat_history(session, "user", f"Get coordinates for: {location_name}")
+
+    geocode_result = await ageocode(location_name)
+    coordinates = geocode_result.to_legacy_string()
+
+    add_to_chat_history(session, "system", "Returning coordinates", coordinates)
+    await update_session_activity(session_id, session)
+
+    return respond({"result": coordinates, "geo": geocode_result.to_dict()})
+
+@app.post('/sessions/{session_id}/suggest-places')
+async def suggest_places(session_id: str, request: Request):
+    """Suggest places to visit based on destination and duration"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'destination' not in data or 'duration' not in data:
+        return respond({"error": "Destination and duration are required"}, 400)
+
+    travel_context = session["travel_context"]
+    destination = data['destination']
+    duration = data['duration']
+
+    add_to_chat_history(session, "user", f"Suggest places in {destination} for {duration}")
+
+    travel_context["destination"] = destination
+    travel_context["duration"] = duration
+
+    response = await run_cached_agent(travel_agents, suggest_places_query(destination, duration),
+                                      ("suggest_places", destination, duration))
+    processed_response = await aprocess_function_calls(response)
+
+    # Geocode every numbered attraction in one concurrent batch
+    attractions = extract_attractions(processed_response)
+    location_queries = attraction_queries(attractions, destination)
+    coords_results = await ageocode_many(location_queries)
+
+    body = places_suggested(session, destination, duration, processed_response, attractions, location_queries, coords_results)
+    await update_session_activity(session_id, session)
+
+    return respond(body)
+
+@app.post('/sessions/{session_id}/select-places')
+async def select_places(session_id: str, request: Request):
+    """Store user-selected places in context"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'selected_places' not in data:
+        return respond({"error": "Selected places are required"}, 400)
+
+    selected_places = data['selected_places']
+
+    add_to_chat_history(session, "user", f"Selected places: {selected_places}")
+    session["travel_context"]["selected_places"] = selected_places
+    await update_session_activity(session_id, session)
+
+    return respond({
+        "message": "Places selected successfully",
+        "selected_places": selected_places
+    })
+
+@app.post('/sessions/{session_id}/suggest-accommodations')
+async def suggest_accommodations(session_id: str):
+    """Suggest accommodations based on selected places"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    travel_context = session["travel_context"]
+
+    if "destination" not in travel_context or "selected_places" not in travel_context:
+        return respond({"error": "Destination and selected places are required. Call /suggest-places and /select-places first"}, 400)
+
+    add_to_chat_history(session, "user", "Request for accommodation suggestions")
+
+    selected_places = travel_context.get("selected_places", "")
+    destination = travel_context.get("destination", "")
+
+    response = await run_cached_agent(travel_agents, suggest_accommodations_query(selected_places, destination),
+                                      ("suggest_accommodations", destination, selected_places))
+    processed_response = await aprocess_function_calls(response)
+
+    # Only look up hotels whose coordinates aren't already in the response, all in one batch
+    hotels, location_queries = hotels_to_locate(travel_context, processed_response, extract_hotels(processed_response))
+    hotel_coords = await ageocode_many(location_queries)
+
+    body = accommodations_suggested(session, processed_response, hotels, hotel_coords)
+    await update_session_activity(session_id, session)
+
+    return respond(body)
+
+@app.post('/sessions/{session_id}/select-accommodation')
+async def select_accommodation(session_id: str, request: Request):
+    """Store user-selected accommodation in context"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'selected_hotel' not in data:
+        return respond({"error": "Selected hotel is required"}, 400)
+
+    selected_hotel = data['selected_hotel']
+
+    add_to_chat_history(session, "user", f"Selected accommodation: {selected_hotel}")
+    session["travel_context"]["selected_hotel"] = selected_hotel
+    await update_session_activity(session_id, session)
+
+    return respond({
+        "message": "Accommodation selected successfully",
+        "selected_hotel": selected_hotel
+    })
+
+async def plan_itinerary_route(travel_context):
+    """Day-by-day visit order for the selected places, or None if the session has no stored suggestions"""
+    queries = route_plan_queries(travel_context)
+    if queries is None:
+        return None
+    return route_plan_from(travel_context, await ageocode_many(queries))
+
+@app.post('/sessions/{session_id}/create-itinerary')
+async def create_itinerary(session_id: str, request: Request):
+    """Create a detailed itinerary based on all selections"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    travel_context = session["travel_context"]
+
+    missing = missing_itinerary_error(travel_context)
+    if missing:
+        return error_response(missing)
+
+    add_to_chat_history(session, "user", "Request to create itinerary")
+
+    route_plan = await plan_itinerary_route(travel_context)
+    query = create_itinerary_query(travel_context, route_plan)
+
+    if wants_stream(request.query_params, request.headers):
+        return await stream_agent_response(session_id, session, travel_agents, query, "Generated itinerary", "itinerary")
+
+    processed_response = await aprocess_function_calls(await run_agent(travel_agents, query))
+
+    add_to_chat_history(session, "system", "Generated itinerary", processed_response)
+    await update_session_activity(session_id, session)
+
+    return respond({
+        "itinerary": processed_response,
+        "route_plan": route_plan.to_dict() if route_plan else None
+    })
+
+async def answer_booking_query(session_id, session, request, kind, itinerary=None):
+    """Shared body of the single-prompt booking endpoints (see app.answer_booking_query)"""
+    booking_query = start_booking_query(session, kind, itinerary)
+    if booking_query is None:
+        return respond({"error": "Itinerary is required. Call /find-transportation-options first"}, 400)
+    query, history_message, result_key = booking_query
+
+    if wants_stream(request.query_params, request.headers):
+        return await stream_agent_response(session_id, session, booking_agents, query, history_message, result_key)
+
+    processed_response = await aprocess_function_calls(await run_agent(booking_agents, query))
+
+    add_to_chat_history(session, "system", history_message, processed_response)
+    await update_session_activity(session_id, session)
+
+    return respond({result_key: processed_response})
+
+@app.post('/sessions/{session_id}/find-transportation-options')
+async def find_transportation_options(session_id: str, request: Request):
+    """Find transportation options between destinations"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'itinerary' not in data:
+        return respond({"error": "Itinerary is required"}, 400)
+
+    return await answer_booking_query(session_id, session, request, "transportation", data['itinerary'])
+
+@app.post('/sessions/{session_id}/find-accommodation-options')
+async def find_accommodation_options(session_id: str, request: Request):
+    """Find accommodation options for each destination"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    return await answer_booking_query(session_id, session, request, "accommodation")
+
+@app.post('/sessions/{session_id}/find-local-transportation')
+async def find_local_transportation(session_id: str, request: Request):
+    """Find local transportation options within each destination"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    return await answer_booking_query(session_id, session, request, "local_transportation")
+
+@app.post('/sessions/{session_id}/create-comprehensive-plan')
+async def create_comprehensive_plan(session_id: str, request: Request):
+    """Create a comprehensive travel and booking plan"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    return await answer_booking_query(session_id, session, request, "comprehensive")
+
+async def run_booking_query(query):
+    """Run one query on a leased booking agent and fill in any coordinates"""
+    return await aprocess_function_calls(await run_agent(booking_agents, query))
+
+@app.post('/sessions/{session_id}/create-booking-plan')
+async def create_booking_plan(session_id: str, request: Request):
+    """Research the three booking sections concurrently, then merge them into the comprehensive plan"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request) or {}
+    booking_context = session["booking_context"]
+    itinerary = data.get('itinerary', booking_context.get("itinerary"))
+    if not itinerary:
+        return respond({"error": "Itinerary is required"}, 400)
+
+    add_to_chat_history(session, "user", "Request for booking plan")
+    booking_context["itinerary"] = itinerary
+
+    started = time.perf_counter()
+    # Every section finishes before a failure is reported, so no run is left going unobserved
+    tasks = [asyncio.create_task(run_booking_query(BOOKING_QUERIES[kind][1](itinerary)))
+             for kind in BOOKING_PLAN_SECTIONS]
+    _, pending = await asyncio.wait(tasks, timeout=BOOKING_PLAN_TIMEOUT)
+    if pending:
+        # Not cancelled: that would return their agents to the pool while agent threads still use them.
+        # The set keeps a reference to each one until it finishes
+        for task in pending:
+            booking_plan_stragglers.add(task)
+            task.add_done_callback(booking_plan_stragglers.discard)
+        raise AgentPoolExhausted(f"Booking plan research did not finish within {BOOKING_PLAN_TIMEOUT}s")
+    sections = [task.result() for task in tasks]
+    researched = time.perf_counter()
+
+    comprehensive_plan = await run_booking_query(booking_plan_query(itinerary, *sections))
+    finished = time.perf_counter()
+
+    body = booking_plan_recorded(session, sections, comprehensive_plan, started, researched, finished)
+    await update_session_activity(session_id, session)
+
+    return respond(body)
+
+@app.post('/sessions/{session_id}/reset')
+async def reset_session_context(session_id: str):
+    """Reset the context for a specific session"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    # Reset the contexts but keep the chat history
+    session["travel_context"] = {}
+    session["booking_context"] = {}
+
+    add_to_chat_history(session, "system", "Session context reset")
+    await update_session_activity(session_id, session)
+
+    return respond({"message": "Session context reset successfully"})
+
+@app.post('/sessions/{session_id}/chat')
+async def add_chat_message(session_id: str, request: Request):
+    """Add a message to the chat history"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'message' not in data or 'source' not in data:
+        return respond({"error": "Message and source are required"}, 400)
+
+    add_to_chat_history(session, data['source'], data['message'], data.get('response', None))
+    await update_session_activity(session_id, session)
+
+    return respond({"message": "Chat message added successfully"}, 201)
+
+@app.post('/sessions/{session_id}/update-mood')
+async def update_mood(session_id: str, request: Request):
+    """Update current mood/state for live itinerary adjustments"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'mood_state' not in data:
+        return respond({"error": "Mood state is required"}, 400)
+
+    body = mood_updated(session, data)
+    await update_session_activity(session_id, session)
+
+    return respond(body)
+
+async def refresh_travel_times(session, itinerary, current_time, current_location, cached_only=False):
+    """Bring the session's travel-time matrix up to date (see app.refresh_travel_times)"""
+    travel_times, locations, queries = travel_time_lookups(session, itinerary, current_time, current_location)
+    if cached_only:
+        results = [geocode_cache.get(query) for query in queries]
+    else:
+        results = await ageocode_many(queries) if queries else []
+    session["travel_times"] = update_matrix(travel_times, locations, results)
+    return travel_times
+
+async def run_live_agent(method_name, **kwargs):
+    """Lease a live itinerary agent and run one of its methods in an agent thread"""
+    async with live_itinerary_agents.alease(AGENT_LEASE_TIMEOUT) as live_agent:
+        return await in_agent_thread(getattr(live_agent, method_name), **kwargs)
+
+@app.get('/sessions/{session_id}/itinerary')
+async def get_itinerary(session_id: str, request: Request):
+    """The live itinerary, or only the diffs after ?since=<version> when they are still kept"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    return respond(itinerary_view(session, request.query_params.get('since')))
+
+@app.patch('/sessions/{session_id}/itinerary')
+async def patch_itinerary(session_id: str, request: Request):
+    """Apply small changes (e.g. an activity completed) to the live itinerary without re-planning"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'changes' not in data:
+        return respond({"error": "Changes are required"}, 400)
+
+    itinerary, diff = patch_session_itinerary(session, data)
+    if itinerary is None:
+        return error_response(diff)
+
+    # Places added here are geocoded now, so the next adjust-itinerary finds them in the matrix
+    await refresh_travel_times(session, itinerary.plain(), session.get('current_time'), session.get('current_location'))
+    await update_session_activity(session_id, session)
+
+    return respond({"version": itinerary.version, "diff": diff})
+
+@app.post('/sessions/{session_id}/adjust-itinerary')
+async def adjust_itinerary(session_id: str, request: Request):
+    """Dynamically adjust itinerary based on current mood and situation"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'mood_state' not in data:
+        return respond({"error": "Current itinerary and mood state are required"}, 400)
+
+    # The client either sends the whole day or patches the server's copy of it
+    itinerary, error = itinerary_to_adjust(session, data)
+    if itinerary is None:
+        return error_response(error)
+
+    current_itinerary = itinerary.plain()
+    mood_state, current_time, current_location = live_context(session, data)
+
+    add_to_chat_history(session, "user", f"Request to adjust itinerary based on mood: {mood_state}")
+
+    # Simple moods are rescheduled by rule on the event loop; everything else goes to the agent
+    try:
+        result = adjust_itinerary_locally(current_itinerary, mood_state, current_time)
+        if result is not None:
+            # The rules answer at once; new places only get legs if the geocode cache already knows them
+            travel_times = await refresh_travel_times(session, current_itinerary, current_time, current_location,
+                                                      cached_only=True)
+        else:
+            travel_times = await refresh_travel_times(session, current_itinerary, current_time, current_location)
+            result = await run_live_agent(
+                "adjust_itinerary",
+                current_itinerary=current_itinerary,
+                mood_state=mood_state,
+                current_time=current_time,
+                current_location=current_location,
+                travel_times=travel_times.to_prompt(route_locations(current_itinerary, current_time, current_location))
+            )
+
+        body = itinerary_adjusted(session, itinerary, result, travel_times, data.get('response'))
+        await update_session_activity(session_id, session)
+
+        return respond(body)
+
+    except AgentPoolExhausted:
+        raise
+    except Exception as e:
+        body = live_agent_failure(session, "Error adjusting itinerary", "Failed to adjust itinerary", e)
+        await save_session(session_id, session)
+        return respond(body, 500)
+
+async def nearby_venues(location, radius_km):
+    """Geocoded venues within radius_km of a location, nearest first; [] if the location cannot be placed"""
+    try:
+        radius_km = float(radius_km)
+    except (TypeError, ValueError):
+        return []
+    point = parse_coordinates(location)
+    if point is None:
+        result = await ageocode(location)
+        if not result.ok:
+            return []
+        point = result.point
+    return venue_index.within(point.latitude, point.longitude, radius_km, NEARBY_VENUE_LIMIT, exclude=location)
+
+@app.post('/sessions/{session_id}/find-alternatives')
+async def find_alternatives(session_id: str, request: Request):
+    """Find alternative venues near current location"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'activity_type' not in data:
+        return respond({"error": "Activity type is required"}, 400)
+
+    activity_type, location, radius_km, mood_state = alternatives_request(session, data)
+
+    try:
+        # Known venues inside the radius go into the prompt, so suggestions are really distance-bounded
+        venues = await nearby_venues(location, radius_km)
+        query, near_parts = alternatives_cache_key(activity_type, location, radius_km, mood_state, venues)
+        alternatives = response_cache.get(query, live_itinerary_agents.fingerprint, near_parts)
+        if alternatives is None:
+            alternatives = await agent_flight.do(
+                (live_itinerary_agents.name, normalize_prompt(query)),
+                run_live_agent,
+                "find_nearby_alternatives",
+                activity_type=activity_type,
+                location=location,
+                radius_km=radius_km,
+                mood_state=mood_state,
+                nearby_venues=venues
+            )
+            response_cache.set(query, live_itinerary_agents.fingerprint, alternatives, near_parts)
+
+        add_to_chat_history(session, "system", "Found alternatives", alternatives)
+        await update_session_activity(session_id, session)
+
+        return respond({
+            "message": "Alternatives found successfully",
+            "alternatives": alternatives
+        })
+
+    except AgentPoolExhausted:
+        raise
+    except Exception as e:
+        body = live_agent_failure(session, "Error finding alternatives", "Failed to find alternatives", e)
+        await save_session(session_id, session)
+        return respond(body, 500)
+
+@app.post('/sessions/{session_id}/emergency-reroute')
+async def emergency_reroute(session_id: str, request: Request):
+    """Handle emergency rerouting situations"""
+    session = await get_session(session_id)
+    if not session:
+        return respond({"error": "Session not found"}, 404)
+
+    data = await read_json(request)
+    if not data or 'current_situation' not in data or 'destination' not in data:
+        return respond({"error": "Current situation and destination are required"}, 400)
+
+    current_situation = data['current_situation']
+
+    add_to_chat_history(session, "user", f"Emergency reroute request: {current_situation}")
+
+    try:
+        reroute_plan = await run_live_agent(
+            "emergency_reroute",
+            current_situation=current_situation,
+            destination=data['destination'],
+            urgency_level=data.get('urgency_level', 'high')
+        )
+
+        add_to_chat_history(session, "system", "Emergency reroute plan", reroute_plan)
+        await update_session_activity(session_id, session)
+
+        return respond({
+            "message": "Emergency reroute completed",
+            "reroute_plan": reroute_plan
+        })
+
+    except AgentPoolExhausted:
+        raise
+    except Exception as e:
+        body = live_agent_failure(session, "Error with emergency reroute", "Failed to create emergency reroute", e)
+        await save_session(session_id, session)
+        return respond(body, 500)
+
+@app.post('/cleanup-sessions')
+async def cleanup_old_sessions(request: Request):
+    """Admin endpoint to clean up old sessions"""
+    data = await read_json(request)
+    hours = data.get('hours', 24) if data else 24
+
+    old_sessions = await session_store.expire_idle(float(hours) * 3600)
+
+    return respond({
+        "message": f"Cleaned up {len(old_sessions)} old sessions",
+        "removed_sessions": old_sessions
+    })
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", 5000)))
@@ -0,0 +1,154 @@
+import asyncio
+from typing import List
+
+import httpx
+
+from geocodeCache import geocode_cache, normalize_location_key
+from geocodeTypes import GeocodeResult, GeocodeStatus
+from geolocation import (
+    GEOCODE_MAX_QUEUE_SECONDS, GEOCODE_MAX_RETRIES, GEOCODE_MAX_WORKERS,
+    geocode_rate_limiter, geocode_circuit_breaker,
+    _geocode_url, _interpret_geocode_data, _busy_result, _unavailable_result
+)
+from httpClient import http_get_async
+from singleFlight import AsyncSingleFlight
+
+# Async counterparts of geocode() and geocode_many() for the ASGI app. They share the
+# cache, rate limiter and circuit breaker with the threaded versions, so both apps
+# stay inside the same geocode.xyz budget.
+
+# Same cap on simultaneous lookups as the thread pool behind geocode_many
+_geocode_slots = asyncio.Semaphore(GEOCODE_MAX_WORKERS)
+
+# Concurrent lookups of the same place share one provider request
+ageocode_flight = AsyncSingleFlight("geocode")
+
+
+async def ageocode(location_name: str) -> GeocodeResult:
+    """
+    Resolve a location to a structured GeocodeResult without blocking the event loop.
+
+    Args:
+        location_name (str): The name of the location to geocode
+
+    Returns:
+        GeocodeResult: Float coordinates on success, otherwise a status and message
+    """
+    # Memory hits are a dict lookup and disk hits a single indexed read, so no thread hop
+    cached = geocode_cache.get(location_name)
+    if cached is not None:
+        return cached
+
+    return await _ageocode_shared(location_name)
+
+
+async def ageocode_many(location_names: List[str]) -> List[GeocodeResult]:
+    """
+    Resolve several locations concurrently on the event loop.
+
+    Args:
+        location_names (List[str]): Locations to geocode
+
+    Returns:
+        List[GeocodeResult]: Results in the same order as location_names
+    """
+    resolved = {}
+    pending = {}
+    for location_name in location_names:
+        key = normalize_location_key(location_name)
+        if key in resolved or key in pending:
+            continue
+        cached = geocode_cache.get(location_name)
+        if cached is not None:
+            resolved[key] = cached
+        else:
+            pending[key] = _ageocode_shared(location_name)
+
+    if pending:
+        resolved.update(zip(pending.keys(), await asyncio.gather(*pending.values())))
+
+    return [resolved[normalize_location_key(name)] for name in location_names]
+
+
+async def _ageocode_shared(location_name: str) -> GeocodeResult:
+    """_ageocode_and_cache, joining a lookup of the same place that is already in flight"""
+    return await ageocode_flight.do(normalize_location_key(location_name), _ageocode_and_cache, location_name)
+
+
+async def _ageocode_and_cache(location_name: str) -> GeocodeResult:
+    """Fetch a location from the provider and store definitive answers in the cache"""
+    async with _geocode_slots:
+        result = await _afetch_location_coordinates(location_name)
+
+    # Only definitive answers are cached; the SQLite write happens off the event loop
+    if result.status is not GeocodeStatus.ERROR:
+        await asyncio.to_thread(geocode_cache.set, location_name, result)
+
+    return result
+
+
+async def _afetch_location_coordinates(location_name: str) -> GeocodeResult:
+    """
+    Query geocode.xyz for a location with httpx, bypassing the cache.
+
+    Mirrors _fetch_location_coordinates: same retries, backoff, rate limiting and
+    circuit breaker, but every wait is an await.
+
+    Returns:
+        GeocodeResult: OK, NOT_FOUND (safe to cache) or ERROR (transient)
+    """
+    try:
+        url = _geocode_url(location_name)
+        if url is None:
+            return GeocodeResult.error(location_name, "Error: geocode.xyz API key not found in .env file. Please set GEOCODE_XYZ_API_KEY.")
+
+        max_retries = GEOCODE_MAX_RETRIES
+        retry_delay = 1
+
+        for attempt in range(max_retries):
+            # Check the breaker before queueing so an open circuit spends no tokens
+            if not geocode_circuit_breaker.allow():
+                return _unavailable_result(location_name)
+
+            try:
+                if not await geocode_rate_limiter.acquire_async(timeout=GEOCODE_MAX_QUEUE_SECONDS):
+                    geocode_circuit_breaker.release()
+                    return _busy_result(location_name)
+
+                response = await http_get_async(url)
+                response.raise_for_status()
+
+                result = _interpret_geocode_data(location_name, response.json(), attempt == max_retries - 1)
+                if result is None:
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2
+                    continue
+                return result
+
+            except httpx.HTTPError as e:
+                geocode_circuit_breaker.record_failure()
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2
+                    continue
+                return GeocodeResult.error(location_name, f"Error getting coordinates after {max_retries} attempts: {str(e)}. Check your internet connection.")
+
+            except (ValueError, KeyError) as e:
+                geocode_circuit_breaker.record_failure()
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(retry_delay)
+                    retry_delay *= 2
+                    continue
+                return GeocodeResult.error(location_name, f"Error parsing API response: {str(e)}. Try another location name or format.")
+
+            except asyncio.CancelledError:
+                # The call may or may not have reached the provider; just free the trial slot
+                geocode_circuit_breaker.release()
+                raise
+
+            except Exception as e:
+                geocode_circuit_breaker.record_failure()
+                return GeocodeResult.error(location_name, f"Error getting coordinates: {str(e)}. Try another location name or format.")
+
+    except Exception as e:
+        return GeocodeResult.error(location_name, f"Error getting coordinates: {str(e)}. Try another location name or format.")
@@ -0,0 +1,108 @@
+import sys
+import timeit
+
+from extraction import extract_attractions, extract_hotels, parse_adjustment_markdown
+from geocodeTypes import GeocodeResult
+from responseProcessing import ATTRACTION_PATTERN, annotate_with_coordinates, find_numbered_items
+
+# Micro-benchmarks for the response post-processing hot paths.
+# Run with `python benchmarks.py [name ...]`; nothing here calls an agent or the network.
+# Correctness of the same code paths is covered by tests/, which also check the
+# recorded responses below against the parsers they replaced.
+
+RECORDED_PLACES = """Here are the top attractions to visit in Pune for 3 days:
+
+1. **Shaniwar Wada**: An 18th-century fortification that was the seat of the Peshwas. Visit early morning to avoid crowds; the light and sound show runs in the evening.
+**Coordinates**: Latitude: 18.5195, Longitude: 73.8553 (Shaniwar Wada, Pune)
+
+2. **Aga Khan Palace**: A historic palace linked to the freedom movement, with gardens and a memorial to Kasturba Gandhi. Plan about two hours.
+
+3. **Sinhagad Fort:** A hill fort 35 km from the city with a steep trek and famous pitla-bhakri stalls at the top.
+
+4. **Dagdusheth Halwai Ganpati Temple**: One of the most visited temples in Maharashtra, lit up beautifully at night.
+
+5. **Osho Teerth Park**: A quiet landscaped garden in Koregaon Park, good for a slow morning walk.
+"""
+
+RECORDED_HOTELS = """Based on your selected places, here are accommodation options in Pune:
+
+1. **The Westin Pune Koregaon Park**: Luxury hotel by the river, close to Osho Teerth Park. ₹9,500 per night.
+
+2. **Hotel Shreyas:** Mid-range option on Apte Road, walking distance to Deccan. ₹3,200 per night.
+
+3. **Zostel Pune**: Budget hostel with dorms and private rooms in Viman Nagar. ₹900 per night.
+"""
+
+RECORDED_ADJUSTMENT = """Since the group is feeling tired, here is a lighter plan for the rest of the day.
+
+## 🚫 Activities to Cancel/Modify
+• Sinhagad Fort Trek: The trek is strenuous and the group needs rest
+- Evening Shopping at Laxmi Road: Crowded and tiring after a long day
+
+## ✨ Recommended Alternatives
+• Spa Session at Heavenly Spa: A relaxing massage to recover energy
+  - Recommended Venue: Heavenly Spa, Koregaon Park
+  - Booking Link: https://example.com/heavenly-spa
+  - Availability: Open until 21:00
+• Quiet Dinner at Malaka Spice: Calm ambience and short travel
+  - Recommended Venue: Malaka Spice, North Main Road
+  - Availability: Tables available after 19:30
+
+## 📅 Updated Schedule
+• 15:00 - 16:30: Rest at the hotel
+• 17:00 - 18:30: Spa Session at Heavenly Spa
+• 8:00 PM: Quiet Dinner at Malaka Spice
+
+## 💰 Cost Impact
+The spa adds about ₹2,500 per person.
+Cancelling the trek saves ₹600 in transport.
+"""
+
+
+def _time(function, loops):
+    """Milliseconds per call of function, averaged over loops"""
+    return timeit.timeit(function, number=loops) / loops * 1000
+
+
+def bench_annotation(loops=200):
+    """Annotate suggestion lists of 10, 50 and 200 numbered items with coordinates"""
+    for item_count in (10, 50, 200):
+        response = "Here are the top attractions:\n\n" + "\n\n".join(
+            f"{number}. **Attraction {number}**: A short description of attraction {number}, "
+            "why it is worth visiting and how long to spend there."
+            for number in range(1, item_count + 1)
+        )
+        results = [GeocodeResult.found(f"Attraction {number}", 18.5, 73.8, "Pune") for number in range(item_count)]
+
+        def run():
+            items = find_numbered_items(response, ATTRACTION_PATTERN)
+            return annotate_with_coordinates(response, items, results)
+
+        print(f"annotation  {item_count:>4} items, {len(response):>6} chars: {_time(run, loops):.3f} ms")
+
+
+def bench_extraction(loops=500):
+    """Extract attractions, hotels and an adjustment from the recorded responses at 1x, 10x and 50x their size"""
+    # Longer days repeat the schedule section; the other sections appear once as in a real reply
+    head, schedule = RECORDED_ADJUSTMENT.split("## 📅 Updated Schedule")
+    schedule_lines, cost = schedule.split("## 💰 Cost Impact")
+    for repeat in (1, 10, 50):
+        places = RECORDED_PLACES * repeat
+        hotels = RECORDED_HOTELS * repeat
+        adjustment = f"{head}## 📅 Updated Schedule{schedule_lines * repeat}## 💰 Cost Impact{cost}"
+        count = max(loops // repeat, 20)
+        print(f"attractions x{repeat:<3} {len(places):>6} chars: {_time(lambda: extract_attractions(places), count):.4f} ms")
+        print(f"hotels      x{repeat:<3} {len(hotels):>6} chars: {_time(lambda: extract_hotels(hotels), count):.4f} ms")
+        print(f"adjustment  x{repeat:<3} {len(adjustment):>6} chars: "
+              f"{_time(lambda: parse_adjustment_markdown(adjustment), count):.4f} ms")
+
+
+BENCHMARKS = {
+    "annotation": bench_annotation,
+    "extraction": bench_extraction,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -6,16 +6,23 @@ from dotenv import load_dotenv
 import os
 load_dotenv()
 class TravelOptionsFinder:
+    MODEL_ID = "llama-3.3-70b-versatile"
+
+    @staticmethod
+    def tools():
+        """Fresh tool set for one agent (see InteractiveTravelAgent.tools)"""
+        return [DuckDuckGo()]
+
     def __init__(self):
         api_key_groq = os.getenv("GROQ_API_KEY")
         self.agent = Agent(
             model=Groq(
-                id="llama-3.3-70b-versatile",
-                api_key={api_key_groq},
+                id=self.MODEL_ID,
+                api_key=api_key_groq,
                 max_tokens=10000
             ),
             markdown=True,
-            tools=[DuckDuckGo()],
+            tools=self.tools(),
             description="You are a specialized travel consultant who finds the best transportation and accommodation options for travelers based on their itineraries.",
             instructions=[
                 """Your role is to help users find the best travel options and accommodations for their planned trips:
@@ -0,0 +1,154 @@
+import base64
+import json
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Optional
+
+# Defaults can be overridden from the .env file via app.py
+DEFAULT_MAX_ENTRIES = 200
+DEFAULT_COMPRESS_MIN_BYTES = 1024
+
+# How a response body is stored
+_BODY_TEXT = 0          # plain str
+_BODY_JSON = 1          # JSON text of a dict/list response
+_BODY_ZLIB_TEXT = 2     # zlib-compressed str
+_BODY_ZLIB_JSON = 3     # zlib-compressed JSON text
+
+
+class ChatEntry:
+    """One chat message; long response bodies are kept zlib-compressed until read"""
+
+    __slots__ = ("id", "timestamp", "source", "message", "body", "encoding")
+
+    def __init__(self, entry_id, timestamp, source, message, body=None, encoding=_BODY_TEXT):
+        self.id = entry_id
+        self.timestamp = timestamp
+        self.source = source
+        self.message = message
+        self.body = body
+        self.encoding = encoding
+
+    @classmethod
+    def create(cls, entry_id, source, message, response=None, compress_min_bytes=DEFAULT_COMPRESS_MIN_BYTES):
+        body, encoding = None, _BODY_TEXT
+        if response:
+            if isinstance(response, str):
+                body, encoding = response, _BODY_TEXT
+            else:
+                body, encoding = json.dumps(response, separators=(",", ":")), _BODY_JSON
+            if compress_min_bytes is not None and len(body) >= compress_min_bytes:
+                body = zlib.compress(body.encode("utf-8"))
+                encoding += 2
+        return cls(entry_id, time.time(), source, message, body, encoding)
+
+    @property
+    def response(self):
+        if self.body is None:
+            return None
+        body = self.body
+        if self.encoding >= _BODY_ZLIB_TEXT:
+            body = zlib.decompress(body).decode("utf-8")
+        if self.encoding in (_BODY_JSON, _BODY_ZLIB_JSON):
+            return json.loads(body)
+        return body
+
+    def to_dict(self) -> Dict[str, Any]:
+        """API form, matching the entries the endpoint has always returned plus an id"""
+        entry = {
+            "id": self.id,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "source": self.source,
+            "message": self.message
+        }
+        if self.body is not None:
+            entry["response"] = self.response
+        return entry
+
+    def to_state(self) -> list:
+        """Compact JSON-safe form for session stores"""
+        body = self.body
+        if isinstance(body, bytes):
+            body = base64.b64encode(body).decode("ascii")
+        return [self.id, round(self.timestamp, 3), self.source, self.message, body, self.encoding]
+
+    @classmethod
+    def from_state(cls, state) -> "ChatEntry":
+        entry_id, timestamp, source, message, body, encoding = state
+        if encoding >= _BODY_ZLIB_TEXT and body is not None:
+            body = base64.b64decode(body)
+        return cls(entry_id, timestamp, source, message, body, encoding)
+
+
+class ChatHistory:
+    """
+    Ring buffer of the most recent chat entries of a session.
+
+    Entry ids keep increasing after old entries fall off the front, so they work as
+    paging cursors: page(cursor=id) returns the entries that came after that id.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, compress_min_bytes=DEFAULT_COMPRESS_MIN_BYTES,
+                 entries=None, next_id=0):
+        self.max_entries = max_entries
+        self.compress_min_bytes = compress_min_bytes
+        self.entries = deque(entries or (), maxlen=max_entries)
+        self.next_id = next_id
+
+    def append(self, source, message, response=None) -> ChatEntry:
+        entry = ChatEntry.create(self.next_id, source, message, response, self.compress_min_bytes)
+        self.next_id += 1
+        self.entries.append(entry)
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def total(self) -> int:
+        """Messages ever added, including the ones that fell out of the buffer"""
+        return self.next_id
+
+    def page(self, cursor: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        Return up to `limit` entries that come after `cursor`.
+
+        Args:
+            cursor: Id of the last entry the client has seen; None starts at the oldest retained entry
+            limit: Maximum number of entries to return
+
+        Returns:
+            dict: entries, next_cursor (pass back to get the following entries or poll for new ones) and has_more
+        """
+        start = 0
+        if cursor is not None and self.entries:
+            start = max(0, cursor + 1 - self.entries[0].id)
+        page = list(islice(self.entries, start, start + limit))
+        has_more = start + len(page) < len(self.entries)
+        next_cursor = page[-1].id if page else cursor
+        return {
+            "entries": [entry.to_dict() for entry in page],
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        return {"next_id": self.next_id, "entries": [entry.to_state() for entry in self.entries]}
+
+    @classmethod
+    def from_state(cls, state, max_entries=DEFAULT_MAX_ENTRIES,
+                   compress_min_bytes=DEFAULT_COMPRESS_MIN_BYTES) -> "ChatHistory":
+        """Rebuild from to_state() output, or from the plain list of dicts older sessions stored"""
+        if isinstance(state, ChatHistory):
+            return state
+        if isinstance(state, list):
+            history = cls(max_entries, compress_min_bytes)
+            for old_entry in state:
+                entry = history.append(old_entry.get("source"), old_entry.get("message"), old_entry.get("response"))
+                if old_entry.get("timestamp"):
+                    entry.timestamp = datetime.fromisoformat(old_entry["timestamp"]).timestamp()
+            return history
+        entries = [ChatEntry.from_state(entry) for entry in state.get("entries", [])]
+        return cls(max_entries, compress_min_bytes, entries, state.get("next_id", len(entries)))
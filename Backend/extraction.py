@@ -0,0 +1,219 @@
+import re
+from typing import Any, Dict, List
+
+# Agent markdown turned into typed records. Every pattern is compiled once at import
+# and each response is scanned once: numbered items with one finditer, and the
+# adjustment reply split at its section headings before any line is looked at.
+
+# Numbered markdown items as the agents write them: "1. **Name**: description" or "1. **Name:** ..."
+ATTRACTION_PATTERN = re.compile(r'(?P<number>\d+)\.\s+\*\*(?P<name>[^*:]+)(?:\*\*|:)')
+HOTEL_PATTERN = re.compile(r'(?P<number>\d+)\.\s+\*\*(?P<name>[^:]+)(?:\*\*|:)')
+
+# The section headings adjust_itinerary asks for (agentPrompts.ADJUSTMENT_MARKDOWN_FORMAT), emoji optional.
+# They are found with str.find: four literal scans of a reply beat one regex alternation
+# several times over, since the regex retries every alternative at every position.
+# When one line holds several headings the first listed here wins.
+_SECTION_HEADINGS = (
+    ("cancel", "Activities to Cancel"),
+    ("alternatives", "Recommended Alternatives"),
+    ("schedule", "Updated Schedule"),
+    ("cost", "Cost Impact"),
+)
+# "20:00 - 21:30: Dinner" or "8 PM: Dinner"; the time may be a range and hold colons of its own
+_CLOCK = r'\d{1,2}(?::\d{2})?\s*(?:[AaPp]\.?[Mm]\.?)?'
+_SCHEDULE_ENTRY_PATTERN = re.compile(rf'(?P<time>{_CLOCK}(?:\s*(?:-|–|to)\s*{_CLOCK})?)\s*:\s*(?P<name>.*\S)')
+# Detail lines under an alternative rather than a new alternative
+_ALTERNATIVE_DETAILS = ("Recommended Venue", "Booking Link", "Availability")
+_VENUE_PREFIX = "Recommended Venue:"
+
+
+class NumberedItem:
+    """
+    A numbered item found in an agent response and where its description ends.
+
+    number is the number the agent printed, which is what users pick from; it can
+    differ from the item's position when the model skips or restarts numbering.
+    """
+
+    __slots__ = ("name", "start", "end", "number")
+
+    def __init__(self, name, start, end, number=None):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.number = number
+
+
+class Attraction(NumberedItem):
+    """A numbered attraction in a suggest-places response"""
+
+    __slots__ = ()
+
+
+class Hotel(NumberedItem):
+    """A numbered accommodation in a suggest-accommodations response"""
+
+    __slots__ = ()
+
+
+class AlternativeRecord:
+    """A venue suggested in place of a cancelled activity (itineraryTypes.AlternativeActivity)"""
+
+    __slots__ = ("name", "location", "reason", "estimated_time")
+
+    def __init__(self, name, reason, location="To be determined", estimated_time="Flexible"):
+        self.name = name
+        self.location = location
+        self.reason = reason
+        self.estimated_time = estimated_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "location": self.location, "reason": self.reason, "estimated_time": self.estimated_time}
+
+
+class ScheduleRecord:
+    """One line of an updated schedule (itineraryTypes.ScheduleEntry)"""
+
+    __slots__ = ("time", "name", "location", "status")
+
+    def __init__(self, time, name, location="See details", status="upcoming"):
+        self.time = time
+        self.name = name
+        self.location = location
+        self.status = status
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"time": self.time, "name": self.name, "location": self.location, "status": self.status}
+
+
+def find_numbered_items(text, pattern=ATTRACTION_PATTERN, record=NumberedItem):
+    """
+    Find every numbered item and the end of its description in one scan.
+
+    An item's description ends at the first blank line after it or at the start of
+    the next item, whichever comes first; trailing whitespace is not included.
+    Each search is bounded by the next item, so the whole scan is linear in the
+    length of the text.
+
+    Args:
+        text: Agent response in markdown
+        pattern: Compiled pattern with "number" and "name" groups
+        record: NumberedItem class to build for each item
+
+    Returns:
+        List[NumberedItem]: Items in document order
+    """
+    matches = list(pattern.finditer(text))
+    items = []
+    for index, match in enumerate(matches):
+        limit = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        end = text.find("\n\n", match.end(), limit)
+        if end == -1:
+            end = limit
+        while end > match.end() and text[end - 1].isspace():
+            end -= 1
+        items.append(record(match.group("name").strip(), match.start(), end, int(match.group("number"))))
+    return items
+
+
+def extract_attractions(text) -> List[Attraction]:
+    """Numbered attractions in a suggest-places response, in document order"""
+    return find_numbered_items(text, ATTRACTION_PATTERN, Attraction)
+
+
+def extract_hotels(text) -> List[Hotel]:
+    """Numbered accommodations in a suggest-accommodations response, in document order"""
+    return find_numbered_items(text, HOTEL_PATTERN, Hotel)
+
+
+def _sections(content):
+    """(section, body) for each heading line in the reply, in order; text before the first heading is skipped"""
+    # line start -> (priority, section)
+    headings = {}
+    for priority, (section, heading) in enumerate(_SECTION_HEADINGS):
+        position = content.find(heading)
+        while position != -1:
+            line_start = content.rfind("\n", 0, position) + 1
+            if headings.get(line_start, (len(_SECTION_HEADINGS),))[0] > priority:
+                headings[line_start] = (priority, section)
+            position = content.find(heading, position + len(heading))
+
+    starts = sorted(headings)
+    for index, line_start in enumerate(starts):
+        body_start = content.find("\n", line_start)
+        if body_start == -1:
+            return
+        body_end = starts[index + 1] - 1 if index + 1 < len(starts) else len(content)
+        yield headings[line_start][1], content[body_start + 1:max(body_end, body_start + 1)]
+
+
+def parse_schedule_line(text) -> ScheduleRecord:
+    """A schedule bullet such as "20:00 - 21:30: Dinner"; text without a leading time splits at its first colon"""
+    # Clock times never have a space after their colon, so ": " separates time from name in the common case
+    time_part, separator, name_part = text.partition(": ")
+    if separator:
+        return ScheduleRecord(time_part.strip(), name_part.strip())
+    match = _SCHEDULE_ENTRY_PATTERN.match(text)
+    if match:
+        return ScheduleRecord(match.group("time").strip(), match.group("name"))
+    time_part, _, name_part = text.partition(":")
+    return ScheduleRecord(time_part.strip(), name_part.strip())
+
+
+def parse_adjustment_markdown(content) -> Dict[str, Any]:
+    """
+    Recover an itinerary adjustment from a markdown reply with the section headings requested in the prompt.
+
+    The reply is split at its headings first, so lines are never tested against
+    each heading; inside a section only bullets are looked at.
+
+    Args:
+        content: Agent reply with "Activities to Cancel", "Recommended Alternatives",
+            "Updated Schedule" and "Cost Impact" sections of "•" or "-" bullets
+
+    Returns:
+        dict in the shape of itineraryTypes.ItineraryAdjustment, with the whole reply as
+        reasoning and an empty summary
+    """
+    cancel = []
+    alternatives = []
+    schedule = []
+    cost = []
+    current_alternative = None
+
+    for section, body in _sections(content):
+        for line in body.split("\n"):
+            line = line.strip()
+            if not line.startswith(("•", "-")):
+                if section == "cost" and line:
+                    cost.append(line)
+                continue
+
+            text = line.lstrip("•-").strip()
+            if section == "cancel":
+                # Activity name before the colon
+                cancel.append(text.split(":", 1)[0].strip())
+            elif section == "schedule":
+                if ":" in text:
+                    schedule.append(parse_schedule_line(text))
+            elif section == "alternatives":
+                if not text.startswith(_ALTERNATIVE_DETAILS):
+                    if ":" in text:
+                        if current_alternative is not None and current_alternative.name:
+                            alternatives.append(current_alternative)
+                        name, _, reason = text.partition(":")
+                        current_alternative = AlternativeRecord(name.strip(), reason.strip())
+                elif text.startswith(_VENUE_PREFIX) and current_alternative is not None:
+                    current_alternative.location = text[len(_VENUE_PREFIX):].strip()
+
+    if current_alternative is not None and current_alternative.name:
+        alternatives.append(current_alternative)
+
+    return {
+        "activities_to_cancel": cancel,
+        "alternative_activities": [alternative.to_dict() for alternative in alternatives],
+        "updated_schedule": [entry.to_dict() for entry in schedule],
+        "estimated_cost_impact": "".join(f"{line} " for line in cost),
+        "reasoning": content,
+        "summary": "",
+    }
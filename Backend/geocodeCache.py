@@ -0,0 +1,200 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from geocodeTypes import GeocodeResult, GeocodeStatus
+
+load_dotenv()
+
+# Defaults can be overridden from the .env file
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600        # Places rarely move, keep hits for 30 days
+DEFAULT_NEGATIVE_TTL_SECONDS = 6 * 3600     # Retry unknown places a few times a day
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_COMMA_RE = re.compile(r"\s*,\s*")
+
+
+def normalize_location_key(location_name: str) -> str:
+    """
+    Normalize a location name so that trivially different spellings share a cache entry.
+
+    "  Eiffel Tower ,Paris,  France " and "eiffel tower, paris, france" map to the same key.
+    """
+    key = _WHITESPACE_RE.sub(" ", location_name.strip().lower())
+    key = _COMMA_RE.sub(", ", key)
+    return key.strip(" ,.")
+
+
+class GeocodeCache:
+    """
+    Two-level cache for geocoding results: an in-process LRU in front of a SQLite table.
+
+    Positive results (coordinates found) and negative results (location not found)
+    are kept with separate TTLs. Transient failures should never be stored here.
+    The LRU holds GeocodeResult objects; SQLite holds their JSON form.
+    """
+
+    def __init__(self, db_path=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, negative_ttl_seconds=DEFAULT_NEGATIVE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+
+        # key -> (expires_at, GeocodeResult, negative)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+        # Called with every result stored through set(), e.g. to keep the venue index current
+        self._listeners = []
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS geocode_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    negative INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+            self._db.commit()
+
+    def get(self, location_name: str) -> Optional[GeocodeResult]:
+        """Return the cached result for a location, or None on a miss or expired entry"""
+        key = normalize_location_key(location_name)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, negative = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    if negative:
+                        self._counters["negative_hits"] += 1
+                    return value
+                del self._entries[key]
+
+            # Fall back to the on-disk store
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, negative, expires_at FROM geocode_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, negative, expires_at = row
+                    try:
+                        value = GeocodeResult.from_json(value)
+                    except ValueError:
+                        # Written by an older version of the cache
+                        expires_at = 0
+                    if expires_at > now:
+                        self._remember(key, expires_at, value, bool(negative))
+                        self._counters["hits"] += 1
+                        self._counters["disk_hits"] += 1
+                        if negative:
+                            self._counters["negative_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM geocode_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, location_name: str, value: GeocodeResult) -> None:
+        """Store a result for a location, using the negative TTL for not-found results"""
+        key = normalize_location_key(location_name)
+        negative = value.status is GeocodeStatus.NOT_FOUND
+        ttl = self.negative_ttl_seconds if negative else self.ttl_seconds
+        expires_at = time.time() + ttl
+
+        with self._lock:
+            self._remember(key, expires_at, value, negative)
+            self._counters["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode_cache (key, value, negative, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, value.to_json(), int(negative), expires_at),
+                )
+                self._db.commit()
+
+        for listener in self._listeners:
+            listener(value)
+
+    def add_listener(self, listener: Callable[[GeocodeResult], None]) -> None:
+        """Call listener with each result stored from now on"""
+        self._listeners.append(listener)
+
+    def positive_results(self) -> List[GeocodeResult]:
+        """Every unexpired result with coordinates, from memory and disk"""
+        now = time.time()
+        with self._lock:
+            results = {key: value for key, (expires_at, value, negative) in self._entries.items()
+                       if not negative and expires_at > now}
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT key, value FROM geocode_cache WHERE negative = 0 AND expires_at > ?", (now,)
+                ).fetchall()
+                for key, value in rows:
+                    if key in results:
+                        continue
+                    try:
+                        results[key] = GeocodeResult.from_json(value)
+                    except ValueError:
+                        continue
+        return [result for result in results.values() if result.ok]
+
+    def clear(self) -> None:
+        """Drop every cached entry from memory and disk"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM geocode_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size of the in-memory LRU"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, expires_at, value, negative):
+        """Insert into the in-memory LRU, evicting the least recently used entries (lock held)"""
+        self._entries[key] = (expires_at, value, negative)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+
+def _build_default_cache() -> GeocodeCache:
+    """Create the process-wide cache from environment settings"""
+    return GeocodeCache(
+        db_path=os.getenv("GEOCODE_CACHE_PATH", DEFAULT_CACHE_PATH),
+        max_entries=int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        ttl_seconds=float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        negative_ttl_seconds=float(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL_SECONDS", DEFAULT_NEGATIVE_TTL_SECONDS)),
+    )
+
+
+# Shared by every caller of get_location_coordinates in this process
+geocode_cache = _build_default_cache()
@@ -0,0 +1,163 @@
+import json
+import math
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+
+class GeocodeStatus(str, Enum):
+    """Outcome of a geocoding lookup"""
+    OK = "ok"
+    NOT_FOUND = "not_found"
+    ERROR = "error"
+
+
+class GeoPoint:
+    """A latitude/longitude pair in decimal degrees"""
+
+    __slots__ = ("latitude", "longitude")
+
+    def __init__(self, latitude: float, longitude: float):
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+
+    def __iter__(self):
+        yield self.latitude
+        yield self.longitude
+
+    def __eq__(self, other):
+        return isinstance(other, GeoPoint) and self.latitude == other.latitude and self.longitude == other.longitude
+
+    def __hash__(self):
+        return hash((self.latitude, self.longitude))
+
+    def __repr__(self):
+        return f"GeoPoint({self.latitude}, {self.longitude})"
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(latitude_a: float, longitude_a: float, latitude_b: float, longitude_b: float) -> float:
+    """Great-circle distance in kilometres between two points in decimal degrees"""
+    phi_a, phi_b = math.radians(latitude_a), math.radians(latitude_b)
+    half_dphi = (phi_b - phi_a) / 2
+    half_dlambda = math.radians(longitude_b - longitude_a) / 2
+    h = math.sin(half_dphi) ** 2 + math.cos(phi_a) * math.cos(phi_b) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class GeocodeResult:
+    """
+    Result of resolving a location name.
+
+    Successful lookups carry a GeoPoint and the provider's formatted address;
+    failures carry a human-readable message. When the provider sent coordinates
+    as strings, coordinate_text keeps them as sent for the legacy string form.
+    The JSON and legacy string forms are built on first use and then reused,
+    since cached results are served many times.
+    """
+
+    __slots__ = ("query", "status", "point", "address", "provider", "message", "coordinate_text", "_json", "_legacy")
+
+    def __init__(self, query: str, status: GeocodeStatus, point: Optional[GeoPoint] = None,
+                 address: Optional[str] = None, provider: str = "geocode.xyz", message: Optional[str] = None,
+                 coordinate_text: Optional[Tuple[str, str]] = None):
+        self.query = query
+        self.status = GeocodeStatus(status)
+        self.point = point
+        self.address = address
+        self.provider = provider
+        self.message = message
+        self.coordinate_text = coordinate_text
+        self._json = None
+        self._legacy = None
+
+    @classmethod
+    def found(cls, query: str, latitude, longitude, address: str, provider: str = "geocode.xyz") -> "GeocodeResult":
+        coordinate_text = (latitude, longitude) if isinstance(latitude, str) and isinstance(longitude, str) else None
+        return cls(query, GeocodeStatus.OK, GeoPoint(latitude, longitude), address=address, provider=provider,
+                   coordinate_text=coordinate_text)
+
+    @classmethod
+    def not_found(cls, query: str, message: str, provider: str = "geocode.xyz") -> "GeocodeResult":
+        return cls(query, GeocodeStatus.NOT_FOUND, provider=provider, message=message)
+
+    @classmethod
+    def error(cls, query: str, message: str, provider: str = "geocode.xyz") -> "GeocodeResult":
+        return cls(query, GeocodeStatus.ERROR, provider=provider, message=message)
+
+    @property
+    def ok(self) -> bool:
+        return self.status is GeocodeStatus.OK
+
+    @property
+    def latitude(self) -> Optional[float]:
+        return self.point.latitude if self.point is not None else None
+
+    @property
+    def longitude(self) -> Optional[float]:
+        return self.point.longitude if self.point is not None else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict with float coordinates, ready for jsonify"""
+        return {
+            "query": self.query,
+            "status": self.status.value,
+            "provider": self.provider,
+            "address": self.address,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "message": self.message,
+        }
+
+    def to_json(self) -> str:
+        if self._json is None:
+            data = self.to_dict()
+            if self.coordinate_text is not None:
+                data["coordinate_text"] = list(self.coordinate_text)
+            self._json = json.dumps(data, separators=(",", ":"))
+        return self._json
+
+    @classmethod
+    def from_json(cls, text: str) -> "GeocodeResult":
+        """Rebuild a result from to_json() output. Raises ValueError on anything else."""
+        try:
+            data = json.loads(text)
+            point = None
+            if data.get("latitude") is not None and data.get("longitude") is not None:
+                point = GeoPoint(data["latitude"], data["longitude"])
+            coordinate_text = data.get("coordinate_text")
+            result = cls(data["query"], data["status"], point, address=data.get("address"),
+                         provider=data.get("provider", "geocode.xyz"), message=data.get("message"),
+                         coordinate_text=tuple(coordinate_text) if coordinate_text else None)
+        except (TypeError, KeyError, AttributeError) as e:
+            raise ValueError(f"Not a serialized GeocodeResult: {e}")
+        result._json = text
+        return result
+
+    def to_legacy_string(self) -> str:
+        """
+        The string get_location_coordinates has always returned: str() of an
+        address/latitude/longitude dict on success, or the error sentence.
+
+        Coordinates are spelled as the provider sent them ("18.51950"); results
+        without coordinate_text, such as cache entries written before it was kept,
+        fall back to str() of the float ("18.5195").
+        """
+        if self._legacy is None:
+            if self.ok:
+                latitude, longitude = self.coordinate_text or (str(self.latitude), str(self.longitude))
+                self._legacy = str({
+                    "address": self.address,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                })
+            else:
+                self._legacy = self.message or ""
+        return self._legacy
+
+    def __str__(self):
+        return self.to_legacy_string()
+
+    def __repr__(self):
+        return f"GeocodeResult({self.query!r}, {self.status.value}, {self.point!r})"
@@ -12,11 +12,49 @@ import urllib.parse
 import os
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from geocodeCache import geocode_cache, normalize_location_key
+from geocodeTypes import GeocodeResult, GeocodeStatus
+from rateLimiter import TokenBucket, SQLiteTokenBucket, CircuitBreaker
+from httpClient import http_get, limit_host_connections
+from singleFlight import SingleFlight
 
 # Load environment variables from .env file
 load_dotenv()
 
+# geocode.xyz allows roughly two requests per second on the paid tier; every worker shares this budget.
+# Point GEOCODE_RATE_LIMIT_DB at a file to share the budget between worker processes as well.
+GEOCODE_RATE_PER_SECOND = float(os.getenv("GEOCODE_RATE_PER_SECOND", 2))
+GEOCODE_BURST = float(os.getenv("GEOCODE_BURST", 2))
+if os.getenv("GEOCODE_RATE_LIMIT_DB"):
+    geocode_rate_limiter = SQLiteTokenBucket(os.getenv("GEOCODE_RATE_LIMIT_DB"), "geocode.xyz", GEOCODE_RATE_PER_SECOND, GEOCODE_BURST)
+else:
+    geocode_rate_limiter = TokenBucket(GEOCODE_RATE_PER_SECOND, GEOCODE_BURST)
+
+# Longest a lookup may queue for a token before giving up
+GEOCODE_MAX_QUEUE_SECONDS = float(os.getenv("GEOCODE_MAX_QUEUE_SECONDS", 10))
+
+# Stop calling geocode.xyz for a while after repeated errors or 007 responses
+geocode_circuit_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("GEOCODE_BREAKER_FAILURES", 5)),
+    reset_timeout=float(os.getenv("GEOCODE_BREAKER_RESET_SECONDS", 30)),
+)
+
+# Bounded pool used by geocode_many so a single request cannot open unlimited connections
+GEOCODE_MAX_WORKERS = int(os.getenv("GEOCODE_MAX_WORKERS", 8))
+_geocode_executor = ThreadPoolExecutor(max_workers=GEOCODE_MAX_WORKERS, thread_name_prefix="geocode")
+
+# Concurrent lookups of the same place (e.g. a trending destination) share one provider request
+geocode_flight = SingleFlight("geocode")
+
+# Attempts per lookup; 007 replies and transport errors are retried with backoff
+GEOCODE_MAX_RETRIES = 3
+
+# Keep one warm connection per geocode worker
+GEOCODE_BASE_URL = "https://geocode.xyz/"
+limit_host_connections(GEOCODE_BASE_URL, GEOCODE_MAX_WORKERS)
+
 def get_location_coordinates(location_name: str) -> str:
     """
     Get the GPS coordinates (latitude and longitude) for a specified location using geocode.xyz API.
@@ -27,114 +65,230 @@ def get_location_coordinates(location_name: str) -> str:
     Returns:
         str: JSON string containing the address, latitude, and longitude of the location
     """
+    return geocode(location_name).to_legacy_string()
+
+def geocode(location_name: str) -> GeocodeResult:
+    """
+    Resolve a location to a structured GeocodeResult, using the shared cache.
+    
+    Args:
+        location_name (str): The name of the location to geocode
+    
+    Returns:
+        GeocodeResult: Float coordinates on success, otherwise a status and message
+    """
+    cached = geocode_cache.get(location_name)
+    if cached is not None:
+        return cached
+    
+    return _geocode_shared(location_name)
+
+def _geocode_shared(location_name: str) -> GeocodeResult:
+    """_geocode_and_cache, joining a lookup of the same place that is already in flight"""
+    return geocode_flight.do(normalize_location_key(location_name), _geocode_and_cache, location_name)
+
+def _geocode_and_cache(location_name: str) -> GeocodeResult:
+    """Fetch a location from the provider and store definitive answers in the cache"""
+    result = _fetch_location_coordinates(location_name)
+    
+    # Only definitive answers are cached; transient failures are retried next time
+    if result.status is not GeocodeStatus.ERROR:
+        geocode_cache.set(location_name, result)
+    
+    return result
+
+def geocode_many(location_names: List[str]) -> List[GeocodeResult]:
+    """
+    Resolve several locations concurrently.
+    
+    Duplicate names (after normalization) are looked up once, cache hits are answered
+    inline and only the misses are sent to the bounded worker pool. The shared rate
+    limiter keeps the pool within the provider's limits.
+    
+    Args:
+        location_names (List[str]): Locations to geocode
+    
+    Returns:
+        List[GeocodeResult]: Results in the same order as location_names
+    """
+    resolved = {}
+    pending = {}
+    for location_name in location_names:
+        key = normalize_location_key(location_name)
+        if key in resolved or key in pending:
+            continue
+        cached = geocode_cache.get(location_name)
+        if cached is not None:
+            resolved[key] = cached
+        else:
+            pending[key] = _geocode_executor.submit(_geocode_shared, location_name)
+    
+    for key, future in pending.items():
+        resolved[key] = future.result()
+    
+    return [resolved[normalize_location_key(name)] for name in location_names]
+
+def _fetch_location_coordinates(location_name: str):
+    """
+    Query geocode.xyz for a location, bypassing the cache.
+    
+    Returns:
+        GeocodeResult: OK, NOT_FOUND (safe to cache) or ERROR (transient)
+    """
     try:
-        # Get API key from .env file
-        api_key = os.getenv("GEOCODE_XYZ_API_KEY")
-        if not api_key:
-            return "Error: geocode.xyz API key not found in .env file. Please set GEOCODE_XYZ_API_KEY."
-        
-        # Base URL for the geocode.xyz API
-        base_url = "https://geocode.xyz/"
-        
-        # URL encode the location name
-        encoded_location = urllib.parse.quote(location_name)
-        
-        # Construct the URL with parameters - adding more parameters for improved results
-        url = f"{base_url}{encoded_location}?json=1&auth={api_key}&region=IN&fuzzy=1.0"
+        url = _geocode_url(location_name)
+        if url is None:
+            return GeocodeResult.error(location_name, "Error: geocode.xyz API key not found in .env file. Please set GEOCODE_XYZ_API_KEY.")
         
         # Make the request to the API with retry logic
-        max_retries = 3
+        max_retries = GEOCODE_MAX_RETRIES
         retry_delay = 1
         
         for attempt in range(max_retries):
+            # Fail fast while the provider is unhealthy, before queueing for (and spending) a token
+            if not geocode_circuit_breaker.allow():
+                return _unavailable_result(location_name)
+            
             try:
-                response = requests.get(url, timeout=10)
+                # Queue for the shared budget, but don't hold the worker indefinitely
+                if not geocode_rate_limiter.acquire(timeout=GEOCODE_MAX_QUEUE_SECONDS):
+                    geocode_circuit_breaker.release()
+                    return _busy_result(location_name)
+                
+                response = http_get(url)
                 response.raise_for_status()
                 
                 # Parse the JSON response
-                data = response.json()
-                
-                # Check if the API returned the specific error code 7
-                if "error" in data and "code" in data["error"] and data["error"]["code"] == "007":
-                    # For error code 7, try adding more location context
-                    if attempt < max_retries - 1:
-                        # Wait before retry with longer delay each time
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                        continue
-                    else:
-                        # If we're out of retries, return a more helpful error message
-                        return f"Location not found: '{location_name}'. Try using a more specific location name with state/country."
-                
-                # Check if the API returned any other error
-                elif "error" in data:
-                    return f"API Error: {data['error'].get('description', 'Unknown error')}"
-                
-                # Check if latitude and longitude are present and valid
-                if "latt" not in data or "longt" not in data:
-                    return f"Coordinates not found for '{location_name}'. API response missing coordinates."
-                
-                if data["latt"] == "0.00000" and data["longt"] == "0.00000":
-                    return f"Coordinates not found for '{location_name}'. Try providing more details like city or country."
-                    
-                # Get the formatted address or use the original location name if not available
-                address = data.get("standard", {}).get("addresst", location_name)
-                
-                # Prepare the result in the same format as the original function
-                result = {
-                    "address": address,
-                    "latitude": data["latt"],
-                    "longitude": data["longt"]
-                }
-                
-                # Add a small delay to respect usage limits
-                time.sleep(0.5)
-                
-                return str(result)
+                result = _interpret_geocode_data(location_name, response.json(), attempt == max_retries - 1)
+                if result is None:
+                    # Wait before retry with longer delay each time
+                    time.sleep(retry_delay)
+                    retry_delay *= 2
+                    continue
+                return result
             
             except requests.exceptions.RequestException as e:
+                geocode_circuit_breaker.record_failure()
                 if attempt < max_retries - 1:
                     # Wait before retry
                     time.sleep(retry_delay)
                     retry_delay *= 2
                     continue
-                return f"Error getting coordinates after {max_retries} attempts: {str(e)}. Check your internet connection."
+                return GeocodeResult.error(location_name, f"Error getting coordinates after {max_retries} attempts: {str(e)}. Check your internet connection.")
                 
             except (ValueError, KeyError) as e:
+                geocode_circuit_breaker.record_failure()
                 if attempt < max_retries - 1:
                     # Wait before retry
                     time.sleep(retry_delay)
                     retry_delay *= 2
                     continue
-                return f"Error parsing API response: {str(e)}. Try another location name or format."
+                return GeocodeResult.error(location_name, f"Error parsing API response: {str(e)}. Try another location name or format.")
+            
+            except Exception as e:
+                # Anything unexpected (e.g. an odd "error" payload) still settles the call,
+                # otherwise a half-open trial would hold the breaker shut for good
+                geocode_circuit_breaker.record_failure()
+                return GeocodeResult.error(location_name, f"Error getting coordinates: {str(e)}. Try another location name or format.")
                 
     except Exception as e:
-        return f"Error getting coordinates: {str(e)}. Try another location name or format."
+        return GeocodeResult.error(location_name, f"Error getting coordinates: {str(e)}. Try another location name or format.")
+
+def _geocode_url(location_name: str):
+    """Build the geocode.xyz lookup URL, or return None if no API key is configured"""
+    # Get API key from .env file
+    api_key = os.getenv("GEOCODE_XYZ_API_KEY")
+    if not api_key:
+        return None
+    
+    # URL encode the location name
+    encoded_location = urllib.parse.quote(location_name)
+    
+    # Construct the URL with parameters - adding more parameters for improved results
+    return f"{GEOCODE_BASE_URL}{encoded_location}?json=1&auth={api_key}&region=IN&fuzzy=1.0"
+
+def _busy_result(location_name: str) -> GeocodeResult:
+    return GeocodeResult.error(location_name, f"Error getting coordinates: geocoding is busy, try '{location_name}' again shortly.")
+
+def _unavailable_result(location_name: str) -> GeocodeResult:
+    return GeocodeResult.error(location_name, f"Error getting coordinates: geocoding service is temporarily unavailable, try '{location_name}' again shortly.")
+
+def _interpret_geocode_data(location_name: str, data: Dict[str, Any], last_attempt: bool):
+    """
+    Turn a decoded geocode.xyz reply into a GeocodeResult and record the outcome on the circuit breaker.
+    
+    Args:
+        location_name (str): The location that was looked up
+        data (dict): Decoded JSON body
+        last_attempt (bool): Whether a 007 reply can still be retried
+    
+    Returns:
+        GeocodeResult, or None when the caller should back off and retry
+    """
+    # Check if the API returned the specific error code 7
+    if "error" in data and "code" in data["error"] and data["error"]["code"] == "007":
+        # For error code 7, try adding more location context
+        if not last_attempt:
+            # Only free the trial slot (if any): recording a success would reset the
+            # failure count and let sustained 007 replies keep the breaker closed
+            geocode_circuit_breaker.release()
+            return None
+        # A lookup that ends on 007 counts once against the provider
+        geocode_circuit_breaker.record_failure()
+        # If we're out of retries, return a more helpful error message
+        return GeocodeResult.not_found(location_name, f"Location not found: '{location_name}'. Try using a more specific location name with state/country.")
+    
+    # Check if the API returned any other error
+    elif "error" in data:
+        geocode_circuit_breaker.record_failure()
+        return GeocodeResult.error(location_name, f"API Error: {data['error'].get('description', 'Unknown error')}")
+    
+    geocode_circuit_breaker.record_success()
+    
+    # Check if latitude and longitude are present and valid
+    if "latt" not in data or "longt" not in data:
+        return GeocodeResult.not_found(location_name, f"Coordinates not found for '{location_name}'. API response missing coordinates.")
+    
+    if data["latt"] == "0.00000" and data["longt"] == "0.00000":
+        return GeocodeResult.not_found(location_name, f"Coordinates not found for '{location_name}'. Try providing more details like city or country.")
+        
+    # Get the formatted address or use the original location name if not available
+    address = data.get("standard", {}).get("addresst", location_name)
+    
+    return GeocodeResult.found(location_name, data["latt"], data["longt"], address)
+
 class InteractiveTravelAgent:
+    MODEL_ID = "llama-3.3-70b-versatile"
+
+    @staticmethod
+    def tools():
+        """Fresh tool set for one agent; AgentPool also reads it to fingerprint the pool without building an agent"""
+        return [
+            DuckDuckGo(), 
+            Newspaper4k(),
+            Calculator(
+                add=True,
+                subtract=True,
+                multiply=True,
+                divide=True,
+                exponentiate=True,
+                factorial=True,
+                is_prime=True,
+                square_root=True,
+            ),
+            get_location_coordinates
+        ]
+
     def __init__(self):
         api_key_groq = os.getenv("GROQ_API_KEY")
         self.agent = Agent(
             model=Groq(
-                id="llama-3.3-70b-versatile",
-                api_key={api_key_groq},
+                id=self.MODEL_ID,
+                api_key=api_key_groq,
                 max_tokens=10000
             ),
             markdown=True,
-            tools=[
-                DuckDuckGo(), 
-                Newspaper4k(),
-                Calculator(
-                    add=True,
-                    subtract=True,
-                    multiply=True,
-                    divide=True,
-                    exponentiate=True,
-                    factorial=True,
-                    is_prime=True,
-                    square_root=True,
-                ),
-                get_location_coordinates
-            ],
+            tools=self.tools(),
             description="You are a seasoned travel agent or trip itinerary planner specializing in crafting seamless, personalized travel experiences.",
             instructions=[
                 """Your role is to guide the user through an interactive trip planning process with these steps:
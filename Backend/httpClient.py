@@ -0,0 +1,110 @@
+import os
+import threading
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Defaults can be overridden from the .env file
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", 10))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+HTTP_ASYNC_MAX_CONNECTIONS = int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", 100))
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_session = None
+_session_lock = threading.Lock()
+_async_client = None
+
+
+def _build_adapter(max_connections: int) -> HTTPAdapter:
+    """
+    Adapter with keep-alive pooling.
+
+    pool_block makes max_connections a hard per-host limit: extra threads wait for a
+    free connection instead of opening throwaway ones. Retries are left to callers,
+    which already apply their own backoff and rate limiting.
+    """
+    return HTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=max_connections,
+        pool_block=True,
+        max_retries=0,
+    )
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return the process-wide pooled session used for outbound API calls.
+
+    The session never stores cookies, so sharing it between threads does not leak
+    state from one request into another.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = _build_adapter(HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def limit_host_connections(base_url: str, max_connections: int) -> None:
+    """
+    Give a host its own connection pool size.
+
+    Args:
+        base_url: URL prefix of the host, e.g. "https://geocode.xyz/"
+        max_connections: Most simultaneous connections kept open to that host
+    """
+    session = get_http_session()
+    with _session_lock:
+        session.mount(base_url, _build_adapter(max_connections))
+
+
+def http_get(url: str, timeout=DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    """GET through the shared pool with split connect/read timeouts"""
+    return get_http_session().get(url, timeout=timeout, **kwargs)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Return the pooled AsyncClient used by the ASGI app.
+
+    Like the requests session it keeps connections alive and never stores cookies.
+    It belongs to the event loop that first uses it, so call it from async code only.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_POOL_MAXSIZE,
+            ),
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+    return _async_client
+
+
+async def close_async_http_client() -> None:
+    """Close the AsyncClient on shutdown so its connections are released cleanly"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def http_get_async(url: str, **kwargs) -> httpx.Response:
+    """GET through the shared async pool"""
+    return await get_async_http_client().get(url, **kwargs)
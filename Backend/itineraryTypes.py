@@ -0,0 +1,65 @@
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+
+class AlternativeActivity(BaseModel):
+    """A venue suggested in place of a cancelled activity"""
+    name: str
+    location: str = "To be determined"
+    reason: str = ""
+    estimated_time: str = "Flexible"
+
+
+class ScheduleEntry(BaseModel):
+    """One activity of the day, in the shape the frontend's Activity interface expects"""
+    time: str
+    name: str
+    location: str = "See details"
+    description: Optional[str] = None
+    status: str = "upcoming"
+    type: Optional[str] = None
+
+
+class ItineraryAdjustment(BaseModel):
+    """What adjust_itinerary returns; the agent is asked to answer in exactly this shape"""
+    activities_to_cancel: List[str] = Field(default_factory=list)
+    alternative_activities: List[AlternativeActivity] = Field(default_factory=list)
+    updated_schedule: List[ScheduleEntry] = Field(default_factory=list)
+    estimated_cost_impact: str = ""
+    reasoning: str = ""
+
+
+# Compact skeleton of ItineraryAdjustment for the prompt; far fewer tokens than the full JSON schema
+ADJUSTMENT_JSON_SKELETON = json.dumps({
+    "activities_to_cancel": ["<activity name>"],
+    "alternative_activities": [
+        {"name": "<venue>", "location": "<address>", "reason": "<why it suits the mood>", "estimated_time": "<HH:MM-HH:MM>"}
+    ],
+    "updated_schedule": [
+        {"time": "<HH:MM>", "name": "<activity>", "location": "<place>", "status": "upcoming"}
+    ],
+    "estimated_cost_impact": "<cost changes or savings>",
+    "reasoning": "<two or three sentences explaining the changes>"
+}, ensure_ascii=False)
+
+
+def parse_adjustment_json(content: str) -> Optional[ItineraryAdjustment]:
+    """
+    Validate an agent reply against ItineraryAdjustment.
+
+    Models sometimes wrap JSON in a ```json fence or a sentence, so only the outermost
+    {...} is validated.
+
+    Returns:
+        ItineraryAdjustment, or None if the reply holds no valid object
+    """
+    start = content.find("{")
+    end = content.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return ItineraryAdjustment.model_validate_json(content[start:end + 1])
+    except ValidationError:
+        return None
@@ -0,0 +1,235 @@
+import copy
+from typing import Any, Dict, List, Optional
+
+from geocodeCache import normalize_location_key
+from promptEncoding import is_finished, parse_clock_minutes
+
+# The live itinerary as the server's own versioned copy. Clients send small patches
+# (an activity completed, a time moved) instead of the whole day, re-planning only
+# touches the activities still ahead, and every change comes back as a diff that
+# the client can apply without re-rendering the full list.
+
+# Diffs kept so a client that is a few versions behind can catch up without the full day
+DEFAULT_MAX_HISTORY = 20
+
+
+class ItineraryVersionConflict(Exception):
+    """Raised when a patch was made against a version other than the current one"""
+
+
+class InvalidItineraryPatch(ValueError):
+    """Raised for a patch operation that is malformed or names an unknown activity"""
+
+
+def diff_activities(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Activities added, removed and changed between two lists of activities with ids.
+
+    Changed activities only carry the fields that differ; a field that was dropped
+    is reported as None.
+    """
+    old_by_id = {activity["id"]: activity for activity in old}
+    new_ids = {activity["id"] for activity in new}
+    added, changed = [], []
+    for activity in new:
+        previous = old_by_id.get(activity["id"])
+        if previous is None:
+            added.append(activity)
+            continue
+        fields = {key: value for key, value in activity.items() if previous.get(key) != value}
+        fields.update({key: None for key in previous if key not in activity})
+        if fields:
+            changed.append({"id": activity["id"], **fields})
+    removed = [activity["id"] for activity in old if activity["id"] not in new_ids]
+    return {"added": added, "removed": removed, "changed": changed, "order": [activity["id"] for activity in new]}
+
+
+class VersionedItinerary:
+    """
+    Today's activities with stable ids and a version number bumped on every change.
+
+    Each activity gets an "id" the first time the server sees it; patches and diffs
+    refer to activities by that id.
+    """
+
+    def __init__(self, activities=None, version: int = 0, next_id: int = 1, history=None,
+                 max_history: int = DEFAULT_MAX_HISTORY):
+        self.activities = activities or []
+        self.version = version
+        self.next_id = next_id
+        # Diffs of the most recent versions, oldest first
+        self.history = history or []
+        self.max_history = max_history
+
+    def _new_id(self) -> str:
+        activity_id = f"a{self.next_id}"
+        self.next_id += 1
+        return activity_id
+
+    def _commit(self, activities: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Make activities the new version and return its diff (an empty diff keeps the version)"""
+        diff = diff_activities(self.activities, activities)
+        reordered = diff["order"] != [activity["id"] for activity in self.activities]
+        if not (diff["added"] or diff["removed"] or diff["changed"] or reordered):
+            return {"from_version": self.version, "to_version": self.version, **diff}
+        diff = {"from_version": self.version, "to_version": self.version + 1, **diff}
+        self.activities = activities
+        self.version += 1
+        self.history.append(diff)
+        del self.history[:-self.max_history]
+        return diff
+
+    def _with_ids(self, activities) -> List[Dict[str, Any]]:
+        """Copies of activities with ids: a known id is kept, otherwise an unclaimed activity of the same name lends its id"""
+        current_ids = {activity["id"] for activity in self.activities}
+        ids_by_name = {}
+        for activity in self.activities:
+            ids_by_name.setdefault(normalize_location_key(str(activity.get("name", ""))), []).append(activity["id"])
+
+        claimed = set()
+        result = []
+        for activity in activities:
+            if not isinstance(activity, dict) or not activity.get("name"):
+                raise InvalidItineraryPatch("Every activity needs a name")
+            activity = copy.deepcopy(activity)
+            activity_id = activity.get("id")
+            if activity_id not in current_ids or activity_id in claimed:
+                same_name = ids_by_name.get(normalize_location_key(str(activity["name"])), [])
+                activity_id = next((candidate for candidate in same_name if candidate not in claimed), None)
+            if activity_id is None:
+                activity_id = self._new_id()
+            claimed.add(activity_id)
+            activity["id"] = activity_id
+            result.append(activity)
+        return result
+
+    def replace(self, activities) -> Dict[str, Any]:
+        """Take a whole activity list from the client, e.g. on the first adjust of the day"""
+        if not isinstance(activities, list):
+            raise InvalidItineraryPatch("The itinerary must be a list of activities")
+        return self._commit(self._with_ids(activities))
+
+    def check_version(self, base_version: Optional[int]) -> None:
+        """
+        Make sure a change was made against the current version; None skips the check.
+
+        Raises:
+            ItineraryVersionConflict: base_version is not the current version
+            InvalidItineraryPatch: base_version is not an integer
+        """
+        if base_version is None:
+            return
+        if not str(base_version).lstrip("-").isdigit():
+            raise InvalidItineraryPatch("base_version must be an integer")
+        if int(base_version) != self.version:
+            raise ItineraryVersionConflict(f"Patch is against version {base_version}, current version is {self.version}")
+
+    def apply_patch(self, changes, base_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Apply patch operations and return the resulting diff.
+
+        Each change is one of:
+            {"op": "update", "id": "a3", "status": "completed"}   (any fields to set)
+            {"op": "add", "activity": {"time": ..., "name": ..., "location": ...}}
+            {"op": "remove", "id": "a3"}
+        "update" is the default op.
+
+        Raises:
+            ItineraryVersionConflict: base_version is given and is not the current version
+            InvalidItineraryPatch: A change is malformed or names an unknown activity
+        """
+        self.check_version(base_version)
+        if not isinstance(changes, list):
+            raise InvalidItineraryPatch("Changes must be a list")
+
+        activities = copy.deepcopy(self.activities)
+        by_id = {activity["id"]: activity for activity in activities}
+        for change in changes:
+            if not isinstance(change, dict):
+                raise InvalidItineraryPatch("Each change must be an object")
+            op = change.get("op", "update")
+            if op == "add":
+                added = change.get("activity")
+                if not isinstance(added, dict) or not added.get("name"):
+                    raise InvalidItineraryPatch("An added activity needs a name")
+                added = {**copy.deepcopy(added), "id": self._new_id()}
+                activities.append(added)
+                by_id[added["id"]] = added
+            elif op in ("update", "remove"):
+                activity = by_id.get(change.get("id"))
+                if activity is None:
+                    raise InvalidItineraryPatch(f"Unknown activity id: {change.get('id')}")
+                if op == "remove":
+                    activities.remove(activity)
+                    del by_id[activity["id"]]
+                else:
+                    activity.update({key: value for key, value in change.items() if key not in ("op", "id")})
+            else:
+                raise InvalidItineraryPatch(f"Unknown patch op: {op}")
+        return self._commit(activities)
+
+    def remaining(self) -> List[Dict[str, Any]]:
+        """Activities not yet completed or cancelled; the part of the day re-planning may touch"""
+        return [activity for activity in self.activities if not is_finished(activity)]
+
+    def merge_adjustment(self, updated_schedule, activities_to_cancel=None) -> Dict[str, Any]:
+        """
+        Fold an adjustment's schedule into the itinerary, leaving finished activities alone.
+
+        The schedule may cover the whole day (local rules) or only what is left of it
+        (the agent). Activities from the remaining part that it no longer mentions are
+        kept as cancelled if the adjustment cancelled them, otherwise dropped. An
+        adjustment without a schedule (e.g. an agent reply that could not be parsed)
+        leaves the remaining activities as they are.
+        """
+        finished = [activity for activity in self.activities if is_finished(activity)]
+        if not updated_schedule:
+            return self._commit(copy.deepcopy(self.activities))
+        finished_ids = {activity["id"] for activity in finished}
+        schedule = self._with_ids(updated_schedule)
+        suffix = [activity for activity in schedule if activity["id"] not in finished_ids]
+
+        cancelled_names = {normalize_location_key(str(name)) for name in activities_to_cancel or []}
+        kept_ids = {activity["id"] for activity in suffix}
+        for activity in self.remaining():
+            if activity["id"] not in kept_ids and normalize_location_key(str(activity.get("name", ""))) in cancelled_names:
+                suffix.append({**copy.deepcopy(activity), "status": "cancelled"})
+
+        # Keep the rest of the day in time order; entries without a readable time go last, in their own order
+        end_of_day = 24 * 60
+
+        def start(activity):
+            minutes = parse_clock_minutes(activity.get("time"))
+            return end_of_day if minutes is None else minutes
+        suffix.sort(key=start)
+        return self._commit(finished + suffix)
+
+    def changes_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Diffs from version up to the current one, or None if they are no longer kept"""
+        if version == self.version:
+            return []
+        diffs = [diff for diff in self.history if diff["from_version"] >= version]
+        if not diffs or diffs[0]["from_version"] != version:
+            return None
+        return diffs
+
+    def plain(self) -> List[Dict[str, Any]]:
+        """Activities without their ids, for prompts and the rule-based rescheduler"""
+        return [{key: value for key, value in activity.items() if key != "id"} for activity in self.activities]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"version": self.version, "activities": self.activities}
+
+    def to_state(self) -> Dict[str, Any]:
+        """Compact JSON-safe form for session stores"""
+        return {"version": self.version, "next_id": self.next_id, "activities": self.activities, "history": self.history}
+
+    @classmethod
+    def from_state(cls, state, max_history: int = DEFAULT_MAX_HISTORY) -> "VersionedItinerary":
+        """Rebuild from to_state() output; a live itinerary is returned as is and None gives an empty one"""
+        if isinstance(state, VersionedItinerary):
+            return state
+        if not state:
+            return cls(max_history=max_history)
+        return cls(state.get("activities"), state.get("version", 0), state.get("next_id", 1),
+                   state.get("history"), max_history)
@@ -6,31 +6,114 @@ from phi.tools.calculator import Calculator
 from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta
-import json
+import threading
+import time
+from agentPrompts import nearby_alternatives_query, adjust_itinerary_query, travel_times_section
+from itineraryTypes import parse_adjustment_json
+from extraction import parse_adjustment_markdown
+from promptEncoding import encode_itinerary_for_prompt
+from localRescheduler import reschedule_locally, classify_mood
 
 load_dotenv()
 
+# Ask adjust_itinerary for schema-checked JSON; the markdown parser then only runs when validation fails
+STRUCTURED_ADJUSTMENTS = os.getenv("LIVE_ITINERARY_JSON_MODE", "1").lower() not in ("0", "false", "no")
+# Try the rule-based rescheduler before leasing an agent for simple moods
+LOCAL_RESCHEDULING = os.getenv("LIVE_ITINERARY_LOCAL_RULES", "1").lower() not in ("0", "false", "no")
+
+# How adjust_itinerary replies were parsed and how long the calls took, shared by every pooled agent
+_adjustment_lock = threading.Lock()
+_adjustment_counters = {}
+
+# Moods the local rules saw but handed to the agent, by rule (or "unmatched")
+_escalations = {}
+
+def record_adjustment(parse_mode, seconds):
+    """Count one adjustment under its parse mode: local, json, json_fallback or markdown"""
+    with _adjustment_lock:
+        counters = _adjustment_counters.setdefault(parse_mode, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        counters["count"] += 1
+        counters["total_seconds"] += seconds
+        counters["max_seconds"] = max(counters["max_seconds"], seconds)
+
+def adjustment_stats():
+    """Per-parse-mode counts and latencies, how often JSON mode had to fall back, and local versus agent paths"""
+    with _adjustment_lock:
+        modes = {mode: dict(counters) for mode, counters in _adjustment_counters.items()}
+        escalations = dict(_escalations)
+    for counters in modes.values():
+        # Six places so the sub-millisecond local adjustments do not round to zero
+        counters["avg_seconds"] = round(counters["total_seconds"] / counters["count"], 6)
+        counters["total_seconds"] = round(counters["total_seconds"], 6)
+        counters["max_seconds"] = round(counters["max_seconds"], 6)
+    structured = modes.get("json", {}).get("count", 0) + modes.get("json_fallback", {}).get("count", 0)
+    fallbacks = modes.get("json_fallback", {}).get("count", 0)
+
+    # Rule-based versus agent adjustments, whatever the agent's parse mode
+    agent_modes = [counters for mode, counters in modes.items() if mode != "local"]
+    agent_count = sum(counters["count"] for counters in agent_modes)
+    agent_seconds = sum(counters["total_seconds"] for counters in agent_modes)
+    local = modes.get("local", {"count": 0, "avg_seconds": 0.0})
+    total = local["count"] + agent_count
+    return {
+        "json_mode": STRUCTURED_ADJUSTMENTS,
+        "local_rules": LOCAL_RESCHEDULING,
+        "modes": modes,
+        "fallback_rate": round(fallbacks / structured, 4) if structured else 0.0,
+        "paths": {
+            "local": {"count": local["count"], "avg_seconds": local["avg_seconds"]},
+            "agent": {"count": agent_count, "avg_seconds": round(agent_seconds / agent_count, 6) if agent_count else 0.0},
+            "local_rate": round(local["count"] / total, 4) if total else 0.0,
+            "escalations": escalations
+        }
+    }
+
+def adjust_itinerary_locally(current_itinerary, mood_state, current_time):
+    """
+    Apply the rule-based rescheduler, timing it alongside the agent adjustments.
+
+    Returns:
+        The adjustment, or None when the mood or itinerary needs LiveItineraryAgent
+    """
+    if not LOCAL_RESCHEDULING:
+        return None
+    started = time.perf_counter()
+    result = reschedule_locally(current_itinerary, mood_state, current_time)
+    if result is not None:
+        record_adjustment("local", time.perf_counter() - started)
+    else:
+        with _adjustment_lock:
+            rule = classify_mood(mood_state) or "unmatched"
+            _escalations[rule] = _escalations.get(rule, 0) + 1
+    return result
+
 class LiveItineraryAgent:
     """Agent for real-time itinerary adjustments based on mood and dynamic factors"""
     
+    MODEL_ID = "llama-3.3-70b-versatile"
+
+    @staticmethod
+    def tools():
+        """Fresh tool set for one agent (see geolocation.InteractiveTravelAgent.tools)"""
+        return [
+            DuckDuckGo(),
+            Calculator(
+                add=True,
+                subtract=True,
+                multiply=True,
+                divide=True,
+            )
+        ]
+
     def __init__(self):
         api_key_groq = os.getenv("GROQ_API_KEY")
         self.agent = Agent(
             model=Groq(
-                id="llama-3.3-70b-versatile",
+                id=self.MODEL_ID,
                 api_key=api_key_groq,
                 max_tokens=8000
             ),
-            markdown=True,
-            tools=[
-                DuckDuckGo(),
-                Calculator(
-                    add=True,
-                    subtract=True,
-                    multiply=True,
-                    divide=True,
-                )
-            ],
+            tools=self.tools(),
             description="""You are an intelligent live itinerary manager that can dynamically adjust travel plans 
             based on real-time mood, energy levels, weather, and other factors.""",
             instructions=[
@@ -65,7 +148,8 @@ class LiveItineraryAgent:
         )
         self.context = {}
     
-    def adjust_itinerary(self, current_itinerary, mood_state, current_time, current_location):
+    def adjust_itinerary(self, current_itinerary, mood_state, current_time, current_location, structured=None,
+                         travel_times=None):
         """
         Dynamically adjust itinerary based on mood and current situation
         
@@ -74,130 +158,33 @@ class LiveItineraryAgent:
             mood_state: String describing current mood/state (e.g., "tired", "energetic", "hungry")
             current_time: Current time (e.g., "10:00 AM")
             current_location: Current location coordinates or name
+            structured: Ask for schema-checked JSON instead of markdown (default: LIVE_ITINERARY_JSON_MODE)
+            travel_times: Travel-time table between the remaining locations (TravelTimeMatrix.to_prompt)
         
         Returns:
             Adjusted itinerary with replacements and optimizations
         """
-        query = f"""
-        CURRENT SITUATION:
-        - Time: {current_time}
-        - Location: {current_location}
-        - Group Mood/State: {mood_state}
-        
-        CURRENT ITINERARY FOR TODAY:
-        {json.dumps(current_itinerary, indent=2)}
+        if structured is None:
+            structured = STRUCTURED_ADJUSTMENTS
         
-        TASK: The group has reported they are "{mood_state}" at {current_time}. Please:
-        
-        1. Identify which activities should be CANCELED or MODIFIED based on this mood
-        2. Search for and suggest ALTERNATIVE activities that better match their current state
-        3. Find available slots and booking options for alternatives
-        4. Re-optimize the remaining schedule to:
-           - Reduce travel time if tired
-           - Add more engaging activities if energetic
-           - Prioritize food if hungry
-           - Move indoor if weather is bad
-        5. Provide specific venue names, addresses, and booking links
-        
-        Format your response as:
-        ## 🚫 Activities to Cancel/Modify
-        [List with reasons]
-        
-        ## ✨ Recommended Alternatives
-        [Specific venues with details, availability, and booking info]
-        
-        ## 📅 Updated Schedule
-        [Revised timeline for rest of day]
-        
-        ## 💰 Cost Impact
-        [Any cost changes or savings]
-        """
+        query = adjust_itinerary_query(current_itinerary, mood_state, current_time, current_location, structured,
+                                       travel_times)
         
+        started = time.perf_counter()
         response = self.agent.run(query, stream=False)
         
         # Extract the content from the response
         content = response.content if hasattr(response, 'content') else str(response)
         
-        # Parse the response to extract structured data
-        result = {
-            "activities_to_cancel": [],
-            "alternative_activities": [],
-            "updated_schedule": [],
-            "estimated_cost_impact": "",
-            "reasoning": content,
-            "summary": ""  # Add a brief summary field
-        }
-        
-        # Try to extract structured information from the response
-        lines = content.split('\n')
-        current_section = None
-        current_alternative = {}
-        
-        for line in lines:
-            line_stripped = line.strip()
-            if '🚫 Activities to Cancel' in line or 'Activities to Cancel' in line:
-                current_section = 'cancel'
-            elif '✨ Recommended Alternatives' in line or 'Recommended Alternatives' in line:
-                current_section = 'alternatives'
-            elif '📅 Updated Schedule' in line or 'Updated Schedule' in line:
-                current_section = 'schedule'
-            elif '💰 Cost Impact' in line or 'Cost Impact' in line:
-                current_section = 'cost'
-            elif line_stripped.startswith('•') or line_stripped.startswith('-'):
-                if current_section == 'cancel':
-                    cancel_text = line_stripped.lstrip('•-').strip()
-                    # Extract activity name before the colon
-                    if ':' in cancel_text:
-                        activity_name = cancel_text.split(':')[0].strip()
-                        result["activities_to_cancel"].append(activity_name)
-                    else:
-                        result["activities_to_cancel"].append(cancel_text)
-                        
-                elif current_section == 'alternatives':
-                    venue_info = line_stripped.lstrip('•-').strip()
-                    
-                    # Check if this is a main alternative activity (has colon or is first line)
-                    if not venue_info.startswith('Recommended Venue') and not venue_info.startswith('Booking Link') and not venue_info.startswith('Availability'):
-                        if ':' in venue_info and not venue_info.startswith(' '):
-                            # Save previous alternative if exists
-                            if current_alternative and current_alternative.get('name'):
-                                result["alternative_activities"].append(current_alternative)
-                            
-                            # Start new alternative
-                            parts = venue_info.split(':', 1)
-                            current_alternative = {
-                                "name": parts[0].strip(),
-                                "location": "To be determined",
-                                "reason": parts[1].strip() if len(parts) > 1 else venue_info,
-                                "estimated_time": "Flexible"
-                            }
-                    elif 'Recommended Venue:' in venue_info:
-                        # Extract venue location
-                        venue_text = venue_info.split('Recommended Venue:', 1)[1].strip()
-                        if current_alternative:
-                            current_alternative['location'] = venue_text
-                            
-                elif current_section == 'schedule':
-                    schedule_text = line_stripped.lstrip('•-').strip()
-                    # Parse schedule entries like "20:00 - 21:30: Activity Name"
-                    if ':' in schedule_text:
-                        parts = schedule_text.split(':', 1)
-                        time_part = parts[0].strip()
-                        name_part = parts[1].strip() if len(parts) > 1 else schedule_text
-                        
-                        result["updated_schedule"].append({
-                            "time": time_part,
-                            "name": name_part,
-                            "location": "See details",
-                            "status": "upcoming"
-                        })
-                        
-            elif current_section == 'cost' and line_stripped:
-                result["estimated_cost_impact"] += line_stripped + " "
-        
-        # Add last alternative if exists
-        if current_alternative and current_alternative.get('name'):
-            result["alternative_activities"].append(current_alternative)
+        # Schema-validated JSON skips the markdown parser entirely; it is only the fallback
+        adjustment = parse_adjustment_json(content) if structured else None
+        if adjustment is not None:
+            result = adjustment.model_dump(exclude_none=True)
+            parse_mode = "json"
+        else:
+            result = self._parse_markdown_adjustment(content)
+            parse_mode = "json_fallback" if structured else "markdown"
+        record_adjustment(parse_mode, time.perf_counter() - started)
         
         # Generate a concise summary
         cancel_count = len(result["activities_to_cancel"])
@@ -206,7 +193,11 @@ class LiveItineraryAgent:
         
         return result
     
-    def find_nearby_alternatives(self, activity_type, location, radius_km, mood_state):
+    def _parse_markdown_adjustment(self, content):
+        """Recover the adjustment from a markdown reply with the section headings requested in the prompt"""
+        return parse_adjustment_markdown(content)
+    
+    def find_nearby_alternatives(self, activity_type, location, radius_km, mood_state, nearby_venues=None):
         """
         Find nearby alternatives based on activity type and mood
         
@@ -215,33 +206,20 @@ class LiveItineraryAgent:
             location: Current location
             radius_km: Search radius in kilometers
             mood_state: Current mood state
+            nearby_venues: Geocoded venues already known to be within radius_km (venueIndex.within)
         
         Returns:
-            List of alternative suggestions
-        """
-        query = f"""
-        Find alternative activities near {location} within {radius_km}km that match the mood: {mood_state}
-        
-        Original activity type: {activity_type}
-        
-        Search for:
-        1. Venues currently open
-        2. Activities suitable for "{mood_state}" mood
-        3. Real-time availability
-        4. Distance and travel time from {location}
-        5. Ratings and reviews
-        6. Price range
-        7. Booking requirements
-        
-        Provide at least 3-5 alternatives with complete details.
+            List of alternative suggestions, plus the known venues that were offered to the agent
         """
+        query = nearby_alternatives_query(activity_type, location, radius_km, mood_state, nearby_venues)
         
         response = self.agent.run(query, stream=False)
         content = response.content if hasattr(response, 'content') else str(response)
         
-        return {"alternatives": content}
+        return {"alternatives": content, "nearby_venues": nearby_venues or []}
     
-    def optimize_remaining_schedule(self, remaining_activities, current_location, mood_state, time_available):
+    def optimize_remaining_schedule(self, remaining_activities, current_location, mood_state, time_available,
+                                    travel_times=None):
         """
         Optimize the remaining activities based on current situation
         
@@ -250,6 +228,7 @@ class LiveItineraryAgent:
             current_location: Current location
             mood_state: Current mood state
             time_available: Time remaining in the day
+            travel_times: Travel-time table between the locations (TravelTimeMatrix.to_prompt)
         
         Returns:
             Optimized schedule
@@ -260,9 +239,9 @@ class LiveItineraryAgent:
         - Mood: {mood_state}
         - Time Available: {time_available}
         
-        REMAINING PLANNED ACTIVITIES:
-        {json.dumps(remaining_activities, indent=2)}
-        
+        REMAINING PLANNED ACTIVITIES (one activity per row, columns as in the header):
+        {encode_itinerary_for_prompt(remaining_activities, kind="optimize_remaining_schedule")}
+        {travel_times_section(travel_times)}
         TASK: Optimize the remaining schedule considering:
         1. Current mood and energy level
         2. Travel time between locations
@@ -0,0 +1,225 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from promptEncoding import parse_clock_minutes
+
+load_dotenv()
+
+# Mechanical mood adjustments worked out on the activity list itself, so they need no
+# LLM round trip. Anything that needs new venues (energetic, adventurous, hungry with
+# no meal left in the plan, free-text moods) returns None and goes to the agent.
+
+# Rest taken when the group is tired; the next activity gives way to it
+TIRED_REST_MINUTES = int(os.getenv("LOCAL_RESCHEDULE_REST_MINUTES", "60"))
+# Slack added before each remaining activity when the group wants a slower pace
+RELAXED_SLACK_MINUTES = int(os.getenv("LOCAL_RESCHEDULE_SLACK_MINUTES", "30"))
+# Nothing is scheduled to start after this; activities pushed past it are cancelled
+DAY_END = parse_clock_minutes(os.getenv("LOCAL_RESCHEDULE_DAY_END", "22:00"))
+# Length assumed for the last activity of the day, which has no successor to measure against
+DEFAULT_ACTIVITY_MINUTES = 60
+
+_MEAL_WORDS = re.compile(r"\b(breakfast|brunch|lunch|dinner|meal|food|restaurant|cafe|café|dhaba|eatery|street food)\b", re.IGNORECASE)
+# Only unambiguous clock times are shifted, so numbers like "Day 2" in a time field survive
+_CLOCK_RE = re.compile(r"\b(\d{1,2}):(\d{2})(\s*[AaPp]\.?[Mm]\.?)?|\b(\d{1,2})(\s*[AaPp]\.?[Mm]\.?)")
+
+# Words in the mood string that select a rule; the frontend sends the bare keys
+MOOD_KEYWORDS = {
+    "tired": ("tired", "exhausted", "sleepy", "fatigued", "need rest", "worn out"),
+    "relaxed": ("relaxed", "slow", "chill", "take it easy"),
+    "hungry": ("hungry", "starving", "need food"),
+}
+# Matched as whole words, so "chilly" is not "chill"
+_MOOD_PATTERNS = {
+    category: re.compile(r"\b(?:" + "|".join(re.escape(keyword).replace(r"\ ", r"\s+") for keyword in keywords) + r")\b")
+    for category, keywords in MOOD_KEYWORDS.items()
+}
+# A mood that negates a keyword ("not tired") or also mentions something the rules
+# cannot act on (weather, a different mood) goes to the agent
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|isn't|aren't|don't|doesn't|without)\b|n't\b")
+_AGENT_ONLY_RE = re.compile(r"\b(?:energetic|energised|energized|adventurous|excited|bored|rain|raining|rainy|storm|"
+                            r"weather|hot|cold|indoors?|sick|unwell|injured)\b")
+
+
+def classify_mood(mood_state: str) -> Optional[str]:
+    """The rule a mood maps to, or None if it needs the agent"""
+    mood = str(mood_state or "").strip().lower()
+    if mood in MOOD_KEYWORDS:
+        return mood
+    if _NEGATION_RE.search(mood) or _AGENT_ONLY_RE.search(mood):
+        return None
+    matched = [category for category, pattern in _MOOD_PATTERNS.items() if pattern.search(mood)]
+    # "tired and hungry" needs both rules at once, which only the agent can weigh
+    return matched[0] if len(matched) == 1 else None
+
+
+def format_clock(minutes: int, twelve_hour: bool = False) -> str:
+    """Minutes after midnight as "14:05", or "2:05 PM" when twelve_hour"""
+    hours, minutes = divmod(minutes % (24 * 60), 60)
+    if not twelve_hour:
+        return f"{hours:02d}:{minutes:02d}"
+    return f"{(hours % 12) or 12}:{minutes:02d} {'PM' if hours >= 12 else 'AM'}"
+
+
+def shift_clock_text(text: str, minutes: int) -> str:
+    """Move every clock time in text (e.g. "10:00 - 11:30") by minutes, keeping its 12/24-hour style"""
+    def shift(match):
+        original = match.group(0)
+        return format_clock(parse_clock_minutes(original) + minutes, bool(match.group(3) or match.group(5)))
+    return _CLOCK_RE.sub(shift, str(text))
+
+
+def _is_meal(activity: Dict[str, Any]) -> bool:
+    return bool(_MEAL_WORDS.search(f"{activity.get('type', '')} {activity.get('name', '')}"))
+
+
+class _Plan:
+    """The day as a list of activity copies, with start times parsed once"""
+
+    def __init__(self, activities: List[Dict[str, Any]], current_time):
+        self.activities = [dict(activity) for activity in activities]
+        self.starts = [parse_clock_minutes(activity.get("time")) for activity in self.activities]
+        self.now = parse_clock_minutes(current_time)
+        # An activity lasts until the next one starts; the last one gets the default
+        self.durations = []
+        for start in self.starts:
+            later = [other for other in self.starts if other > start]
+            self.durations.append(min(later) - start if later else DEFAULT_ACTIVITY_MINUTES)
+        self.cancelled = []
+
+        has_status = any(activity.get("status") for activity in self.activities)
+        # Indexes of activities that have not started yet, in time order
+        self.upcoming = []
+        for index, activity in enumerate(self.activities):
+            status = str(activity.get("status", "")).lower()
+            if has_status:
+                if status == "upcoming" or not status:
+                    self.upcoming.append(index)
+            elif self.now is not None and self.starts[index] > self.now:
+                self.upcoming.append(index)
+        self.upcoming.sort(key=lambda index: self.starts[index])
+
+    def duration(self, index: int) -> int:
+        """Planned minutes for an activity, measured before anything was moved"""
+        return self.durations[index]
+
+    def cancel(self, index: int) -> None:
+        self.activities[index]["status"] = "cancelled"
+        self.cancelled.append(self.activities[index].get("name", "Unnamed activity"))
+        self.upcoming.remove(index)
+
+    def shift(self, index: int, minutes: int) -> None:
+        activity = self.activities[index]
+        activity["time"] = shift_clock_text(activity.get("time", ""), minutes)
+        self.starts[index] += minutes
+
+    def enforce_day_end(self) -> None:
+        """Cancel activities that would now start after DAY_END"""
+        for index in list(self.upcoming):
+            if DAY_END is not None and self.starts[index] > DAY_END:
+                self.cancel(index)
+
+    def schedule(self) -> List[Dict[str, Any]]:
+        """The whole day in time order, cancelled activities included so the view can strike them out"""
+        order = sorted(range(len(self.activities)), key=lambda index: self.starts[index])
+        schedule = []
+        for index in order:
+            activity = self.activities[index]
+            activity.setdefault("location", "See details")
+            activity.setdefault("status", "upcoming")
+            schedule.append(activity)
+        return schedule
+
+
+def _rest(plan: _Plan) -> Optional[str]:
+    """Tired: drop the next activity that is not a meal and push the rest back by a rest break"""
+    droppable = [index for index in plan.upcoming if not _is_meal(plan.activities[index])]
+    if not droppable:
+        return None
+    dropped = droppable[0]
+    dropped_start = plan.starts[dropped]
+    plan.cancel(dropped)
+
+    # The dropped slot absorbs part of the rest; later activities only move by what is left
+    delay = max(TIRED_REST_MINUTES - plan.duration(dropped), 0)
+    if delay:
+        for index in plan.upcoming:
+            if plan.starts[index] > dropped_start:
+                plan.shift(index, delay)
+    plan.enforce_day_end()
+    pushed = f" and pushed the rest of the day back by {delay} minutes" if delay else ""
+    return f"The group is tired, so {plan.cancelled[0]} was dropped to make room for a {TIRED_REST_MINUTES}-minute rest{pushed}."
+
+
+def _slow_down(plan: _Plan) -> Optional[str]:
+    """Relaxed: add slack before every remaining activity, cumulatively"""
+    if not plan.upcoming:
+        return None
+    for position, index in enumerate(plan.upcoming[:]):
+        plan.shift(index, RELAXED_SLACK_MINUTES * (position + 1))
+    plan.enforce_day_end()
+    return f"The group wants an easier pace, so each remaining activity gets {RELAXED_SLACK_MINUTES} extra minutes before it."
+
+
+def _eat_now(plan: _Plan) -> Optional[str]:
+    """Hungry: bring the next planned meal forward to now and let the following activities slide after it"""
+    meals = [index for index in plan.upcoming if _is_meal(plan.activities[index])]
+    if not meals or plan.now is None:
+        return None
+    meal = meals[0]
+    plan.shift(meal, plan.now - plan.starts[meal])
+
+    # Activities only move as far as needed to start after whatever precedes them
+    cursor = plan.now + plan.duration(meal)
+    for index in sorted((index for index in plan.upcoming if index != meal), key=lambda index: plan.starts[index]):
+        if plan.starts[index] < cursor:
+            plan.shift(index, cursor - plan.starts[index])
+        cursor = plan.starts[index] + plan.duration(index)
+    plan.enforce_day_end()
+    return f"The group is hungry, so {plan.activities[meal].get('name', 'the next meal')} was moved up to {format_clock(plan.now)}."
+
+
+_RULES = {
+    "tired": _rest,
+    "relaxed": _slow_down,
+    "hungry": _eat_now,
+}
+
+
+def reschedule_locally(current_itinerary, mood_state: str, current_time) -> Optional[Dict[str, Any]]:
+    """
+    Adjust the day for a simple mood without calling the agent.
+
+    Args:
+        current_itinerary: The activity list the frontend sends ({time, name, location, status, ...})
+        mood_state: Mood reported by the group
+        current_time: Current clock time, e.g. "14:30" or "2:30 PM"
+
+    Returns:
+        A result in the same shape as LiveItineraryAgent.adjust_itinerary, or None when
+        the mood or the itinerary needs the agent
+    """
+    rule = _RULES.get(classify_mood(mood_state))
+    if rule is None or not isinstance(current_itinerary, list) or not current_itinerary:
+        return None
+    if not all(isinstance(activity, dict) and activity.get("name") for activity in current_itinerary):
+        return None
+    if any(parse_clock_minutes(activity.get("time")) is None for activity in current_itinerary):
+        return None
+
+    plan = _Plan(current_itinerary, current_time)
+    reasoning = rule(plan)
+    if reasoning is None:
+        return None
+
+    dropped = len(plan.cancelled)
+    return {
+        "activities_to_cancel": plan.cancelled,
+        "alternative_activities": [],
+        "updated_schedule": plan.schedule(),
+        "estimated_cost_impact": "Check cancellation policies for the dropped bookings." if dropped else "No change in cost.",
+        "reasoning": reasoning,
+        "summary": f"Cancelled {dropped} activities and rescheduled the rest based on {mood_state} mood.",
+    }
@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+# Itineraries go into live re-routing prompts on every call. Pretty-printed JSON of the
+# whole day spends most of its tokens on indentation, repeated keys and activities that
+# are already over, so prompts get a compact table of the remaining activities instead:
+#
+#   time|name|location|status
+#   14:00|City Museum|MG Road|upcoming
+#   16:30|Sunset Point|Hilltop|upcoming
+
+# Statuses of activities that are over; itineraryVersions uses the same set
+FINISHED_STATUSES = frozenset({"completed", "cancelled", "canceled", "done", "skipped"})
+# Columns in the order they are written; a column only appears if some activity has it
+_COLUMNS = ("time", "name", "location", "status", "type", "description")
+
+_TIME_RE = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*([AaPp]\.?[Mm]\.?)?")
+# Roughly one token per word or punctuation mark, which tracks BPE tokenizers closely enough to compare encodings
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of LLM tokens in text without needing a tokenizer"""
+    return len(_TOKEN_RE.findall(text))
+
+
+def parse_clock_minutes(value) -> Optional[int]:
+    """
+    Minutes after midnight of the first clock time in a string.
+
+    Accepts "14:00", "2:00 PM", "2 pm" and ranges such as "10:00 - 11:30" (start time).
+    Returns None if no time is found.
+    """
+    match = _TIME_RE.search(str(value or ""))
+    if not match:
+        return None
+    hours, minutes, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        meridiem = meridiem[0].lower()
+        if hours == 12:
+            hours = 0
+        if meridiem == "p":
+            hours += 12
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def is_finished(activity: Dict[str, Any]) -> bool:
+    """Whether an activity's status (any case) marks it as over"""
+    return str(activity.get("status") or "").lower() in FINISHED_STATUSES
+
+
+def _activities(itinerary) -> Optional[List[Dict[str, Any]]]:
+    """The activity list of an itinerary given as a list or as {"activities": [...]}"""
+    if isinstance(itinerary, dict):
+        itinerary = itinerary.get("activities", itinerary.get("schedule"))
+    if isinstance(itinerary, list) and all(isinstance(activity, dict) for activity in itinerary):
+        return itinerary
+    return None
+
+
+def remaining_activities(activities: List[Dict[str, Any]], current_time=None) -> List[Dict[str, Any]]:
+    """
+    Drop activities that are already over.
+
+    Activities marked completed or cancelled are dropped. If no activity carries a
+    status, those that started before current_time are dropped instead, except the
+    latest of them, which is presumably still going on. Activities whose time has
+    no clock time in it ("evening", "after lunch") are always kept.
+    """
+    if any(activity.get("status") for activity in activities):
+        return [activity for activity in activities if not is_finished(activity)]
+
+    now = parse_clock_minutes(current_time)
+    if now is None:
+        return list(activities)
+    starts = [parse_clock_minutes(activity.get("time")) for activity in activities]
+    started = [index for index, start in enumerate(starts) if start is not None and start <= now]
+    first_kept = started[-1] if started else 0
+    return [activity for index, (activity, start) in enumerate(zip(activities, starts))
+            if index >= first_kept or start is None]
+
+
+def _cell(value) -> str:
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return " ".join(str(value).split()).replace("|", "/")
+
+
+def encode_activities(activities: List[Dict[str, Any]]) -> str:
+    """Write activities as a pipe-separated table with a single header row"""
+    if not activities:
+        return "(no remaining activities)"
+    columns = [column for column in _COLUMNS if any(activity.get(column) for activity in activities)]
+    extra = sorted({key for activity in activities for key in activity if key not in _COLUMNS})
+    columns += extra
+    rows = ["|".join(columns)]
+    for activity in activities:
+        rows.append("|".join(_cell(activity.get(column, "")) for column in columns))
+    return "\n".join(rows)
+
+
+class PromptEncodingStats:
+    """
+    Token estimates of the compact encoding per prompt kind, compared with the old
+    pretty-printed JSON on a sample of prompts.
+
+    Every prompt's encoding is counted. Pretty-printing the itinerary just to measure
+    it would cost more than the encoding itself, so the baseline is only measured on
+    the first prompt of each kind and every `sample_every`-th one after it, and
+    saved_ratio is computed over those sampled prompts.
+    """
+
+    def __init__(self, sample_every: int = 20):
+        self.sample_every = max(1, sample_every)
+        self._lock = threading.Lock()
+        self._kinds = {}
+
+    def record(self, kind: str, itinerary, encoded: str) -> None:
+        tokens_after = estimate_tokens(encoded)
+        with self._lock:
+            counters = self._kinds.setdefault(kind, {"prompts": 0, "tokens_after": 0, "sampled_prompts": 0,
+                                                     "sampled_tokens_before": 0, "sampled_tokens_after": 0})
+            sampled = counters["prompts"] % self.sample_every == 0
+            counters["prompts"] += 1
+            counters["tokens_after"] += tokens_after
+        if not sampled:
+            return
+
+        tokens_before = estimate_tokens(json.dumps(itinerary, indent=2))
+        with self._lock:
+            counters["sampled_prompts"] += 1
+            counters["sampled_tokens_before"] += tokens_before
+            counters["sampled_tokens_after"] += tokens_after
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = {kind: dict(counters) for kind, counters in self._kinds.items()}
+        for counters in kinds.values():
+            before = counters["sampled_tokens_before"]
+            counters["saved_ratio"] = round(1 - counters["sampled_tokens_after"] / before, 4) if before else 0.0
+            counters["avg_tokens_after"] = round(counters["tokens_after"] / counters["prompts"], 1)
+        return kinds
+
+
+prompt_encoding_stats = PromptEncodingStats(int(os.getenv("PROMPT_ENCODING_SAMPLE_EVERY", 20)))
+
+
+def encode_itinerary_for_prompt(itinerary, current_time=None, kind: str = "itinerary") -> str:
+    """
+    Compact text for an itinerary embedded in a prompt.
+
+    Lists of activity dicts become a table of the remaining activities; anything else
+    (free text, unexpected shapes) falls back to minified JSON. The encoding is
+    recorded under `kind` in prompt_encoding_stats, which compares a sample of them
+    with json.dumps(itinerary, indent=2), the form prompts used before.
+
+    Args:
+        itinerary: Activity list, {"activities": [...]}, or any JSON-serializable value
+        current_time: Current clock time, used when activities carry no status
+        kind: Name the savings are reported under in prompt_encoding_stats
+    """
+    activities = _activities(itinerary)
+    if activities is not None:
+        encoded = encode_activities(remaining_activities(activities, current_time))
+    elif isinstance(itinerary, str):
+        encoded = itinerary.strip()
+    else:
+        encoded = json.dumps(itinerary, separators=(",", ":"), ensure_ascii=False)
+
+    prompt_encoding_stats.record(kind, itinerary, encoded)
+    return encoded
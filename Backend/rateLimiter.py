@@ -0,0 +1,218 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit breaker is open"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker in the process.
+
+    Tokens refill continuously at `rate_per_second` up to `capacity`. A caller
+    reserves a token under the lock and sleeps outside of it, so concurrent
+    workers queue up fairly instead of each one sleeping on its own schedule.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float = 1):
+        self.rate = rate_per_second
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {"granted": 0, "rejected": 0, "waited_seconds": 0.0}
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Take one token, waiting for it if necessary.
+
+        Args:
+            timeout: Longest the caller is willing to wait. None waits as long as needed.
+
+        Returns:
+            bool: True if a token was granted, False if it would take longer than timeout
+        """
+        wait = self._take(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """Like acquire(), but waits with asyncio.sleep so the event loop keeps running"""
+        wait = self._take(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Return grant/reject counters"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["rate_per_second"] = self.rate
+        stats["capacity"] = self.capacity
+        stats["waited_seconds"] = round(stats["waited_seconds"], 3)
+        return stats
+
+    def _take(self, timeout):
+        """Reserve a token and return how long to wait for it, or None if that exceeds timeout"""
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            wait = self._reserve(time.monotonic(), timeout)
+            if wait is None:
+                self._counters["rejected"] += 1
+                return None
+            self._counters["granted"] += 1
+            self._counters["waited_seconds"] += wait
+        return wait
+
+    def _reserve(self, now, timeout):
+        """Refill, then reserve a token and return the wait before it is usable (lock held)"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        # Tokens may go negative: that is the queue of callers already waiting
+        wait = max(0.0, (1 - self._tokens) / self.rate)
+        if timeout is not None and wait > timeout:
+            return None
+        self._tokens -= 1
+        return wait
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a SQLite file so several worker processes share one budget.
+
+    Each reservation runs in an IMMEDIATE transaction, which SQLite serializes across processes.
+    """
+
+    def __init__(self, db_path: str, name: str, rate_per_second: float, capacity: float = 1):
+        super().__init__(rate_per_second, capacity)
+        self.name = name
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS token_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+
+    def _reserve(self, now, timeout):
+        # time.monotonic() is per-process, so the shared state uses wall-clock time
+        now = time.time()
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, updated FROM token_buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens, updated = row if row is not None else (self.capacity, now)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+
+            wait = max(0.0, (1 - tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                db.execute("ROLLBACK")
+                return None
+
+            db.execute(
+                "INSERT OR REPLACE INTO token_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens - 1, now),
+            )
+            db.execute("COMMIT")
+            return wait
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+
+class CircuitBreaker:
+    """
+    Fail fast while an upstream provider is unhealthy.
+
+    After `failure_threshold` consecutive failures the circuit opens and every call
+    is refused for `reset_timeout` seconds. The first call after that is let through
+    as a trial (half-open): success closes the circuit, failure re-opens it.
+    Every allow() that returned True must end in record_success(), record_failure()
+    or release(), otherwise a half-open circuit never admits another trial.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def allow(self) -> bool:
+        """Return True if a call may go out now"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def check(self) -> None:
+        """Raise CircuitOpenError instead of returning False"""
+        if not self.allow():
+            raise CircuitOpenError("Circuit is open; upstream provider is failing")
+
+    def release(self) -> None:
+        """Give back a trial slot taken by allow() for a call that never went out"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            self._trial_in_flight = False
+            self._state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            was_trial = self._trial_in_flight
+            self._trial_in_flight = False
+            if was_trial or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._counters["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["state"] = self._current_state(time.monotonic())
+            stats["consecutive_failures"] = self._failures
+        return stats
+
+    def _current_state(self, now):
+        """Move an open circuit to half-open once the reset timeout has passed (lock held)"""
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
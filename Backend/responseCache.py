@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Defaults can be overridden from the .env file
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 6 * 3600      # Attractions and hotels change slowly; refresh a few times a day
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Near-duplicate keys treat these spellings as the same request
+_NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10",
+}
+_FILLER_WORDS = {"a", "an", "the", "for", "of", "and", "trip", "in"}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so indentation and line wrapping in a prompt don't change its key"""
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+
+def near_duplicate_key(*parts) -> str:
+    """
+    Reduce the variable parts of a request to a canonical token string.
+
+    Case, punctuation, filler words, number words and plural endings are ignored, so
+    ("Goa", "3 days"), ("goa,", "3-day") and ("GOA", "three days") share a key.
+    Word order is kept: "cafe near museum road" and "museum near cafe road" differ.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(" ".join(str(part) for part in parts).lower()):
+        token = _NUMBER_WORDS.get(token, token)
+        if token in _FILLER_WORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def _response_size(response) -> int:
+    """Approximate bytes held by a cached response: UTF-8 length of the text or of its JSON form"""
+    if not isinstance(response, str):
+        response = json.dumps(response, default=str)
+    return len(response.encode("utf-8"))
+
+
+class ResponseCache:
+    """
+    In-process LRU of agent responses shared by every session.
+
+    Entries are keyed on the normalized prompt plus the agent fingerprint (model id
+    and tool set), so a change of model or tools never serves an old answer. With
+    near_duplicates enabled, callers can also pass the variable parts of the request
+    (destination, duration, ...) and differently spelled but equivalent requests are
+    answered from the same entry.
+
+    Least recently used entries are evicted once the cache holds more than
+    max_entries responses or more than max_bytes of response text, whichever
+    comes first; a single response larger than max_bytes is not cached.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, near_duplicates=False,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicates = near_duplicates
+
+        # key -> (expires_at, response, near_key, size in bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # near-duplicate key -> key of the entry it points at
+        self._near_index = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "near_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def get(self, prompt: str, fingerprint: Optional[str], near_parts=None) -> Optional[Any]:
+        """
+        Return a cached response or None.
+
+        Args:
+            prompt: Prompt the agent would be sent
+            fingerprint: Agent fingerprint (AgentPool.fingerprint); None (a pool whose factory
+                declares no MODEL_ID and no agent built yet) disables caching
+            near_parts: Optional tuple of the request's variable parts for near-duplicate matching
+        """
+        if self.max_entries <= 0 or fingerprint is None:
+            return None
+
+        key = _digest(fingerprint, normalize_prompt(prompt))
+        near_key = self._near_key(fingerprint, near_parts)
+        now = time.monotonic()
+        with self._lock:
+            response = self._lookup(key, now)
+            if response is not None:
+                self._counters["hits"] += 1
+                return response
+
+            if near_key is not None and near_key in self._near_index:
+                response = self._lookup(self._near_index[near_key], now)
+                if response is not None:
+                    self._counters["hits"] += 1
+                    self._counters["near_hits"] += 1
+                    return response
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, prompt: str, fingerprint: Optional[str], response: Any, near_parts=None) -> None:
+        """Store a response; empty responses are not cached"""
+        if self.max_entries <= 0 or fingerprint is None or not response:
+            return
+        size = _response_size(response)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        key = _digest(fingerprint, normalize_prompt(prompt))
+        near_key = self._near_key(fingerprint, near_parts)
+        with self._lock:
+            replaced = self._entries.pop(key, None)
+            if replaced is not None:
+                self._bytes -= replaced[3]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, response, near_key, size)
+            self._bytes += size
+            if near_key is not None:
+                self._near_index[near_key] = key
+            self._counters["stores"] += 1
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                evicted_key, (_, _, evicted_near_key, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._forget_near_key(evicted_key, evicted_near_key)
+                self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._near_index.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, hit rate and the current number of entries and bytes held"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["near_duplicates"] = self.near_duplicates
+        return stats
+
+    def _near_key(self, fingerprint, near_parts):
+        if not self.near_duplicates or not near_parts:
+            return None
+        return _digest(fingerprint, near_duplicate_key(*near_parts))
+
+    def _lookup(self, key, now):
+        """Return a live entry's response and mark it recently used, dropping it if expired (lock held)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response, near_key, size = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self._bytes -= size
+            self._forget_near_key(key, near_key)
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _forget_near_key(self, key, near_key):
+        """Drop the near-duplicate pointer if it still points at key (lock held)"""
+        if near_key is not None and self._near_index.get(near_key) == key:
+            del self._near_index[near_key]
+
+
+def _build_default_cache() -> ResponseCache:
+    """Create the process-wide cache from environment settings"""
+    return ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        near_duplicates=os.getenv("RESPONSE_CACHE_NEAR_DUPLICATES", "").lower() in ("1", "true", "yes"),
+    )
+
+
+# Shared by every session in this process
+response_cache = _build_default_cache()
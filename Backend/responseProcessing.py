@@ -0,0 +1,150 @@
+import re
+
+from geolocation import geocode_many
+from asyncGeolocation import ageocode_many
+# Patterns and numbered-item parsing live in extraction; re-exported for existing callers
+from extraction import ATTRACTION_PATTERN, HOTEL_PATTERN, NumberedItem, find_numbered_items
+
+# One alternation covering everything process_function_calls rewrites, so the
+# response is scanned once instead of once per pattern and once per match:
+#   <function=get_location_coordinates{"location_name": "Location Name"}></function>
+#   get_location_coordinates("Location Name")
+#   "waiting for the function result" filler lines, which are dropped
+_REWRITE_PATTERN = re.compile(
+    r'<function=get_location_coordinates>?\s*\{\s*"location_name"\s*:\s*"(?P<tag_name>[^"]+)"\s*\}\}?\s*>?\s*</function>'
+    r'|get_location_coordinates\("(?P<call_name>[^"]+)"\)'
+    r'|(?P<waiting>(?:Waiting for the result of the function call|Please wait for the function result|Once I have the coordinates).*?\n'
+    r'|\(Please provide the result of the function call\))'
+)
+
+
+def process_function_calls(text):
+    """
+    Process all function calls in the text and replace them with their results
+    The format is expected to be <function=get_location_coordinates{"location_name": "Location Name"}></function>
+    or get_location_coordinates("Location Name")
+
+    Every distinct location is geocoded once, concurrently, and the output is
+    assembled with a single join.
+    """
+    matches = list(_REWRITE_PATTERN.finditer(text))
+    if not matches:
+        return text
+
+    location_names = _location_names(matches)
+    return _rewrite(text, matches, dict(zip(location_names, geocode_many(location_names))))
+
+
+async def aprocess_function_calls(text):
+    """process_function_calls for the ASGI app; locations are geocoded with ageocode_many"""
+    matches = list(_REWRITE_PATTERN.finditer(text))
+    if not matches:
+        return text
+
+    location_names = _location_names(matches)
+    return _rewrite(text, matches, dict(zip(location_names, await ageocode_many(location_names))))
+
+
+def _location_names(matches):
+    """Distinct location names in match order, so each is resolved once"""
+    location_names = []
+    seen = set()
+    for match in matches:
+        location_name = match.group("tag_name") or match.group("call_name")
+        if location_name and location_name not in seen:
+            seen.add(location_name)
+            location_names.append(location_name)
+    return location_names
+
+
+def _rewrite(text, matches, results):
+    """Replace each match with its coordinates (or nothing, for filler lines) in a single join"""
+    parts = []
+    position = 0
+    for match in matches:
+        parts.append(text[position:match.start()])
+        if match.group("waiting") is None:
+            location_name = match.group("tag_name") or match.group("call_name")
+            parts.append(f"**Coordinates**: {results[location_name].to_legacy_string()}")
+        position = match.end()
+    parts.append(text[position:])
+
+    return "".join(parts)
+
+
+class StreamingRewriter:
+    """
+    Apply process_function_calls to a streamed response as it arrives.
+
+    Placeholders and waiting lines never span a line break, so text is rewritten
+    one batch of complete lines at a time; only the unfinished last line is held back.
+    """
+
+    def __init__(self):
+        self._pending = []
+
+    def feed(self, chunk):
+        """Add a streamed chunk and return the rewritten text that is now final"""
+        complete = self._complete_lines(chunk)
+        return process_function_calls(complete) if complete else ""
+
+    def flush(self):
+        """Rewrite and return whatever is left once the stream has ended"""
+        rest = self._take_rest()
+        return process_function_calls(rest) if rest else ""
+
+    def _complete_lines(self, chunk):
+        """Buffer the chunk and return every complete line collected so far"""
+        newline = chunk.rfind("\n")
+        if newline == -1:
+            self._pending.append(chunk)
+            return ""
+        self._pending.append(chunk[:newline + 1])
+        complete = "".join(self._pending)
+        self._pending = [chunk[newline + 1:]] if newline + 1 < len(chunk) else []
+        return complete
+
+    def _take_rest(self):
+        rest = "".join(self._pending)
+        self._pending = []
+        return rest
+
+
+def insert_annotations(text, annotations):
+    """
+    Insert snippets at the given offsets with a single join.
+
+    Args:
+        text: Original text
+        annotations: Iterable of (offset, snippet) pairs; offsets index into the original text
+
+    Returns:
+        str: Text with every snippet inserted
+    """
+    parts = []
+    position = 0
+    for offset, snippet in sorted(annotations, key=lambda annotation: annotation[0]):
+        parts.append(text[position:offset])
+        parts.append(snippet)
+        position = offset
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def annotate_with_coordinates(text, items, results):
+    """
+    Add a "**Coordinates**: ..." line after the description of each item.
+
+    Args:
+        text: Agent response the items were found in
+        items: NumberedItem list from find_numbered_items
+        results: GeocodeResult for each item, in the same order
+
+    Returns:
+        str: Annotated response
+    """
+    return insert_annotations(text, [
+        (item.end, f"\n**Coordinates**: {result.to_legacy_string()}")
+        for item, result in zip(items, results)
+    ])
+
@@ -0,0 +1,436 @@
+import hashlib
+import json
+from datetime import datetime
+
+from agentPrompts import (
+    itinerary_query, transportation_query, accommodation_options_query, local_transportation_query,
+    comprehensive_plan_query, nearby_alternatives_query
+)
+from chatHistory import ChatHistory
+from itineraryVersions import VersionedItinerary, ItineraryVersionConflict, InvalidItineraryPatch
+from responseProcessing import annotate_with_coordinates, StreamingRewriter
+from routePlanner import plan_route, route_lookups, parse_day_count
+from travelTimes import TravelTimeMatrix, route_locations, location_query, annotate_travel_times
+
+# The parts of each route that app.py (Flask) and asgiApp.py (FastAPI) share.
+# Nothing here talks to an agent, a geocoder or the session store: the apps do that
+# around these calls, blocking or awaited, and keep only the I/O and framework glue.
+# Helpers that answer a request return the JSON body; errors come back as
+# (body, status) so each app can wrap them in its own response type.
+
+# Booking routes that run a single prompt on the stored itinerary:
+# route name -> (user message, prompt builder, history message, result key)
+BOOKING_QUERIES = {
+    "transportation": ("Request for transportation options", transportation_query,
+                       "Transportation options", "transportation_options"),
+    "accommodation": ("Request for accommodation booking options", accommodation_options_query,
+                      "Accommodation booking options", "accommodation_options"),
+    "local_transportation": ("Request for local transportation options", local_transportation_query,
+                             "Local transportation options", "local_transportation"),
+    "comprehensive": ("Request for comprehensive travel plan", comprehensive_plan_query,
+                      "Comprehensive travel plan", "comprehensive_plan"),
+}
+
+# The sections create-booking-plan researches side by side, in response order
+BOOKING_PLAN_SECTIONS = ("transportation", "accommodation", "local_transportation")
+
+ITINERARY_REQUIRED_KEYS = ("destination", "duration", "selected_places", "selected_hotel")
+
+
+def new_session(chat_history_max_entries, chat_compress_min_bytes):
+    """A fresh session; agents come from the shared pools, so only context is stored"""
+    return {
+        "travel_context": {},
+        "booking_context": {},
+        "chat_history": ChatHistory(chat_history_max_entries, chat_compress_min_bytes),
+        "created_at": datetime.now().isoformat(),
+        "last_active": datetime.now().isoformat(),
+        "current_itinerary": None,
+        "current_location": None,
+        "travel_times": None,
+        "itinerary": None
+    }
+
+
+def add_to_chat_history(session, source, message, response=None):
+    """Add a message to the chat history"""
+    session["chat_history"].append(source, message, response)
+
+
+def parse_paging(args):
+    """
+    (cursor, limit) from the query string of a session info request.
+
+    Args:
+        args: Query parameters with a dict-like get()
+
+    Raises:
+        ValueError: If cursor or limit is not an integer
+    """
+    cursor = args.get('cursor')
+    cursor = int(cursor) if cursor is not None else None
+    limit = min(max(int(args.get('limit', 50)), 1), 200)
+    return cursor, limit
+
+
+def session_info(session_id, session, cursor, limit):
+    """Session details and one page of its chat history"""
+    chat_history = session["chat_history"]
+    page = chat_history.page(cursor, limit)
+    return {
+        "session_id": session_id,
+        "created_at": session["created_at"],
+        "last_active": session["last_active"],
+        "chat_history": page["entries"],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+        "total_messages": chat_history.total,
+        "travel_agent_context": session["travel_context"],
+        "booking_agent_context": session["booking_context"]
+    }
+
+
+def session_summaries(items, load_chat_history):
+    """One line per stored (session_id, session) pair for the session list"""
+    return [{
+        "session_id": session_id,
+        "created_at": data["created_at"],
+        "last_active": data["last_active"],
+        "message_count": load_chat_history(data["chat_history"]).total
+    } for session_id, data in items]
+
+
+def wants_stream(args, headers):
+    """Clients opt into Server-Sent Events with ?stream=1 or an Accept: text/event-stream header"""
+    if args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in headers.get('accept', '')
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event; data is JSON so newlines in the text survive"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def drain_agent_stream(agent, query, emit):
+    """
+    Run a query as a stream on a leased agent and rewrite coordinates as the text arrives.
+
+    Blocks until the model finishes, so call it from a worker thread.
+
+    Args:
+        agent: Leased agent wrapper
+        query: Prompt to send
+        emit: Called with each piece of processed text as soon as it is ready
+
+    Returns:
+        str: The whole processed response
+    """
+    rewriter = StreamingRewriter()
+    parts = []
+    for chunk in agent.agent.run(query, stream=True):
+        content = getattr(chunk, "content", chunk)
+        text = rewriter.feed(content) if isinstance(content, str) else ""
+        if text:
+            parts.append(text)
+            emit(text)
+    text = rewriter.flush()
+    if text:
+        parts.append(text)
+        emit(text)
+    return "".join(parts)
+
+
+def attraction_queries(attractions, destination):
+    """Geocoder lookup for each attraction; the destination is added unless the name already holds it"""
+    return [
+        attraction.name if destination.lower() in attraction.name.lower() else f"{attraction.name}, {destination}"
+        for attraction in attractions
+    ]
+
+
+def places_suggested(session, destination, duration, processed_response, attractions, queries, results):
+    """
+    Record a suggest-places answer on the session and build its body.
+
+    The attractions are remembered with their printed numbers so create-itinerary can
+    turn the selected numbers back into places to route.
+    """
+    session["travel_context"]["suggested_places"] = [
+        {"number": attraction.number, "name": attraction.name, "location_query": query}
+        for attraction, query in zip(attractions, queries)
+    ]
+    attractions_with_coords = [{
+        "name": attraction.name,
+        "location_query": query,
+        "coordinates": geocode_result.to_legacy_string(),
+        "geo": geocode_result.to_dict()
+    } for attraction, query, geocode_result in zip(attractions, queries, results)]
+
+    # Coordinates go after each attraction's description paragraph
+    processed_response = annotate_with_coordinates(processed_response, attractions, results)
+    add_to_chat_history(session, "system", "Places suggestions", processed_response)
+    return {
+        "suggestions": processed_response,
+        "destination": destination,
+        "duration": duration,
+        "attractions_with_coordinates": attractions_with_coords
+    }
+
+
+def hotels_to_locate(travel_context, processed_response, hotels):
+    """
+    Remember every suggested hotel and return (hotels, lookups) for those not yet located.
+
+    Hotels whose lookup already appears in the response have their coordinates there.
+    """
+    destination = travel_context.get("destination", "")
+    travel_context["suggested_hotels"] = [
+        {"number": hotel.number, "name": hotel.name, "location_query": f"{hotel.name}, {destination}"}
+        for hotel in hotels
+    ]
+    hotels = [hotel for hotel in hotels if f"{hotel.name}, {destination}" not in processed_response]
+    return hotels, [f"{hotel.name}, {destination}" for hotel in hotels]
+
+
+def accommodations_suggested(session, processed_response, hotels, results):
+    """Record a suggest-accommodations answer on the session and build its body"""
+    processed_response = annotate_with_coordinates(processed_response, hotels, results)
+    add_to_chat_history(session, "system", "Accommodation suggestions", processed_response)
+    return {"accommodations": processed_response}
+
+
+def missing_itinerary_error(travel_context):
+    """(body, 400) naming the selections create-itinerary still needs, or None when all are made"""
+    missing_keys = [key for key in ITINERARY_REQUIRED_KEYS if key not in travel_context]
+    if not missing_keys:
+        return None
+    return {"error": f"Missing required information: {', '.join(missing_keys)}. Complete previous steps first."}, 400
+
+
+def route_plan_queries(travel_context):
+    """Lookups to geocode for the route plan, or None if the session has no stored suggestions"""
+    lookups = route_lookups(travel_context)
+    if lookups is None:
+        return None
+    places, hotel = lookups
+    return [query for _, query in places] + ([hotel[1]] if hotel else [])
+
+
+def route_plan_from(travel_context, results):
+    """Day-by-day visit order for the selected places, given results for route_plan_queries()"""
+    places, hotel = route_lookups(travel_context)
+    return plan_route(
+        [(name, result) for (name, _), result in zip(places, results)],
+        parse_day_count(travel_context.get("duration")),
+        (hotel[0], results[-1]) if hotel else None
+    )
+
+
+def create_itinerary_query(travel_context, route_plan):
+    """The itinerary prompt; an ordered route leaves the model far less routing to reason about"""
+    return itinerary_query(
+        travel_context.get("destination", ""),
+        travel_context.get("duration", ""),
+        travel_context.get("selected_places", ""),
+        travel_context.get("selected_hotel", ""),
+        route_plan.to_prompt() if route_plan and route_plan.days else None
+    )
+
+
+def start_booking_query(session, kind, itinerary=None):
+    """
+    Record a single-prompt booking request and return (query, history message, result key).
+
+    Args:
+        session: Session loaded by the app
+        kind: Key of BOOKING_QUERIES
+        itinerary: New itinerary to store first; None uses the stored one
+
+    Returns:
+        tuple, or None when the session has no itinerary yet
+    """
+    user_message, build_query, history_message, result_key = BOOKING_QUERIES[kind]
+    booking_context = session["booking_context"]
+    if itinerary is None and "itinerary" not in booking_context:
+        return None
+    add_to_chat_history(session, "user", user_message)
+    if itinerary is not None:
+        booking_context["itinerary"] = itinerary
+    return build_query(booking_context["itinerary"]), history_message, result_key
+
+
+def booking_plan_recorded(session, sections, comprehensive_plan, started, researched, finished):
+    """
+    Record a create-booking-plan answer on the session and build its body.
+
+    Args:
+        sections: Processed text of each BOOKING_PLAN_SECTIONS entry, in that order
+        started, researched, finished: perf_counter() readings around the two phases
+    """
+    body = {}
+    for kind, text in zip(BOOKING_PLAN_SECTIONS, sections):
+        _, _, history_message, result_key = BOOKING_QUERIES[kind]
+        add_to_chat_history(session, "system", history_message, text)
+        body[result_key] = text
+    add_to_chat_history(session, "system", "Comprehensive travel plan", comprehensive_plan)
+    body["comprehensive_plan"] = comprehensive_plan
+    body["timings"] = {
+        "research_seconds": round(researched - started, 3),
+        "merge_seconds": round(finished - researched, 3),
+        "total_seconds": round(finished - started, 3)
+    }
+    return body
+
+
+def live_context(session, data):
+    """(mood, current time, current location) from a request, defaulting to now and the session's last location"""
+    return (
+        data.get('mood_state'),
+        data.get('current_time', datetime.now().strftime("%H:%M")),
+        data.get('current_location', session.get('current_location', 'Current location'))
+    )
+
+
+def mood_updated(session, data):
+    """Store a mood update on the session and build its body"""
+    mood_state, current_time, current_location = live_context(session, data)
+    session['current_mood'] = mood_state
+    session['current_time'] = current_time
+    session['current_location'] = current_location
+    add_to_chat_history(session, "user", f"Mood update: {mood_state} at {current_time}")
+    return {
+        "message": "Mood state updated successfully",
+        "mood_state": mood_state,
+        "current_time": current_time,
+        "current_location": current_location
+    }
+
+
+def travel_time_lookups(session, itinerary, current_time, current_location):
+    """
+    (matrix, locations, lookups) for bringing the session's travel-time matrix up to date.
+
+    Only places the matrix has not seen need geocoding; their results go to travelTimes.update_matrix().
+    """
+    travel_times = TravelTimeMatrix.from_state(session.get("travel_times"))
+    locations = route_locations(itinerary, current_time, current_location)
+    destination = session["travel_context"].get("destination")
+    return travel_times, locations, [location_query(location, destination) for location in travel_times.missing(locations)]
+
+
+def itinerary_view(session, since):
+    """The live itinerary, or only the diffs after version `since` (a query string) when they are still kept"""
+    itinerary = VersionedItinerary.from_state(session.get('itinerary'))
+    if since is not None and since.lstrip('-').isdigit():
+        diffs = itinerary.changes_since(int(since))
+        if diffs is not None:
+            return {"version": itinerary.version, "diffs": diffs}
+    return itinerary.snapshot()
+
+
+def _keep_itinerary(session, itinerary):
+    session['itinerary'] = itinerary
+    session['current_itinerary'] = itinerary.activities
+
+
+def patch_session_itinerary(session, data):
+    """
+    Apply a PATCH body's changes to the session's itinerary.
+
+    Returns:
+        (itinerary, diff) on success, or (None, (error body, status)) for a stale
+        base_version (409) or a malformed change (400)
+    """
+    itinerary = VersionedItinerary.from_state(session.get('itinerary'))
+    try:
+        diff = itinerary.apply_patch(data['changes'], data.get('base_version'))
+    except ItineraryVersionConflict as e:
+        return None, ({"error": str(e), "version": itinerary.version}, 409)
+    except InvalidItineraryPatch as e:
+        return None, ({"error": str(e)}, 400)
+    _keep_itinerary(session, itinerary)
+    return itinerary, diff
+
+
+def itinerary_to_adjust(session, data):
+    """
+    The session's itinerary with an adjust request's whole day or changes applied.
+
+    base_version refers to the server's copy as the client last saw it, so it is
+    checked before either step.
+
+    Returns:
+        (itinerary, None) on success, or (None, (error body, status))
+    """
+    itinerary = VersionedItinerary.from_state(session.get('itinerary'))
+    try:
+        itinerary.check_version(data.get('base_version'))
+        if 'current_itinerary' in data:
+            itinerary.replace(data['current_itinerary'])
+        if 'changes' in data:
+            itinerary.apply_patch(data['changes'])
+    except ItineraryVersionConflict as e:
+        return None, ({"error": str(e), "version": itinerary.version}, 409)
+    except InvalidItineraryPatch as e:
+        return None, ({"error": str(e)}, 400)
+    if not itinerary.activities:
+        return None, ({"error": "Current itinerary and mood state are required"}, 400)
+    _keep_itinerary(session, itinerary)
+    return itinerary, None
+
+
+def itinerary_adjusted(session, itinerary, result, travel_times, response_format=None):
+    """
+    Merge an adjustment into the itinerary, record it on the session and build the body.
+
+    Legs between the new schedule's activities come straight from the matrix. Finished
+    activities are kept as they are; only the rest of the day is replaced.
+
+    Args:
+        response_format: 'diff' leaves the full schedule out, for clients that keep their own copy
+    """
+    annotate_travel_times(result.get('updated_schedule'), travel_times)
+    diff = itinerary.merge_adjustment(result.get('updated_schedule'), result.get('activities_to_cancel'))
+    result['updated_schedule'] = itinerary.activities
+    session['current_itinerary'] = itinerary.activities
+
+    add_to_chat_history(session, "system", "Itinerary adjusted", result)
+
+    if response_format == 'diff':
+        result = {key: value for key, value in result.items() if key != 'updated_schedule'}
+    return {
+        "message": "Itinerary adjusted successfully",
+        "result": result,
+        "version": itinerary.version,
+        "diff": diff
+    }
+
+
+def live_agent_failure(session, history_message, error_message, error):
+    """Record a failed live itinerary request and build its 500 body"""
+    add_to_chat_history(session, "system", f"{history_message}: {str(error)}")
+    return {"error": error_message, "details": str(error)}
+
+
+def alternatives_request(session, data):
+    """Record a find-alternatives request and return its (activity_type, location, radius_km, mood_state)"""
+    activity_type = data['activity_type']
+    location = data.get('location', session.get('current_location', 'Current location'))
+    radius_km = data.get('radius_km', 5)
+    mood_state = data.get('mood_state', session.get('current_mood', 'neutral'))
+    add_to_chat_history(session, "user", f"Request alternatives for {activity_type} near {location}")
+    return activity_type, location, radius_km, mood_state
+
+
+def alternatives_cache_key(activity_type, location, radius_km, mood_state, venues):
+    """
+    (prompt, near parts) the response cache files a find-alternatives answer under.
+
+    The near parts carry a digest of the known venue names the prompt lists, so a
+    near-duplicate request only reuses an answer drawn from the same venues.
+    """
+    query = nearby_alternatives_query(activity_type, location, radius_km, mood_state, venues)
+    venue_names = "\0".join(sorted(venue["name"] for venue in venues))
+    venues_digest = hashlib.sha256(venue_names.encode("utf-8")).hexdigest()[:16]
+    return query, ("find_alternatives", activity_type, location, radius_km, mood_state, venues_digest)
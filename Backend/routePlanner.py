@@ -0,0 +1,235 @@
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geocodeTypes import EARTH_RADIUS_KM, GeocodeResult
+
+# Orders the places picked for an itinerary before the agent sees them: a haversine
+# distance matrix over the geocoded places and the hotel, a nearest-neighbour tour
+# improved with 2-opt, then the tour cut into one loop from the hotel per day. The
+# model gets a ready-made visit order instead of a list of numbers to sequence.
+
+# 2-opt stops after this many passes even if it could still improve; tours of a few dozen places converge in far fewer
+MAX_TWO_OPT_PASSES = 50
+
+_DAY_COUNT_RE = re.compile(r"(\d+)\s*(day|night|week)", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def parse_day_count(duration) -> int:
+    """Days in a trip duration such as "3 days", "2 nights" or "1 week"; 1 if unclear"""
+    match = _DAY_COUNT_RE.search(str(duration or ""))
+    if not match:
+        number = _NUMBER_RE.search(str(duration or ""))
+        return max(int(number.group(0)), 1) if number else 1
+    count = int(match.group(1))
+    if match.group(2).lower() == "week":
+        count *= 7
+    return max(count, 1)
+
+
+def parse_selection(selection) -> List[int]:
+    """The numbers in a selection like "1, 3, 5" or [1, 3, 5], in order and without repeats"""
+    if isinstance(selection, (list, tuple)):
+        numbers = [int(number) for number in selection if str(number).strip().isdigit()]
+    else:
+        numbers = [int(number) for number in _NUMBER_RE.findall(str(selection or ""))]
+    return list(dict.fromkeys(numbers))
+
+
+def _by_number(suggestions) -> Dict[int, Dict[str, Any]]:
+    """Stored suggestions keyed by the number the agent printed; older sessions stored none, so position stands in"""
+    return {suggestion.get("number", position): suggestion for position, suggestion in enumerate(suggestions, 1)}
+
+
+def haversine_matrix(latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+    """Pairwise great-circle distances in kilometres, computed in one vectorized pass"""
+    phi = np.radians(np.asarray(latitudes, dtype=float))
+    lam = np.radians(np.asarray(longitudes, dtype=float))
+    half_dphi = (phi[:, None] - phi[None, :]) / 2
+    half_dlambda = (lam[:, None] - lam[None, :]) / 2
+    h = np.sin(half_dphi) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def haversine_row(latitude: float, longitude: float, latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+    """Great-circle distances in kilometres from one point to many"""
+    phi = np.radians(latitude)
+    phis = np.radians(np.asarray(latitudes, dtype=float))
+    half_dphi = (phis - phi) / 2
+    half_dlambda = np.radians(np.asarray(longitudes, dtype=float) - longitude) / 2
+    h = np.sin(half_dphi) ** 2 + np.cos(phi) * np.cos(phis) * np.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def nearest_neighbour_tour(distances: np.ndarray, start: int = 0) -> List[int]:
+    """Greedy tour from start, always moving to the closest unvisited point"""
+    count = distances.shape[0]
+    visited = np.zeros(count, dtype=bool)
+    tour = [start]
+    visited[start] = True
+    for _ in range(count - 1):
+        remaining = np.where(visited, np.inf, distances[tour[-1]])
+        nearest = int(np.argmin(remaining))
+        tour.append(nearest)
+        visited[nearest] = True
+    return tour
+
+
+def two_opt(tour: Sequence[int], distances: np.ndarray) -> List[int]:
+    """
+    Improve a closed tour by reversing segments while that shortens it.
+
+    tour[0] stays in place (the hotel). For each segment start every possible end is
+    scored at once with NumPy and the best reversal is applied.
+    """
+    tour = np.asarray(tour)
+    count = len(tour)
+    if count < 4:
+        return tour.tolist()
+
+    for _ in range(MAX_TWO_OPT_PASSES):
+        improved = False
+        for i in range(1, count - 1):
+            ends = np.arange(i + 1, count)
+            before, first = tour[i - 1], tour[i]
+            last, after = tour[ends], tour[(ends + 1) % count]
+            gain = distances[before, last] + distances[first, after] - distances[before, first] - distances[last, after]
+            best = int(np.argmin(gain))
+            if gain[best] < -1e-9:
+                end = ends[best]
+                tour[i:end + 1] = tour[i:end + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return tour.tolist()
+
+
+class RoutePlan:
+    """Places grouped by day, each day ordered as a loop from the hotel"""
+
+    def __init__(self, days: List[List[Dict[str, Any]]], hotel: Optional[Dict[str, Any]],
+                 unplaced: List[str], compute_seconds: float):
+        self.days = days
+        self.hotel = hotel
+        self.unplaced = unplaced
+        self.compute_seconds = compute_seconds
+
+    @property
+    def total_km(self) -> float:
+        return round(sum(day["distance_km"] for day in self.days), 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hotel": self.hotel,
+            "days": self.days,
+            "unplaced": self.unplaced,
+            "total_km": self.total_km,
+            "compute_ms": round(self.compute_seconds * 1000, 3),
+        }
+
+    def to_prompt(self) -> str:
+        """One line per day: stops in visiting order with the straight-line distance of each leg"""
+        lines = []
+        for number, day in enumerate(self.days, 1):
+            stops = [f"{stop['name']} ({stop['leg_km']} km)" for stop in day["stops"]]
+            if self.hotel:
+                stops.insert(0, self.hotel["name"])
+                stops.append(f"back to hotel ({day['return_km']} km)")
+            else:
+                stops[0] = day["stops"][0]["name"]
+            lines.append(f"Day {number}: {' -> '.join(stops)}; {day['distance_km']} km")
+        if self.unplaced:
+            lines.append(f"Not located, fit in where sensible: {', '.join(self.unplaced)}")
+        return "\n".join(lines)
+
+
+def plan_route(places: Sequence[Tuple[str, GeocodeResult]], days: int = 1,
+               hotel: Optional[Tuple[str, GeocodeResult]] = None) -> RoutePlan:
+    """
+    Split the places into days and order each day to keep travel short.
+
+    Args:
+        places: (display name, geocoding result) for each selected place
+        days: Number of days to spread the places over
+        hotel: (display name, geocoding result) of the hotel every day starts and ends at
+
+    Returns:
+        RoutePlan; places without coordinates are listed as unplaced
+    """
+    started = time.perf_counter()
+    located = [(name, result) for name, result in places if result.ok]
+    unplaced = [name for name, result in places if not result.ok]
+    hotel_point = hotel if hotel is not None and hotel[1].ok else None
+
+    if not located:
+        return RoutePlan([], None, unplaced, time.perf_counter() - started)
+
+    latitudes = [result.latitude for _, result in located]
+    longitudes = [result.longitude for _, result in located]
+    # Index 0 is the hotel, or the centre of the places when there is none
+    if hotel_point is not None:
+        latitudes.insert(0, hotel_point[1].latitude)
+        longitudes.insert(0, hotel_point[1].longitude)
+    else:
+        latitudes.insert(0, float(np.mean(latitudes)))
+        longitudes.insert(0, float(np.mean(longitudes)))
+    distances = haversine_matrix(latitudes, longitudes)
+
+    tour = two_opt(nearest_neighbour_tour(distances), distances)
+    day_count = max(1, min(days, len(located)))
+
+    plan_days = []
+    for chunk in np.array_split(np.asarray(tour[1:]), day_count):
+        day_tour = two_opt([0] + chunk.tolist(), distances)[1:]
+        stops = []
+        previous = 0 if hotel_point is not None else day_tour[0]
+        for index in day_tour:
+            name, result = located[index - 1]
+            stops.append({
+                "name": name,
+                "latitude": result.latitude,
+                "longitude": result.longitude,
+                "leg_km": round(float(distances[previous, index]), 2),
+            })
+            previous = index
+        return_km = round(float(distances[previous, 0]), 2) if hotel_point is not None else 0.0
+        plan_days.append({
+            "stops": stops,
+            "return_km": return_km,
+            "distance_km": round(sum(stop["leg_km"] for stop in stops) + return_km, 2),
+        })
+
+    hotel_info = None
+    if hotel_point is not None:
+        hotel_info = {"name": hotel_point[0], "latitude": hotel_point[1].latitude, "longitude": hotel_point[1].longitude}
+    return RoutePlan(plan_days, hotel_info, unplaced, time.perf_counter() - started)
+
+
+def route_lookups(travel_context) -> Optional[Tuple[List[Tuple[str, str]], Optional[Tuple[str, str]]]]:
+    """
+    (name, location query) of the selected places and hotel, from the suggestions stored in the session.
+
+    Returns None when the session has no stored suggestions, e.g. it predates them.
+    """
+    suggested_places = travel_context.get("suggested_places")
+    if not suggested_places:
+        return None
+    # Selections are the numbers the user saw in the response; numbers it did not show are ignored
+    places_by_number = _by_number(suggested_places)
+    places = [
+        (places_by_number[number]["name"], places_by_number[number]["location_query"])
+        for number in parse_selection(travel_context.get("selected_places"))
+        if number in places_by_number
+    ]
+    if not places:
+        return None
+
+    hotel = None
+    hotels_by_number = _by_number(travel_context.get("suggested_hotels") or [])
+    hotel_numbers = [number for number in parse_selection(travel_context.get("selected_hotel")) if number in hotels_by_number]
+    if hotel_numbers:
+        hotel = (hotels_by_number[hotel_numbers[0]]["name"], hotels_by_number[hotel_numbers[0]]["location_query"])
+    return places, hotel
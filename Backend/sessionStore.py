@@ -0,0 +1,615 @@
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Defaults can be overridden from the .env file
+DEFAULT_SESSION_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_SESSIONS = 10000
+
+
+def _dumps(session):
+    """Serialize a session; values such as ChatHistory provide their own to_state()"""
+    def default(value):
+        if hasattr(value, "to_state"):
+            return value.to_state()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return json.dumps(session, separators=(",", ":"), default=default)
+
+
+class StoredSession(dict):
+    """A session read from a persistent store, remembering its fields as they were when loaded"""
+
+    def __init__(self, data: str):
+        super().__init__(json.loads(data))
+        self.loaded = json.loads(data)
+
+
+_MISSING = object()
+
+
+def _is_chat_state(value) -> bool:
+    return isinstance(value, dict) and "next_id" in value and isinstance(value.get("entries"), list)
+
+
+def _merge_chat_state(current, ours, base):
+    """Entries appended on both sides are all kept; ours are renumbered to follow the stored ones"""
+    added = [entry for entry in ours["entries"] if entry[0] >= base["next_id"]]
+    next_id = current["next_id"]
+    entries = list(current["entries"])
+    for entry in added:
+        entries.append([next_id] + list(entry[1:]))
+        next_id += 1
+    # ChatHistory.from_state trims the result to the ring buffer size on the next load
+    return {**ours, "next_id": next_id, "entries": entries}
+
+
+def _merge_value(current, ours, base):
+    """
+    Three-way merge of a session value: what is stored now, what this request saves,
+    and what it loaded.
+
+    Fields this request did not touch keep the stored value, so concurrent requests
+    that change different fields (or different keys of travel_context) do not undo
+    each other. Chat histories keep the entries both sides appended. When both
+    sides changed the same scalar or list, this request wins.
+    """
+    if ours == base:
+        return current
+    if current == base or current is _MISSING:
+        return ours
+    if _is_chat_state(current) and _is_chat_state(ours) and _is_chat_state(base):
+        return _merge_chat_state(current, ours, base)
+    if isinstance(current, dict) and isinstance(ours, dict) and isinstance(base, dict):
+        merged = {}
+        for key in {**current, **ours}:
+            value = _merge_value(current.get(key, _MISSING), ours.get(key, _MISSING), base.get(key, _MISSING))
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+    return ours
+
+
+def _merge_session(current_data: Optional[str], session: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    """
+    JSON to store when saving session over current_data (the stored JSON, or None),
+    and the session's own JSON to pass to _mark_saved once the write went through.
+
+    A StoredSession is merged field by field against what it was loaded from;
+    a plain dict (a new session) replaces whatever is stored. A StoredSession
+    whose row is gone was deleted or expired since it was loaded, so the JSON
+    to store is None and the caller must not write it back.
+    """
+    data = _dumps(session)
+    loaded = getattr(session, "loaded", None)
+    if loaded is None:
+        return data, data
+    if current_data is None:
+        return None, data
+    return _dumps(_merge_value(json.loads(current_data), json.loads(data), loaded)), data
+
+
+def _mark_saved(session: Dict[str, Any], data: str) -> None:
+    """Later saves of a StoredSession only write what changed after this one"""
+    if isinstance(session, StoredSession):
+        session.loaded = json.loads(data)
+
+
+class SessionStore(ABC):
+    """
+    Where session state lives between requests.
+
+    A session is a plain JSON-serializable dict: agent contexts, chat history,
+    the current itinerary and live-trip state. Agent objects are never stored,
+    so any worker process can serve any session ID. Callers load a session with
+    get(), change it and persist it with save().
+
+    Handlers hold a session across long agent calls, so two requests on the same
+    session often overlap. Shared stores therefore save atomically and only write
+    what the saving request changed since it loaded the session (see _merge_value);
+    the in-memory store hands every request the same live dict instead. Saving a
+    session loaded before it was deleted or expired does not bring it back.
+
+    Every save counts as activity. Stores keep sessions ordered by last activity,
+    so expiring idle sessions only touches the ones being removed, and a session
+    idle for longer than ttl_seconds is treated as gone even before it is swept.
+    Beyond max_sessions, the least recently active sessions are evicted.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = DEFAULT_SESSION_TTL_SECONDS,
+                 max_sessions: Optional[int] = DEFAULT_MAX_SESSIONS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session, or None if it does not exist or has expired"""
+
+    @abstractmethod
+    def save(self, session_id: str, session: Dict[str, Any]) -> None:
+        """Persist a session loaded with get(), or a new one"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a session, returning False if it did not exist"""
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over (session_id, session) pairs"""
+
+    @abstractmethod
+    def expire_idle(self, max_idle_seconds: Optional[float] = None) -> List[str]:
+        """
+        Remove sessions idle for longer than max_idle_seconds (default: ttl_seconds).
+
+        Returns:
+            List[str]: IDs of the removed sessions
+        """
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Sessions in a dict; only visible to the current process.
+
+    The OrderedDict doubles as the expiry index: every save moves the session to
+    the end, so the front always holds the least recently active session.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_SESSION_TTL_SECONDS, max_sessions=DEFAULT_MAX_SESSIONS):
+        super().__init__(ttl_seconds, max_sessions)
+        # session_id -> (monotonic time of last save, session)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if self.ttl_seconds is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            return entry[1]
+
+    def save(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic(), session)
+            self._sessions.move_to_end(session_id)
+            if self.max_sessions is not None:
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def items(self):
+        with self._lock:
+            return iter([(session_id, entry[1]) for session_id, entry in self._sessions.items()])
+
+    def expire_idle(self, max_idle_seconds=None):
+        max_idle_seconds = self.ttl_seconds if max_idle_seconds is None else max_idle_seconds
+        if max_idle_seconds is None:
+            return []
+        cutoff = time.monotonic() - max_idle_seconds
+        removed = []
+        with self._lock:
+            while self._sessions:
+                session_id, (last_seen, _) = next(iter(self._sessions.items()))
+                if last_seen >= cutoff:
+                    break
+                del self._sessions[session_id]
+                removed.append(session_id)
+        return removed
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions as JSON rows in a SQLite file shared by all workers on one host.
+
+    last_active is wall-clock time (workers do not share a monotonic clock) and is
+    indexed, so expiry and LRU eviction are range deletes rather than table scans.
+    Counting rows is itself a scan in SQLite, so the max_sessions cap is enforced
+    by expire_idle (i.e. by the background sweep) rather than on every save.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds=DEFAULT_SESSION_TTL_SECONDS, max_sessions=DEFAULT_MAX_SESSIONS):
+        super().__init__(ttl_seconds, max_sessions)
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                )"""
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(sessions)")]
+            if "last_active" not in columns:
+                self._db.execute("ALTER TABLE sessions ADD COLUMN last_active REAL NOT NULL DEFAULT 0")
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            self._db.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, last_active FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds:
+            self.delete(session_id)
+            return None
+        return StoredSession(row[0])
+
+    def save(self, session_id, session):
+        # IMMEDIATE takes the write lock up front, so the read and the merged write are
+        # one step for every process sharing the file
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT data, last_active FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None and self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds:
+                    row = None
+                merged, data = _merge_session(row[0] if row else None, session)
+                if merged is None:
+                    self._db.rollback()
+                    return
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (session_id, data, last_active) VALUES (?, ?, ?)",
+                    (session_id, merged, time.time()),
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+        _mark_saved(session, data)
+
+    def delete(self, session_id):
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+        return cursor.rowcount > 0
+
+    def items(self):
+        with self._lock:
+            rows = self._db.execute("SELECT session_id, data FROM sessions ORDER BY last_active").fetchall()
+        return ((session_id, json.loads(data)) for session_id, data in rows)
+
+    def expire_idle(self, max_idle_seconds=None):
+        max_idle_seconds = self.ttl_seconds if max_idle_seconds is None else max_idle_seconds
+        if max_idle_seconds is None:
+            return []
+        cutoff = time.time() - max_idle_seconds
+        with self._lock:
+            removed = [row[0] for row in self._db.execute(
+                "SELECT session_id FROM sessions WHERE last_active < ?", (cutoff,)
+            )]
+            self._db.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,))
+            if self.max_sessions is not None:
+                # Keep the newest max_sessions rows, walking the last_active index
+                overflow = """SELECT session_id FROM sessions ORDER BY last_active DESC LIMIT -1 OFFSET ?"""
+                removed.extend(row[0] for row in self._db.execute(overflow, (self.max_sessions,)))
+                self._db.execute(f"DELETE FROM sessions WHERE session_id IN ({overflow})", (self.max_sessions,))
+            self._db.commit()
+        return removed
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions as JSON strings in Redis, shared by every worker on every node.
+
+    Each key carries a native TTL, so Redis expires idle sessions by itself. A
+    sorted set scored by last activity is the index for explicit expiry and for
+    the max_sessions cap.
+
+    Works with any client exposing redis-py semantics for get/set/delete/scan_iter,
+    zadd/zrem/zcard/zrange/zrangebyscore and WATCH/MULTI pipelines, including
+    FakeRedis below.
+    """
+
+    def __init__(self, client, prefix: str = "roameo:session:",
+                 ttl_seconds=DEFAULT_SESSION_TTL_SECONDS, max_sessions=DEFAULT_MAX_SESSIONS):
+        super().__init__(ttl_seconds, max_sessions)
+        self.client = client
+        self.prefix = prefix
+        self.index_key = prefix.rstrip(":") + "s:by_activity"
+        self._watch_errors = (WatchError,)
+        try:
+            from redis.exceptions import WatchError as RedisWatchError
+            self._watch_errors += (RedisWatchError,)
+        except ImportError:
+            pass
+
+    def get(self, session_id):
+        data = self.client.get(self.prefix + session_id)
+        if data is None:
+            return None
+        return StoredSession(data.decode() if isinstance(data, bytes) else data)
+
+    def save(self, session_id, session):
+        ttl = max(1, int(self.ttl_seconds)) if self.ttl_seconds is not None else None
+        key = self.prefix + session_id
+        # Optimistic transaction: if another worker writes the key between the read and
+        # EXEC, the merge is redone against its version
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    current = pipe.get(key)
+                    if isinstance(current, bytes):
+                        current = current.decode()
+                    merged, data = _merge_session(current, session)
+                    if merged is None:
+                        pipe.reset()
+                        return
+                    pipe.multi()
+                    pipe.set(key, merged, ex=ttl)
+                    pipe.zadd(self.index_key, {session_id: time.time()})
+                    pipe.execute()
+                    break
+                except self._watch_errors:
+                    continue
+        _mark_saved(session, data)
+        if self.max_sessions is not None:
+            overflow = self.client.zcard(self.index_key) - self.max_sessions
+            if overflow > 0:
+                for evicted in self.client.zrange(self.index_key, 0, overflow - 1):
+                    self.delete(evicted.decode() if isinstance(evicted, bytes) else evicted)
+
+    def delete(self, session_id):
+        self.client.zrem(self.index_key, session_id)
+        return bool(self.client.delete(self.prefix + session_id))
+
+    def items(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            if isinstance(key, bytes):
+                key = key.decode()
+            session = self.get(key[len(self.prefix):])
+            if session is not None:
+                yield key[len(self.prefix):], session
+
+    def expire_idle(self, max_idle_seconds=None):
+        max_idle_seconds = self.ttl_seconds if max_idle_seconds is None else max_idle_seconds
+        if max_idle_seconds is None:
+            return []
+        removed = []
+        for session_id in self.client.zrangebyscore(self.index_key, "-inf", time.time() - max_idle_seconds):
+            session_id = session_id.decode() if isinstance(session_id, bytes) else session_id
+            self.delete(session_id)
+            removed.append(session_id)
+        return removed
+
+
+class WatchError(Exception):
+    """A watched key changed before EXEC; FakeRedis's counterpart of redis.exceptions.WatchError"""
+
+
+class FakeRedis:
+    """
+    In-process stand-in for the subset of the redis-py client the session store uses.
+
+    Values are kept as bytes, like a real server returns them, so serialization
+    bugs show up locally too.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._zsets = {}
+        # key -> number of writes, so WATCH can tell whether a key changed
+        self._revisions = {}
+        self._lock = threading.RLock()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def get(self, key):
+        with self._lock:
+            expires_at = self._expires.get(key)
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return self._data.get(key)
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[key] = value
+            self._revisions[key] = self._revisions.get(key, 0) + 1
+            if ex is not None:
+                self._expires[key] = time.monotonic() + ex
+            else:
+                self._expires.pop(key, None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._expires.pop(key, None)
+                self._revisions[key] = self._revisions.get(key, 0) + 1
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            keys = list(self._data)
+        return (key for key in keys if fnmatch.fnmatchcase(key, match) and self.get(key) is not None)
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            self._zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._zsets.get(key, {})
+            return sum(zset.pop(member, None) is not None for member in members)
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._zsets.get(key, {}))
+
+    def zrange(self, key, start, end):
+        with self._lock:
+            members = sorted(self._zsets.get(key, {}).items(), key=lambda item: item[1])
+        end = len(members) if end == -1 else end + 1
+        return [member.encode() for member, _ in members[start:end]]
+
+    def zrangebyscore(self, key, minimum, maximum):
+        minimum = float(minimum)
+        maximum = float(maximum)
+        with self._lock:
+            members = sorted(self._zsets.get(key, {}).items(), key=lambda item: item[1])
+        return [member.encode() for member, score in members if minimum <= score <= maximum]
+
+
+class FakePipeline:
+    """
+    WATCH/MULTI/EXEC for FakeRedis, as redis-py pipelines behave: commands run at once
+    after watch() and are queued after multi(); execute() raises WatchError if a watched
+    key was written in between.
+    """
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self._watched = {}
+        self._queued = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def reset(self):
+        self._watched = {}
+        self._queued = None
+
+    def watch(self, *keys):
+        with self.client._lock:
+            for key in keys:
+                self._watched[key] = self.client._revisions.get(key, 0)
+
+    def multi(self):
+        self._queued = []
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+        if self._queued is None:
+            return command
+
+        def queue(*args, **kwargs):
+            self._queued.append((command, args, kwargs))
+        return queue
+
+    def execute(self):
+        try:
+            with self.client._lock:
+                for key, revision in self._watched.items():
+                    if self.client._revisions.get(key, 0) != revision:
+                        raise WatchError(f"Watched key {key} changed")
+                return [command(*args, **kwargs) for command, args, kwargs in self._queued or []]
+        finally:
+            self.reset()
+
+
+class AsyncSessionStore:
+    """
+    Awaitable view of a SessionStore for the ASGI app.
+
+    SQLite and Redis calls block, so they run in worker threads; the in-memory
+    store only touches a dict and is called directly on the event loop.
+    """
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+        self._offload = not isinstance(store, InMemorySessionStore)
+
+    async def _call(self, method, *args):
+        if self._offload:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call(self.store.get, session_id)
+
+    async def save(self, session_id: str, session: Dict[str, Any]) -> None:
+        await self._call(self.store.save, session_id, session)
+
+    async def delete(self, session_id: str) -> bool:
+        return await self._call(self.store.delete, session_id)
+
+    async def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return await self._call(lambda: list(self.store.items()))
+
+    async def expire_idle(self, max_idle_seconds: Optional[float] = None) -> List[str]:
+        return await self._call(self.store.expire_idle, max_idle_seconds)
+
+
+def start_expiry_thread(store: SessionStore, interval_seconds: float = 60) -> threading.Thread:
+    """Evict idle sessions in the background every interval_seconds"""
+    def sweep():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                store.expire_idle()
+            except Exception:
+                logger.exception("Session expiry sweep failed")
+
+    thread = threading.Thread(target=sweep, name="session-expiry", daemon=True)
+    thread.start()
+    return thread
+
+
+def create_session_store() -> SessionStore:
+    """
+    Build the store selected by SESSION_STORE in the .env file.
+
+    SESSION_STORE=memory  (default) per-process dict
+    SESSION_STORE=sqlite  file at SESSION_DB_PATH, shared by workers on one host
+    SESSION_STORE=redis   server at REDIS_URL (needs the optional redis package)
+    SESSION_STORE=fakeredis  in-process Redis stand-in for local testing
+
+    SESSION_TTL_SECONDS and SESSION_MAX_SESSIONS bound every backend.
+    """
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    limits = {
+        "ttl_seconds": float(os.getenv("SESSION_TTL_SECONDS", DEFAULT_SESSION_TTL_SECONDS)),
+        "max_sessions": int(os.getenv("SESSION_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+    }
+
+    if backend == "memory":
+        return InMemorySessionStore(**limits)
+    if backend == "sqlite":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.sqlite3")
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", default_path), **limits)
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_STORE=redis requires the redis package: pip install redis")
+        return RedisSessionStore(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")), **limits)
+    if backend == "fakeredis":
+        return RedisSessionStore(FakeRedis(), **limits)
+
+    raise ValueError(f"Unknown SESSION_STORE '{backend}'. Use memory, sqlite, redis or fakeredis.")
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+class _FlightCounters:
+    """Counters shared by the thread and asyncio variants (callers hold the lock)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self.errors = 0
+        self.max_in_flight = 0
+
+    def snapshot(self, name, in_flight) -> Dict[str, Any]:
+        return {
+            "name": name,
+            "calls": self.calls,
+            "shared": self.shared,
+            "errors": self.errors,
+            "in_flight": in_flight,
+            "max_in_flight": self.max_in_flight,
+            "shared_rate": round(self.shared / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+
+    The first caller for a key runs the function; callers that arrive with the same
+    key while it is still running wait for it and receive the same result (or the
+    same exception). Nothing is remembered once the call finishes; caching is left
+    to the caches.
+    """
+
+    def __init__(self, name: str = "flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        # key -> Future of the call in flight
+        self._calls = {}
+        self._counters = _FlightCounters()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs), or join the identical call already running under key.
+
+        Args:
+            key: Identity of the call; equal keys must mean interchangeable results
+            fn: Function to run if no call with this key is in flight
+        """
+        with self._lock:
+            self._counters.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self._counters.shared += 1
+                leader = False
+            else:
+                future = Future()
+                self._calls[key] = future
+                self._counters.max_in_flight = max(self._counters.max_in_flight, len(self._calls))
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._counters.errors += 1
+                del self._calls[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._counters.snapshot(self.name, len(self._calls))
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop.
+
+    The shared call runs as its own task and every caller awaits it through
+    asyncio.shield, so a caller that is cancelled (e.g. its client disconnected)
+    never cancels the work the other callers are waiting on.
+    """
+
+    def __init__(self, name: str = "flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        # key -> Task of the call in flight
+        self._calls = {}
+        self._counters = _FlightCounters()
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await fn(*args, **kwargs), or join the identical call already running under key"""
+        with self._lock:
+            self._counters.calls += 1
+            task = self._calls.get(key)
+            if task is not None:
+                self._counters.shared += 1
+            else:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._calls[key] = task
+                self._counters.max_in_flight = max(self._counters.max_in_flight, len(self._calls))
+                task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._counters.snapshot(self.name, len(self._calls))
+
+    def _finish(self, key, task):
+        with self._lock:
+            if self._calls.get(key) is task:
+                del self._calls[key]
+            if task.cancelled() or task.exception() is not None:
+                self._counters.errors += 1
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# The backend is a flat set of modules imported by name, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the shared caches out of the working tree; set before any module reads its config
+_scratch = tempfile.mkdtemp(prefix="roameo-tests-")
+os.environ.setdefault("GEOCODE_CACHE_PATH", os.path.join(_scratch, "geocode_cache.sqlite3"))
+os.environ.setdefault("GEOCODE_XYZ_API_KEY", "test-key")
+os.environ.setdefault("GROQ_API_KEY", "test-key")
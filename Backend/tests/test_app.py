@@ -0,0 +1,267 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app as travel_app
+from agentPool import AgentPool, AgentPoolExhausted
+from geocodeTypes import GeocodeResult
+from routeHelpers import BOOKING_PLAN_SECTIONS, BOOKING_QUERIES
+from sessionStore import SQLiteSessionStore
+from travelTimes import TravelTimeMatrix
+
+
+@pytest.fixture
+def client():
+    travel_app.app.config["TESTING"] = True
+    return travel_app.app.test_client()
+
+
+@pytest.fixture
+def session_id(client):
+    return client.post("/sessions").get_json()["session_id"]
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """No provider calls: every place is unknown"""
+    monkeypatch.setattr(travel_app, "geocode", lambda name: GeocodeResult.not_found(name, "offline"))
+    monkeypatch.setattr(travel_app, "geocode_many",
+                        lambda names: [GeocodeResult.not_found(name, "offline") for name in names])
+
+
+@pytest.fixture
+def exhausted_pool(monkeypatch):
+    def lease(timeout=None):
+        raise AgentPoolExhausted("No live_itinerary agent available after 0s")
+    monkeypatch.setattr(travel_app.live_itinerary_agents, "lease", lease)
+
+
+@pytest.mark.parametrize("path, body", [
+    ("adjust-itinerary", {"mood_state": "energetic", "current_itinerary": [{"time": "10:00", "name": "Museum"}]}),
+    ("find-alternatives", {"activity_type": "museum", "location": "Pune"}),
+    ("emergency-reroute", {"current_situation": "Road closed", "destination": "Pune"}),
+])
+def test_exhausted_live_pool_answers_503(client, session_id, offline, exhausted_pool, path, body):
+    response = client.post(f"/sessions/{session_id}/{path}", json=body)
+
+    assert response.status_code == 503
+    assert response.get_json()["error"] == "Service busy, please retry shortly"
+
+
+@pytest.mark.parametrize("query", ["cursor=abc", "limit=ten", "cursor=1.5"])
+def test_bad_paging_parameters_answer_400(client, session_id, query):
+    response = client.get(f"/sessions/{session_id}?{query}")
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "cursor and limit must be integers"
+
+
+def test_chat_history_pages_through_the_session(client, session_id):
+    session = travel_app.get_session(session_id)
+    for number in range(3):
+        travel_app.add_to_chat_history(session, "user", f"message {number}")
+    travel_app.save_session(session_id, session)
+
+    first = client.get(f"/sessions/{session_id}?limit=2").get_json()
+    second = client.get(f"/sessions/{session_id}?limit=2&cursor={first['next_cursor']}").get_json()
+
+    assert [entry["message"] for entry in first["chat_history"]] == ["message 0", "message 1"]
+    assert first["has_more"]
+    assert [entry["message"] for entry in second["chat_history"]] == ["message 2"]
+    assert not second["has_more"]
+    assert second["total_messages"] == 3
+
+
+class ScriptedAgent:
+    """phi agent stand-in whose streamed run calls `during` (if given) and then yields the given chunks"""
+
+    def __init__(self, chunks, during=None):
+        self.chunks = chunks
+        self.during = during
+
+    def run(self, query, stream=False):
+        if self.during is not None:
+            self.during()
+        return iter(self.chunks)
+
+
+def scripted_pool(monkeypatch, chunks, during=None):
+    pool = AgentPool(lambda: SimpleNamespace(agent=ScriptedAgent(chunks, during), context={}), 1, "booking")
+    monkeypatch.setattr(travel_app, "booking_agents", pool)
+    return pool
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def history_messages(session_id):
+    return [entry["message"] for entry in travel_app.get_session(session_id)["chat_history"].page()["entries"]]
+
+
+STREAM_PATH = "/sessions/{}/find-transportation-options?stream=1"
+
+
+def test_stream_releases_the_agent_before_the_client_reads(client, session_id, monkeypatch):
+    pool = scripted_pool(monkeypatch, ["Take the ", "Deccan Queen.\n"])
+
+    response = client.post(STREAM_PATH.format(session_id), json={"itinerary": "Mumbai to Pune"}, buffered=False)
+
+    # Nothing has been read from the response yet
+    wait_until(lambda: "Transportation options" in history_messages(session_id))
+    assert pool.stats()["idle"] == 1
+    body = response.get_data(as_text=True)
+    assert 'event: done\ndata: {"transportation_options": "Take the Deccan Queen.\\n"}' in body
+
+
+def test_stream_keeps_changes_saved_while_it_ran(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(travel_app, "session_store", SQLiteSessionStore(str(tmp_path / "sessions.sqlite3")))
+    session_id = client.post("/sessions").get_json()["session_id"]
+    # Another request on the session completes while the agent is running
+    scripted_pool(monkeypatch, ["Take the Deccan Queen."], lambda: travel_app.app.test_client().post(
+        f"/sessions/{session_id}/select-accommodation", json={"selected_hotel": "Hotel Shreyas"}))
+
+    client.post(STREAM_PATH.format(session_id), json={"itinerary": "Mumbai to Pune"}).get_data()
+
+    session = travel_app.get_session(session_id)
+    assert session["travel_context"]["selected_hotel"] == "Hotel Shreyas"
+    assert session["booking_context"]["itinerary"] == "Mumbai to Pune"
+    assert history_messages(session_id) == [
+        "Request for transportation options",
+        "Selected accommodation: Hotel Shreyas",
+        "Transportation options",
+    ]
+
+
+def test_streams_beyond_the_cap_answer_503(client, session_id, monkeypatch):
+    scripted_pool(monkeypatch, ["unused"])
+    monkeypatch.setattr(travel_app, "stream_slots", threading.BoundedSemaphore(1))
+    travel_app.stream_slots.acquire()
+
+    response = client.post(STREAM_PATH.format(session_id), json={"itinerary": "Mumbai to Pune"})
+
+    assert response.status_code == 503
+
+
+ITINERARY = "Day 1: Mumbai to Pune"
+
+
+class BookingAgents:
+    """Booking agent stand-ins answering each section query after `delay` seconds, recording overlap and prompts"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.answers = {BOOKING_QUERIES[kind][1](ITINERARY): f"{kind} findings" for kind in BOOKING_PLAN_SECTIONS}
+        self.queries = []
+        self.running = self.most_running = 0
+        self.lock = threading.Lock()
+
+    def run(self, query, stream=False):
+        with self.lock:
+            self.queries.append(query)
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return SimpleNamespace(content=self.answers.get(query, "Comprehensive plan"))
+
+
+def booking_agents(monkeypatch, delay):
+    agents = BookingAgents(delay)
+    pool = AgentPool(lambda: SimpleNamespace(agent=agents, context={}), len(BOOKING_PLAN_SECTIONS), "booking")
+    monkeypatch.setattr(travel_app, "booking_agents", pool)
+    return agents
+
+
+def test_booking_plan_researches_sections_concurrently_and_merges_them(client, session_id, monkeypatch):
+    agents = booking_agents(monkeypatch, delay=0.1)
+
+    body = client.post(f"/sessions/{session_id}/create-booking-plan", json={"itinerary": ITINERARY}).get_json()
+
+    assert agents.most_running == len(BOOKING_PLAN_SECTIONS)
+    # The merge runs last, on a prompt carrying every section's findings
+    merge_query = agents.queries[-1]
+    assert merge_query not in agents.answers
+    for kind in BOOKING_PLAN_SECTIONS:
+        assert f"{kind} findings" in merge_query
+        assert body[BOOKING_QUERIES[kind][3]] == f"{kind} findings"
+    assert body["comprehensive_plan"] == "Comprehensive plan"
+
+
+def test_slow_booking_plan_research_answers_503(client, session_id, monkeypatch):
+    agents = booking_agents(monkeypatch, delay=0.3)
+    monkeypatch.setattr(travel_app, "BOOKING_PLAN_TIMEOUT", 0.05)
+
+    response = client.post(f"/sessions/{session_id}/create-booking-plan", json={"itinerary": ITINERARY})
+
+    assert response.status_code == 503
+    assert "did not finish within" in response.get_json()["details"]
+    # No merge is attempted
+    wait_until(lambda: agents.running == 0)
+    assert len(agents.queries) == len(BOOKING_PLAN_SECTIONS)
+
+
+def test_adjust_with_whole_day_and_current_base_version_is_accepted(client, session_id, offline):
+    day = [{"time": "10:00", "name": "Museum"}, {"time": "23:00", "name": "Night walk"}]
+    client.patch(f"/sessions/{session_id}/itinerary", json={"changes": [{"op": "add", "activity": day[0]}]})
+
+    response = client.post(f"/sessions/{session_id}/adjust-itinerary", json={
+        "mood_state": "tired", "current_time": "09:00", "current_itinerary": day, "base_version": 1,
+    })
+
+    assert response.status_code == 200
+    stale = client.post(f"/sessions/{session_id}/adjust-itinerary", json={
+        "mood_state": "tired", "current_time": "09:00", "current_itinerary": day, "base_version": 1,
+    })
+    assert stale.status_code == 409
+
+
+@pytest.fixture
+def geocoder_calls(monkeypatch):
+    """Places sent to the provider; each one is found a little further east"""
+    calls = []
+
+    def geocode_many(names):
+        calls.extend(names)
+        return [GeocodeResult.found(name, 18.5, 73.8 + 0.01 * len(calls), name) for name in names]
+    monkeypatch.setattr(travel_app, "geocode_many", geocode_many)
+    return calls
+
+
+def matrix_places(session_id):
+    return TravelTimeMatrix.from_state(travel_app.get_session(session_id)["travel_times"]).names
+
+
+def test_local_adjust_does_not_wait_on_geocoding(client, session_id, geocoder_calls):
+    travel_app.geocode_cache.set("Cached Fort", GeocodeResult.found("Cached Fort", 18.51, 73.85, "Cached Fort"))
+    travel_app.geocode_cache.set("Cached Palace", GeocodeResult.found("Cached Palace", 18.55, 73.90, "Cached Palace"))
+    day = [{"time": "10:00", "name": "Fort", "location": "Cached Fort"},
+           {"time": "10:30", "name": "Museum", "location": "Uncached Museum"},
+           {"time": "12:00", "name": "Palace", "location": "Cached Palace"}]
+
+    response = client.post(f"/sessions/{session_id}/adjust-itinerary", json={
+        "mood_state": "relaxed", "current_time": "09:00", "current_itinerary": day,
+    })
+
+    assert response.status_code == 200
+    assert geocoder_calls == []
+    schedule = {activity["name"]: activity for activity in response.get_json()["result"]["updated_schedule"]}
+    assert "travel_minutes" not in schedule["Museum"]
+    assert matrix_places(session_id) == ["Cached Fort", "Cached Palace"]
+
+
+def test_patch_geocodes_new_places_into_the_matrix(client, session_id, geocoder_calls):
+    changes = [{"op": "add", "activity": {"time": "10:00", "name": "Fort", "location": "Patched Fort"}},
+               {"op": "add", "activity": {"time": "12:00", "name": "Palace", "location": "Patched Palace"}}]
+
+    response = client.patch(f"/sessions/{session_id}/itinerary", json={"changes": changes})
+
+    assert response.status_code == 200
+    assert geocoder_calls == ["Patched Fort", "Patched Palace"]
+    assert matrix_places(session_id) == ["Patched Fort", "Patched Palace"]
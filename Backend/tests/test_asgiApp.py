@@ -0,0 +1,107 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import asgiApp
+from agentPool import AgentPool
+
+
+class ScriptedAgent:
+    """
+    phi agent stand-in answering with the given chunks.
+
+    Each run first blocks for `delay` seconds, like phi running a search tool synchronously.
+    """
+
+    def __init__(self, chunks, delay=0):
+        self.chunks = chunks
+        self.delay = delay
+
+    def run(self, query, stream=False):
+        time.sleep(self.delay)
+        if stream:
+            return iter(self.chunks)
+        return SimpleNamespace(content="".join(self.chunks))
+
+
+@pytest.fixture
+def client():
+    with TestClient(asgiApp.app) as client:
+        yield client
+
+
+@pytest.fixture
+def session_id(client):
+    return client.post("/sessions").json()["session_id"]
+
+
+def scripted_pool(monkeypatch, chunks, size=1, delay=0):
+    pool = AgentPool(lambda: SimpleNamespace(agent=ScriptedAgent(chunks, delay), context={}), size, "booking")
+    monkeypatch.setattr(asgiApp, "booking_agents", pool)
+    return pool
+
+
+STREAM_PATH = "/sessions/{}/find-transportation-options?stream=1"
+
+
+def test_stream_records_the_reply_and_releases_the_agent(client, session_id, monkeypatch):
+    pool = scripted_pool(monkeypatch, ["Take the ", "Deccan Queen."])
+
+    body = client.post(STREAM_PATH.format(session_id), json={"itinerary": "Mumbai to Pune"}).text
+
+    assert 'event: done\ndata: {"transportation_options": "Take the Deccan Queen."}' in body
+    assert pool.stats()["idle"] == 1
+    entries = client.get(f"/sessions/{session_id}").json()["chat_history"]
+    assert [entry["message"] for entry in entries] == ["Request for transportation options", "Transportation options"]
+
+
+def test_streams_beyond_the_cap_answer_503(client, session_id, monkeypatch):
+    scripted_pool(monkeypatch, ["unused"])
+    monkeypatch.setattr(asgiApp, "STREAM_MAX_CONCURRENT", 0)
+
+    response = client.post(STREAM_PATH.format(session_id), json={"itinerary": "Mumbai to Pune"})
+
+    assert response.status_code == 503
+
+
+TOOL_SECONDS = 0.3
+
+
+def test_blocking_tools_do_not_stall_other_requests(client, session_id, monkeypatch):
+    scripted_pool(monkeypatch, ["Take the Deccan Queen."], size=4, delay=TOOL_SECONDS)
+
+    async def requests():
+        transport = httpx.ASGITransport(app=asgiApp.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            started = time.perf_counter()
+            # Distinct itineraries, so agent_flight does not join the runs
+            responses = await asyncio.gather(*(
+                http.post(f"/sessions/{session_id}/find-transportation-options", json={"itinerary": f"Route {number}"})
+                for number in range(4)
+            ))
+            return responses, time.perf_counter() - started
+
+    responses, elapsed = asyncio.run(requests())
+
+    assert [response.status_code for response in responses] == [200] * 4
+    # Run one after another on the event loop, the four would take 4 * TOOL_SECONDS
+    assert elapsed < 2 * TOOL_SECONDS
+
+
+def test_slow_booking_plan_research_answers_503_and_keeps_the_agents(client, session_id, monkeypatch):
+    pool = scripted_pool(monkeypatch, ["Findings"], size=3, delay=0.3)
+    monkeypatch.setattr(asgiApp, "BOOKING_PLAN_TIMEOUT", 0.05)
+
+    response = client.post(f"/sessions/{session_id}/create-booking-plan", json={"itinerary": "Mumbai to Pune"})
+
+    assert response.status_code == 503
+    # The sections keep their agents until their runs end
+    assert pool.stats()["idle"] == 0
+    deadline = time.monotonic() + 5
+    while pool.stats()["idle"] < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
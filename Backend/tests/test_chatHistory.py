@@ -0,0 +1,61 @@
+import json
+
+from chatHistory import ChatHistory
+
+
+def filled(count, max_entries=200):
+    history = ChatHistory(max_entries=max_entries)
+    for number in range(count):
+        history.append("user", f"message {number}")
+    return history
+
+
+def messages(page):
+    return [entry["message"] for entry in page["entries"]]
+
+
+def test_pages_follow_the_cursor():
+    history = filled(5)
+
+    first = history.page(limit=2)
+    second = history.page(first["next_cursor"], limit=2)
+    last = history.page(second["next_cursor"], limit=2)
+
+    assert messages(first) == ["message 0", "message 1"] and first["has_more"]
+    assert messages(second) == ["message 2", "message 3"] and second["has_more"]
+    assert messages(last) == ["message 4"] and not last["has_more"]
+
+
+def test_polling_past_the_end_keeps_the_cursor():
+    history = filled(3)
+
+    page = history.page(2)
+
+    assert page == {"entries": [], "next_cursor": 2, "has_more": False}
+    history.append("system", "new reply")
+    assert messages(history.page(page["next_cursor"])) == ["new reply"]
+
+
+def test_cursor_older_than_the_buffer_starts_at_the_oldest_retained_entry():
+    history = filled(10, max_entries=4)
+
+    page = history.page(1)
+
+    assert messages(page) == ["message 6", "message 7", "message 8", "message 9"]
+    assert history.total == 10
+
+
+def test_state_round_trip_keeps_ids_and_compressed_bodies():
+    history = ChatHistory(max_entries=3, compress_min_bytes=16)
+    history.append("user", "short", "ok")
+    history.append("system", "long", {"places": ["Shaniwar Wada"] * 20})
+
+    restored = ChatHistory.from_state(json.loads(json.dumps(history.to_state())), max_entries=3)
+
+    def without_timestamps(page):
+        # Stored timestamps are rounded to milliseconds
+        return [{key: value for key, value in entry.items() if key != "timestamp"} for entry in page["entries"]]
+
+    assert without_timestamps(restored.page()) == without_timestamps(history.page())
+    assert restored.page()["entries"][1]["response"] == {"places": ["Shaniwar Wada"] * 20}
+    assert restored.append("user", "next").id == 2
@@ -0,0 +1,121 @@
+import re
+
+import pytest
+
+from benchmarks import RECORDED_ADJUSTMENT, RECORDED_HOTELS, RECORDED_PLACES
+from extraction import extract_attractions, extract_hotels, parse_adjustment_markdown, parse_schedule_line
+
+# The findall patterns suggest_places and suggest_accommodations used before extraction
+LEGACY_ATTRACTION_PATTERN = r'\d+\.\s+\*\*([^*:]+)(?:\*\*|:)'
+LEGACY_HOTEL_PATTERN = r'\d+\.\s+\*\*([^:]+)(?:\*\*|:)'
+
+
+def legacy_parse_adjustment(content):
+    """The per-line scan LiveItineraryAgent used before parse_adjustment_markdown, kept as the reference"""
+    result = {"activities_to_cancel": [], "alternative_activities": [], "updated_schedule": [],
+              "estimated_cost_impact": "", "reasoning": content, "summary": ""}
+    current_section = None
+    current_alternative = {}
+    for line in content.split('\n'):
+        line_stripped = line.strip()
+        if 'Activities to Cancel' in line:
+            current_section = 'cancel'
+        elif 'Recommended Alternatives' in line:
+            current_section = 'alternatives'
+        elif 'Updated Schedule' in line:
+            current_section = 'schedule'
+        elif 'Cost Impact' in line:
+            current_section = 'cost'
+        elif line_stripped.startswith('•') or line_stripped.startswith('-'):
+            text = line_stripped.lstrip('•-').strip()
+            if current_section == 'cancel':
+                result["activities_to_cancel"].append(text.split(':')[0].strip() if ':' in text else text)
+            elif current_section == 'alternatives':
+                if not text.startswith(('Recommended Venue', 'Booking Link', 'Availability')):
+                    if ':' in text:
+                        if current_alternative and current_alternative.get('name'):
+                            result["alternative_activities"].append(current_alternative)
+                        parts = text.split(':', 1)
+                        current_alternative = {"name": parts[0].strip(), "location": "To be determined",
+                                               "reason": parts[1].strip(), "estimated_time": "Flexible"}
+                elif 'Recommended Venue:' in text and current_alternative:
+                    current_alternative['location'] = text.split('Recommended Venue:', 1)[1].strip()
+            elif current_section == 'schedule' and ':' in text:
+                parts = text.split(':', 1)
+                result["updated_schedule"].append({"time": parts[0].strip(), "name": parts[1].strip(),
+                                                   "location": "See details", "status": "upcoming"})
+        elif current_section == 'cost' and line_stripped:
+            result["estimated_cost_impact"] += line_stripped + " "
+    if current_alternative and current_alternative.get('name'):
+        result["alternative_activities"].append(current_alternative)
+    return result
+
+
+@pytest.mark.parametrize("text, extract, pattern", [
+    (RECORDED_PLACES, extract_attractions, LEGACY_ATTRACTION_PATTERN),
+    (RECORDED_HOTELS, extract_hotels, LEGACY_HOTEL_PATTERN),
+    (RECORDED_PLACES * 10, extract_attractions, LEGACY_ATTRACTION_PATTERN),
+])
+def test_numbered_items_match_legacy_findall(text, extract, pattern):
+    assert [item.name for item in extract(text)] == [name.strip() for name in re.findall(pattern, text)]
+
+
+def test_items_keep_the_printed_number_and_span():
+    items = extract_attractions(RECORDED_PLACES)
+
+    assert [item.number for item in items] == [1, 2, 3, 4, 5]
+    assert items[2].name == "Sinhagad Fort"
+    # The description runs to the blank line, coordinates line included
+    assert RECORDED_PLACES[items[0].start:items[0].end].endswith("(Shaniwar Wada, Pune)")
+
+
+def test_adjustment_matches_legacy_apart_from_time_ranges():
+    parsed = parse_adjustment_markdown(RECORDED_ADJUSTMENT)
+    legacy = legacy_parse_adjustment(RECORDED_ADJUSTMENT)
+
+    for key in ("activities_to_cancel", "alternative_activities", "estimated_cost_impact", "reasoning", "summary"):
+        assert parsed[key] == legacy[key]
+    # The line scan split "15:00 - 16:30: Rest at the hotel" at its first colon
+    assert legacy["updated_schedule"][0]["time"] == "15"
+    assert [(entry["time"], entry["name"]) for entry in parsed["updated_schedule"]] == [
+        ("15:00 - 16:30", "Rest at the hotel"),
+        ("17:00 - 18:30", "Spa Session at Heavenly Spa"),
+        ("8:00 PM", "Quiet Dinner at Malaka Spice"),
+    ]
+
+
+def test_adjustment_sections():
+    parsed = parse_adjustment_markdown(RECORDED_ADJUSTMENT)
+
+    assert parsed["activities_to_cancel"] == ["Sinhagad Fort Trek", "Evening Shopping at Laxmi Road"]
+    assert [(alternative["name"], alternative["location"]) for alternative in parsed["alternative_activities"]] == [
+        ("Spa Session at Heavenly Spa", "Heavenly Spa, Koregaon Park"),
+        ("Quiet Dinner at Malaka Spice", "Malaka Spice, North Main Road"),
+    ]
+    assert parsed["estimated_cost_impact"] == \
+        "The spa adds about ₹2,500 per person. Cancelling the trek saves ₹600 in transport. "
+
+
+def test_schedule_without_times_matches_legacy():
+    content = RECORDED_ADJUSTMENT.replace("15:00 - 16:30", "Afternoon").replace("17:00 - 18:30", "Evening")
+    content = content.replace("8:00 PM", "Night")
+
+    assert parse_adjustment_markdown(content) == legacy_parse_adjustment(content)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("20:00-21:30: Dinner", ("20:00-21:30", "Dinner")),
+    ("9 am to 11 am: Museum", ("9 am to 11 am", "Museum")),
+    ("Evening:Walk", ("Evening", "Walk")),
+])
+def test_schedule_line_without_space_after_colon(text, expected):
+    entry = parse_schedule_line(text)
+
+    assert (entry.time, entry.name) == expected
+
+
+def test_reply_without_headings_is_empty():
+    parsed = parse_adjustment_markdown("• 10:00: Museum\nNo sections here.")
+
+    assert parsed["updated_schedule"] == [] and parsed["activities_to_cancel"] == []
+    assert parsed["estimated_cost_impact"] == ""
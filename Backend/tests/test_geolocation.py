@@ -0,0 +1,269 @@
+import asyncio
+import time
+
+import pytest
+
+import asyncGeolocation
+import geolocation
+from geocodeTypes import GeocodeResult, GeocodeStatus
+from rateLimiter import CircuitBreaker, TokenBucket
+
+RESET_SECONDS = 0.05
+
+
+class FakeLimiter:
+    """Rate limiter that records how often it was asked for a token"""
+
+    def __init__(self, grant=True):
+        self.grant = grant
+        self.calls = 0
+
+    def acquire(self, timeout=None):
+        self.calls += 1
+        return self.grant
+
+    async def acquire_async(self, timeout=None):
+        self.calls += 1
+        return self.grant
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+FOUND = {"latt": "18.51950", "longt": "73.85530", "standard": {"addresst": "Shaniwar Wada"}}
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET_SECONDS)
+    # asyncGeolocation imported the names, _interpret_geocode_data reads the geolocation one
+    monkeypatch.setattr(geolocation, "geocode_circuit_breaker", breaker)
+    monkeypatch.setattr(asyncGeolocation, "geocode_circuit_breaker", breaker)
+    return breaker
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = FakeLimiter()
+    monkeypatch.setattr(geolocation, "geocode_rate_limiter", limiter)
+    monkeypatch.setattr(asyncGeolocation, "geocode_rate_limiter", limiter)
+    return limiter
+
+
+def serve(monkeypatch, data):
+    """Answer every provider request with data"""
+    monkeypatch.setattr(geolocation, "http_get", lambda url: FakeResponse(data))
+
+    async def http_get_async(url):
+        return FakeResponse(data)
+    monkeypatch.setattr(asyncGeolocation, "http_get_async", http_get_async)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_admits_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=RESET_SECONDS)
+    breaker.record_failure()
+    time.sleep(RESET_SECONDS)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_trial_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=RESET_SECONDS)
+    breaker.record_failure()
+    time.sleep(RESET_SECONDS)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(RESET_SECONDS)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_release_frees_the_trial_without_closing():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=RESET_SECONDS)
+    breaker.record_failure()
+    time.sleep(RESET_SECONDS)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_open_breaker_spends_no_tokens(breaker, limiter, monkeypatch):
+    serve(monkeypatch, FOUND)
+    open_breaker(breaker)
+
+    result = geolocation._fetch_location_coordinates("Shaniwar Wada")
+
+    assert result.status is GeocodeStatus.ERROR
+    assert "temporarily unavailable" in result.message
+    assert limiter.calls == 0
+
+
+def test_busy_limiter_releases_the_trial(breaker, limiter, monkeypatch):
+    serve(monkeypatch, FOUND)
+    open_breaker(breaker)
+    time.sleep(RESET_SECONDS)
+    limiter.grant = False
+
+    result = geolocation._fetch_location_coordinates("Shaniwar Wada")
+
+    assert "busy" in result.message
+    # The next caller still gets the trial
+    assert breaker.allow()
+
+
+def test_unexpected_payload_in_trial_reopens_then_recovers(breaker, limiter, monkeypatch):
+    # A numeric "error" makes the payload check raise TypeError before it records anything
+    serve(monkeypatch, {"error": 7})
+    open_breaker(breaker)
+    time.sleep(RESET_SECONDS)
+
+    result = geolocation._fetch_location_coordinates("Shaniwar Wada")
+
+    assert result.status is GeocodeStatus.ERROR
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(RESET_SECONDS)
+    serve(monkeypatch, FOUND)
+    result = geolocation._fetch_location_coordinates("Shaniwar Wada")
+    assert result.ok
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_async_open_breaker_spends_no_tokens(breaker, limiter, monkeypatch):
+    serve(monkeypatch, FOUND)
+    open_breaker(breaker)
+
+    result = asyncio.run(asyncGeolocation._afetch_location_coordinates("Shaniwar Wada"))
+
+    assert "temporarily unavailable" in result.message
+    assert limiter.calls == 0
+
+
+def test_async_unexpected_payload_in_trial_reopens_then_recovers(breaker, limiter, monkeypatch):
+    serve(monkeypatch, {"error": 7})
+    open_breaker(breaker)
+    time.sleep(RESET_SECONDS)
+
+    asyncio.run(asyncGeolocation._afetch_location_coordinates("Shaniwar Wada"))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(RESET_SECONDS)
+    serve(monkeypatch, FOUND)
+    result = asyncio.run(asyncGeolocation._afetch_location_coordinates("Shaniwar Wada"))
+    assert result.ok
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_sustained_007_replies_open_the_breaker(breaker, limiter, monkeypatch):
+    serve(monkeypatch, {"error": {"code": "007", "description": "Throttled"}})
+    monkeypatch.setattr(geolocation.time, "sleep", lambda seconds: None)
+
+    for _ in range(breaker.failure_threshold):
+        result = geolocation._fetch_location_coordinates("Shaniwar Wada")
+        assert result.status is GeocodeStatus.NOT_FOUND
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["opened"] == 1
+    assert "temporarily unavailable" in geolocation._fetch_location_coordinates("Shaniwar Wada").message
+
+
+def test_async_sustained_007_replies_open_the_breaker(breaker, limiter, monkeypatch):
+    serve(monkeypatch, {"error": {"code": "007", "description": "Throttled"}})
+
+    async def no_sleep(seconds):
+        pass
+    monkeypatch.setattr(asyncGeolocation.asyncio, "sleep", no_sleep)
+
+    for _ in range(breaker.failure_threshold):
+        asyncio.run(asyncGeolocation._afetch_location_coordinates("Shaniwar Wada"))
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_bucket_grants_the_burst_then_rejects_past_timeout():
+    bucket = TokenBucket(rate_per_second=1, capacity=2)
+
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=0)
+    # The next token is about a second away
+    assert not bucket.acquire(timeout=0.1)
+
+    stats = bucket.stats()
+    assert (stats["granted"], stats["rejected"]) == (2, 1)
+    assert stats["waited_seconds"] == 0
+
+
+def test_bucket_waits_for_a_refill():
+    bucket = TokenBucket(rate_per_second=20)
+    bucket.acquire()
+
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1)
+
+    assert time.monotonic() - started >= 0.04
+    assert 0.04 <= bucket.stats()["waited_seconds"] <= 0.05
+
+
+def test_bucket_queues_concurrent_callers():
+    bucket = TokenBucket(rate_per_second=20)
+    bucket.acquire()
+
+    # Each reservation lines up behind the previous one instead of sharing a refill
+    waits = [bucket._take(None) for _ in range(3)]
+
+    assert waits == pytest.approx([0.05, 0.10, 0.15], abs=0.01)
+
+
+def test_bucket_without_rate_never_waits():
+    bucket = TokenBucket(rate_per_second=0)
+
+    assert all(bucket.acquire(timeout=0) for _ in range(100))
+
+
+def test_async_bucket_rejects_past_timeout():
+    bucket = TokenBucket(rate_per_second=1)
+
+    assert asyncio.run(bucket.acquire_async(timeout=0))
+    assert not asyncio.run(bucket.acquire_async(timeout=0.1))
+
+
+def test_legacy_string_keeps_the_provider_spelling(breaker, limiter, monkeypatch):
+    serve(monkeypatch, FOUND)
+
+    result = geolocation._fetch_location_coordinates("Shaniwar Wada")
+    cached = GeocodeResult.from_json(result.to_json())
+
+    expected = "{'address': 'Shaniwar Wada', 'latitude': '18.51950', 'longitude': '73.85530'}"
+    assert result.to_legacy_string() == cached.to_legacy_string() == expected
+    assert result.to_dict()["latitude"] == 18.5195
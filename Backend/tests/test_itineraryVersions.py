@@ -0,0 +1,127 @@
+import pytest
+
+from itineraryVersions import (InvalidItineraryPatch, ItineraryVersionConflict, VersionedItinerary,
+                               diff_activities)
+
+DAY = [
+    {"time": "09:00", "name": "Shaniwar Wada", "location": "Kasba Peth"},
+    {"time": "12:00", "name": "Lunch", "location": "FC Road"},
+    {"time": "15:00", "name": "Aga Khan Palace", "location": "Kalyani Nagar"},
+]
+
+
+@pytest.fixture
+def itinerary():
+    itinerary = VersionedItinerary()
+    itinerary.replace(DAY)
+    return itinerary
+
+
+def names(activities):
+    return [activity["name"] for activity in activities]
+
+
+def test_diff_reports_added_removed_and_changed_fields():
+    old = [{"id": "a1", "name": "Fort", "time": "09:00"}, {"id": "a2", "name": "Lunch", "note": "veg"}]
+    new = [{"id": "a2", "name": "Lunch"}, {"id": "a3", "name": "Palace"}]
+
+    assert diff_activities(old, new) == {
+        "added": [{"id": "a3", "name": "Palace"}],
+        "removed": ["a1"],
+        "changed": [{"id": "a2", "note": None}],
+        "order": ["a2", "a3"],
+    }
+
+
+def test_replace_keeps_ids_of_activities_with_the_same_name(itinerary):
+    diff = itinerary.replace([{**DAY[0], "time": "10:00"}, DAY[2]])
+
+    assert [activity["id"] for activity in itinerary.activities] == ["a1", "a3"]
+    assert diff["changed"] == [{"id": "a1", "time": "10:00"}]
+    assert diff["removed"] == ["a2"]
+    assert (diff["from_version"], diff["to_version"]) == (1, 2)
+
+
+def test_unchanged_replace_keeps_the_version(itinerary):
+    diff = itinerary.replace(DAY)
+
+    assert itinerary.version == 1
+    assert diff["to_version"] == 1
+
+
+def test_patch_updates_adds_and_removes(itinerary):
+    diff = itinerary.apply_patch([
+        {"id": "a1", "status": "completed"},
+        {"op": "remove", "id": "a2"},
+        {"op": "add", "activity": {"time": "18:00", "name": "Dinner"}},
+    ], base_version=1)
+
+    assert names(itinerary.activities) == ["Shaniwar Wada", "Aga Khan Palace", "Dinner"]
+    assert diff["changed"] == [{"id": "a1", "status": "completed"}]
+    assert diff["removed"] == ["a2"]
+    assert diff["added"][0]["id"] == "a4"
+
+
+def test_patch_against_an_old_version_conflicts(itinerary):
+    with pytest.raises(ItineraryVersionConflict):
+        itinerary.apply_patch([{"id": "a1", "status": "completed"}], base_version=0)
+    assert itinerary.version == 1
+
+
+@pytest.mark.parametrize("changes", [
+    [{"id": "a9", "status": "completed"}],
+    [{"op": "add", "activity": {"time": "18:00"}}],
+    [{"op": "rename", "id": "a1"}],
+    "not a list",
+])
+def test_malformed_patches_are_rejected(itinerary, changes):
+    with pytest.raises(InvalidItineraryPatch):
+        itinerary.apply_patch(changes)
+
+
+def test_non_integer_base_version_is_rejected(itinerary):
+    with pytest.raises(InvalidItineraryPatch):
+        itinerary.check_version("v1")
+
+
+def test_changes_since_returns_the_missing_diffs(itinerary):
+    itinerary.apply_patch([{"id": "a1", "status": "completed"}])
+    itinerary.apply_patch([{"id": "a2", "status": "completed"}])
+
+    assert [diff["to_version"] for diff in itinerary.changes_since(1)] == [2, 3]
+    assert itinerary.changes_since(3) == []
+    assert VersionedItinerary(history=[], version=5).changes_since(2) is None
+
+
+def test_merge_keeps_finished_activities_and_marks_cancellations(itinerary):
+    itinerary.apply_patch([{"id": "a1", "status": "done"}])
+
+    itinerary.merge_adjustment([{"time": "13:00", "name": "Spa"}, {"time": "12:00", "name": "Lunch"}],
+                               ["Aga Khan Palace"])
+
+    assert [(activity["name"], activity.get("status")) for activity in itinerary.activities] == [
+        ("Shaniwar Wada", "done"), ("Lunch", None), ("Spa", None), ("Aga Khan Palace", "cancelled"),
+    ]
+
+
+def test_merge_without_a_schedule_leaves_the_day_unchanged(itinerary):
+    diff = itinerary.merge_adjustment([], ["Lunch"])
+
+    assert names(itinerary.activities) == names(DAY)
+    assert itinerary.version == 1
+    assert diff["to_version"] == 1
+
+
+def test_midnight_sorts_before_later_times(itinerary):
+    itinerary.merge_adjustment([{"time": "evening", "name": "Night walk"}, {"time": "01:00", "name": "Late show"},
+                                {"time": "00:00", "name": "Night market"}])
+
+    assert names(itinerary.activities) == ["Night market", "Late show", "Night walk"]
+
+
+def test_state_round_trip(itinerary):
+    restored = VersionedItinerary.from_state(itinerary.to_state())
+
+    assert restored.snapshot() == itinerary.snapshot()
+    restored.apply_patch([{"op": "add", "activity": {"name": "Dinner"}}])
+    assert restored.activities[-1]["id"] == "a4"
@@ -0,0 +1,129 @@
+import pytest
+
+import localRescheduler
+from localRescheduler import classify_mood, reschedule_locally, shift_clock_text
+
+DAY = [
+    {"time": "10:00", "name": "Museum"},
+    {"time": "11:30", "name": "Fort"},
+    {"time": "12:00", "name": "Lunch at Vaishali"},
+    {"time": "14:00", "name": "Palace"},
+    {"time": "16:00", "name": "Garden"},
+]
+
+
+def times(result):
+    return {activity["name"]: (activity["time"], activity["status"]) for activity in result["updated_schedule"]}
+
+
+@pytest.mark.parametrize("mood, category", [
+    ("tired", "tired"),
+    ("Relaxed", "relaxed"),
+    ("hungry", "hungry"),
+    ("feeling sleepy after the trek", "tired"),
+    ("we need  rest", "tired"),
+    ("let's take it easy", "relaxed"),
+    ("starving!", "hungry"),
+])
+def test_moods_the_rules_handle(mood, category):
+    assert classify_mood(mood) == category
+
+
+@pytest.mark.parametrize("mood", [
+    "chilly and raining, move indoors",
+    "not tired at all, energetic",
+    "no longer hungry",
+    "tired and hungry",
+    "slowly getting bored",
+    "energetic",
+    "",
+])
+def test_moods_that_go_to_the_agent(mood):
+    assert classify_mood(mood) is None
+    assert reschedule_locally(DAY, mood, "10:30") is None
+
+
+def test_tired_drops_the_next_activity_and_pushes_the_rest_back_by_the_remaining_rest():
+    result = reschedule_locally(DAY, "tired", "10:30")
+
+    # Fort's 30-minute slot absorbs half of the 60-minute rest
+    assert localRescheduler.TIRED_REST_MINUTES == 60
+    assert result["activities_to_cancel"] == ["Fort"]
+    assert times(result) == {
+        "Museum": ("10:00", "upcoming"),
+        "Fort": ("11:30", "cancelled"),
+        "Lunch at Vaishali": ("12:30", "upcoming"),
+        "Palace": ("14:30", "upcoming"),
+        "Garden": ("16:30", "upcoming"),
+    }
+
+
+def test_tired_with_a_long_dropped_slot_moves_nothing():
+    day = [{"time": "10:00", "name": "Fort"}, {"time": "12:00", "name": "Palace"}, {"time": "14:00", "name": "Garden"}]
+
+    result = reschedule_locally(day, "tired", "09:00")
+
+    assert times(result) == {"Fort": ("10:00", "cancelled"), "Palace": ("12:00", "upcoming"),
+                             "Garden": ("14:00", "upcoming")}
+    assert "pushed" not in result["reasoning"]
+
+
+def test_tired_never_drops_a_meal():
+    day = [{"time": "12:00", "name": "Lunch"}, {"time": "13:00", "name": "Palace"}]
+
+    assert reschedule_locally(day, "tired", "11:00")["activities_to_cancel"] == ["Palace"]
+
+
+def test_relaxed_adds_slack_cumulatively():
+    result = reschedule_locally(DAY, "relaxed", "10:30")
+
+    assert localRescheduler.RELAXED_SLACK_MINUTES == 30
+    assert times(result) == {
+        "Museum": ("10:00", "upcoming"),
+        "Fort": ("12:00", "upcoming"),
+        "Lunch at Vaishali": ("13:00", "upcoming"),
+        "Palace": ("15:30", "upcoming"),
+        "Garden": ("18:00", "upcoming"),
+    }
+
+
+def test_activities_pushed_past_the_day_end_are_cancelled():
+    day = [{"time": "21:00", "name": "Light show"}, {"time": "21:40", "name": "Night market"}]
+
+    result = reschedule_locally(day, "relaxed", "20:00")
+
+    assert times(result) == {"Light show": ("21:30", "upcoming"), "Night market": ("22:40", "cancelled")}
+    assert result["activities_to_cancel"] == ["Night market"]
+
+
+def test_hungry_moves_the_meal_to_now_and_slides_only_what_overlaps():
+    result = reschedule_locally(DAY, "hungry", "10:30")
+
+    # Lunch keeps its planned 120 minutes, so Fort starts at 12:30 and ends at 13:00, before Palace
+    assert times(result) == {
+        "Museum": ("10:00", "upcoming"),
+        "Lunch at Vaishali": ("10:30", "upcoming"),
+        "Fort": ("12:30", "upcoming"),
+        "Palace": ("14:00", "upcoming"),
+        "Garden": ("16:00", "upcoming"),
+    }
+    assert [activity["name"] for activity in result["updated_schedule"]] == [
+        "Museum", "Lunch at Vaishali", "Fort", "Palace", "Garden"]
+
+
+def test_hungry_without_a_meal_goes_to_the_agent():
+    assert reschedule_locally(DAY[:2], "hungry", "10:30") is None
+
+
+def test_statuses_decide_what_is_upcoming():
+    day = [{"time": "10:00", "name": "Fort", "status": "completed"}, {"time": "11:00", "name": "Palace", "status": "upcoming"}]
+
+    result = reschedule_locally(day, "relaxed", "23:00")
+
+    assert times(result) == {"Fort": ("10:00", "completed"), "Palace": ("11:30", "upcoming")}
+
+
+def test_shifted_times_keep_their_clock_style():
+    assert shift_clock_text("2:00 PM - 3:30 PM", 45) == "2:45 PM - 4:15 PM"
+    assert shift_clock_text("23:30", 45) == "00:15"
+    assert shift_clock_text("Day 2, 9 am", 30) == "Day 2, 9:30 AM"
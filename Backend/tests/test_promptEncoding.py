@@ -0,0 +1,67 @@
+import promptEncoding
+from promptEncoding import PromptEncodingStats, encode_activities, parse_clock_minutes, remaining_activities
+
+
+def names(activities):
+    return [activity["name"] for activity in activities]
+
+
+def test_untimed_activities_are_kept_and_do_not_count_as_started():
+    day = [{"time": "09:00", "name": "A"}, {"time": "14:00", "name": "B"}, {"time": "evening", "name": "C"}]
+
+    assert names(remaining_activities(day, "11:00")) == ["A", "B", "C"]
+
+
+def test_untimed_activity_before_the_current_one_is_kept():
+    day = [{"time": "after breakfast", "name": "Walk"}, {"time": "09:00", "name": "A"},
+           {"time": "10:00", "name": "B"}, {"time": "14:00", "name": "C"}]
+
+    assert names(remaining_activities(day, "11:00")) == ["Walk", "B", "C"]
+
+
+def test_midnight_counts_as_started():
+    day = [{"time": "00:00", "name": "Night market"}, {"time": "01:00", "name": "Late show"}]
+
+    assert names(remaining_activities(day, "02:00")) == ["Late show"]
+
+
+def test_statuses_take_precedence_over_times():
+    day = [{"time": "09:00", "name": "A", "status": "completed"}, {"time": "10:00", "name": "B", "status": "canceled"},
+           {"time": "11:00", "name": "C", "status": "skipped"}, {"time": "08:00", "name": "D", "status": "upcoming"}]
+
+    assert names(remaining_activities(day, "12:00")) == ["D"]
+
+
+def test_clock_parsing():
+    assert parse_clock_minutes("2:30 PM") == 870
+    assert parse_clock_minutes("12 am") == 0
+    assert parse_clock_minutes("10:00 - 11:30") == 600
+    assert parse_clock_minutes("evening") is None
+
+
+def test_table_escapes_separators():
+    table = encode_activities([{"time": "10:00", "name": "Cafe | Bakery"}])
+
+    assert table == "time|name\n10:00|Cafe / Bakery"
+
+
+def test_stats_measure_the_json_baseline_on_a_sample(monkeypatch):
+    stats = PromptEncodingStats(sample_every=3)
+    day = [{"time": "09:00", "name": "A"}, {"time": "14:00", "name": "B"}]
+    dumps = []
+    real_dumps = promptEncoding.json.dumps
+
+    def counting_dumps(value, **kwargs):
+        dumps.append(value)
+        return real_dumps(value, **kwargs)
+    monkeypatch.setattr(promptEncoding.json, "dumps", counting_dumps)
+
+    for _ in range(7):
+        stats.record("adjust", day, encode_activities(day))
+
+    counters = stats.stats()["adjust"]
+    # Prompts 1, 4 and 7 are measured
+    assert len(dumps) == counters["sampled_prompts"] == 3
+    assert counters["prompts"] == 7
+    assert counters["tokens_after"] == 7 * counters["sampled_tokens_after"] / 3
+    assert 0 < counters["saved_ratio"] < 1
@@ -0,0 +1,81 @@
+import pytest
+
+from agentPool import AgentPool, agent_fingerprint
+from bookingAgent import TravelOptionsFinder
+from geolocation import InteractiveTravelAgent
+from liveItineraryAgent import LiveItineraryAgent
+from responseCache import ResponseCache
+from routeHelpers import alternatives_cache_key
+
+FINGERPRINT = "llama|duckduckgo"
+
+
+@pytest.mark.parametrize("factory", [InteractiveTravelAgent, TravelOptionsFinder, LiveItineraryAgent])
+def test_pool_fingerprint_is_known_before_any_agent_is_built(factory):
+    pool = AgentPool(factory, 1, "test")
+
+    assert pool.stats()["created"] == 0
+    assert pool.fingerprint == agent_fingerprint(factory())
+
+
+def test_first_request_is_cached_for_the_second():
+    cache = ResponseCache()
+    pool = AgentPool(TravelOptionsFinder, 1, "booking")
+
+    assert cache.get("Suggest places in Goa", pool.fingerprint) is None
+    cache.set("Suggest places in Goa", pool.fingerprint, "1. **Baga Beach**")
+
+    assert cache.get("Suggest  places in\nGoa", pool.fingerprint) == "1. **Baga Beach**"
+
+
+def test_entry_count_bound_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", FINGERPRINT, "A")
+    cache.set("b", FINGERPRINT, "B")
+    cache.get("a", FINGERPRINT)
+    cache.set("c", FINGERPRINT, "C")
+
+    assert cache.get("b", FINGERPRINT) is None
+    assert cache.get("a", FINGERPRINT) == "A" and cache.get("c", FINGERPRINT) == "C"
+
+
+def test_byte_bound_evicts_until_the_responses_fit():
+    cache = ResponseCache(max_bytes=10)
+    cache.set("a", FINGERPRINT, "12345")
+    cache.set("b", FINGERPRINT, "12345")
+    cache.set("c", FINGERPRINT, "1234")
+
+    assert cache.get("a", FINGERPRINT) is None
+    assert cache.stats()["bytes"] == 9
+    assert cache.stats()["evictions"] == 1
+
+
+def test_response_larger_than_the_byte_bound_is_not_cached():
+    cache = ResponseCache(max_bytes=10)
+    cache.set("a", FINGERPRINT, "12345")
+    cache.set("b", FINGERPRINT, "x" * 11)
+
+    assert cache.get("b", FINGERPRINT) is None
+    assert cache.get("a", FINGERPRINT) == "12345"
+
+
+def test_replacing_an_entry_does_not_count_its_bytes_twice():
+    cache = ResponseCache(max_bytes=10)
+    cache.set("a", FINGERPRINT, "12345")
+    cache.set("a", FINGERPRINT, "123456")
+
+    assert cache.stats()["bytes"] == 6
+
+
+def test_near_duplicate_alternatives_need_the_same_venues():
+    cache = ResponseCache(near_duplicates=True)
+    museums = [{"name": "Raja Dinkar Kelkar Museum", "distance_km": 0.8}, {"name": "Aga Khan Palace", "distance_km": 4.1}]
+    query, near_parts = alternatives_cache_key("museum", "Pune", 5, "tired", museums)
+    cache.set(query, FINGERPRINT, "Visit the Kelkar Museum", near_parts)
+
+    # Spelled differently, same venues in another order
+    respelled_query, respelled = alternatives_cache_key("Museums", "pune", 5, "Tired", museums[::-1])
+    assert cache.get(respelled_query, FINGERPRINT, respelled) == "Visit the Kelkar Museum"
+
+    fewer_query, fewer_venues = alternatives_cache_key("museum", "Pune", 5, "tired", museums[1:])
+    assert cache.get(fewer_query, FINGERPRINT, fewer_venues) is None
@@ -0,0 +1,119 @@
+import asyncio
+import re
+
+import pytest
+
+import responseProcessing
+from geocodeTypes import GeocodeResult
+from responseProcessing import StreamingRewriter, aprocess_function_calls, process_function_calls
+
+
+def fake_result(location_name):
+    return GeocodeResult.found(location_name, 18.5, 73.8, f"{location_name}, Pune")
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Names sent to the geocoder, one list per geocode_many call"""
+    calls = []
+
+    def geocode_many(location_names):
+        calls.append(list(location_names))
+        return [fake_result(name) for name in location_names]
+
+    async def ageocode_many(location_names):
+        return geocode_many(location_names)
+
+    monkeypatch.setattr(responseProcessing, "geocode_many", geocode_many)
+    monkeypatch.setattr(responseProcessing, "ageocode_many", ageocode_many)
+    return calls
+
+
+def legacy_process_function_calls(text):
+    """The call-format and waiting-line passes process_function_calls replaced, kept as the reference"""
+    for location_name in re.findall(r'get_location_coordinates\(\"([^\"]+)\"\)', text):
+        text = text.replace(f'get_location_coordinates("{location_name}")',
+                            f'**Coordinates**: {fake_result(location_name).to_legacy_string()}')
+    for pattern in (r'(Waiting for the result of the function call.*?\n)',
+                    r'(Please wait for the function result.*?\n)',
+                    r'(Once I have the coordinates.*?\n)',
+                    r'(\(Please provide the result of the function call\))'):
+        text = re.sub(pattern, '', text)
+    return text
+
+
+CALL_RESPONSE = """1. **Shaniwar Wada**: Peshwa fort.
+get_location_coordinates("Shaniwar Wada, Pune")
+Waiting for the result of the function call to continue.
+2. **Aga Khan Palace**: Gardens and memorial.
+get_location_coordinates("Aga Khan Palace, Pune")
+(Please provide the result of the function call)
+3. **Shaniwar Wada again**: get_location_coordinates("Shaniwar Wada, Pune")
+Once I have the coordinates I will add the map.
+"""
+
+
+def test_matches_legacy_rewrite(lookups):
+    assert process_function_calls(CALL_RESPONSE) == legacy_process_function_calls(CALL_RESPONSE)
+
+
+def test_each_distinct_location_is_geocoded_once(lookups):
+    process_function_calls(CALL_RESPONSE)
+    assert lookups == [["Shaniwar Wada, Pune", "Aga Khan Palace, Pune"]]
+
+
+def test_tag_format_is_rewritten(lookups):
+    text = 'Fort <function=get_location_coordinates{"location_name": "Sinhagad Fort"}}</function> done'
+    expected = f"Fort **Coordinates**: {fake_result('Sinhagad Fort').to_legacy_string()} done"
+    assert process_function_calls(text) == expected
+
+
+def test_text_without_calls_is_returned_untouched(lookups):
+    text = "1. **Osho Teerth Park**: A quiet garden."
+    assert process_function_calls(text) is text
+    assert lookups == []
+
+
+def test_async_rewrite_matches_sync(lookups):
+    assert asyncio.run(aprocess_function_calls(CALL_RESPONSE)) == process_function_calls(CALL_RESPONSE)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+def test_streaming_rewrite_matches_whole_response(lookups, chunk_size):
+    rewriter = StreamingRewriter()
+    chunks = [CALL_RESPONSE[start:start + chunk_size] for start in range(0, len(CALL_RESPONSE), chunk_size)]
+    streamed = "".join(rewriter.feed(chunk) for chunk in chunks) + rewriter.flush()
+    assert streamed == process_function_calls(CALL_RESPONSE)
+
+
+def legacy_annotate(text, names, results):
+    """The find-and-slice loop suggest_places used before find_numbered_items, kept as the reference"""
+    for name, result in zip(names, results):
+        end = text.find("\n\n", text.find(name))
+        if end == -1:
+            next_match = re.search(r'\d+\.\s+\*\*', text[text.find(name) + len(name):])
+            end = text.find(name) + len(name) + next_match.start() if next_match else len(text)
+        text = text[:end] + f"\n**Coordinates**: {result.to_legacy_string()}" + text[end:]
+    return text
+
+
+SUGGESTIONS = "Here are the top attractions:\n\n" + "\n\n".join(
+    f"{number}. **Attraction {number}**: Why attraction {number} is worth a visit." for number in range(1, 61)
+)
+
+
+@pytest.mark.parametrize("pattern", [responseProcessing.ATTRACTION_PATTERN, responseProcessing.HOTEL_PATTERN])
+def test_annotation_matches_legacy_on_long_lists(pattern):
+    items = responseProcessing.find_numbered_items(SUGGESTIONS, pattern)
+    results = [fake_result(item.name) for item in items]
+
+    assert len(items) == 60
+    assert responseProcessing.annotate_with_coordinates(SUGGESTIONS, items, results) == \
+        legacy_annotate(SUGGESTIONS, [item.name for item in items], results)
+
+
+def test_item_without_blank_line_ends_before_the_next_item():
+    text = "1. **Fort**: Old walls.\n2. **Palace**: Gardens.\n\nClosing note."
+    items = responseProcessing.find_numbered_items(text)
+
+    assert [text[item.start:item.end] for item in items] == ["1. **Fort**: Old walls.", "2. **Palace**: Gardens."]
@@ -0,0 +1,127 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from extraction import extract_attractions, extract_hotels
+from geocodeTypes import GeocodeResult
+from routePlanner import (haversine_matrix, parse_day_count, parse_selection, plan_route, route_lookups,
+                          two_opt)
+
+# The model skipped 3; users pick from the numbers they see
+SKIPPED_NUMBERING = """Top places in Pune:
+
+1. **Shaniwar Wada**: Peshwa fort.
+
+2. **Aga Khan Palace**: Gardens.
+
+4. **Sinhagad Fort**: Hill fort.
+
+5. **Osho Teerth Park**: Quiet garden.
+"""
+HOTELS = """1. **Hotel Shreyas:** Mid-range.
+
+3. **Zostel Pune:** Budget.
+"""
+
+
+def stored(items):
+    """suggested_places as suggest-places stores them"""
+    return [{"number": item.number, "name": item.name, "location_query": f"{item.name}, Pune"} for item in items]
+
+
+def found(name, latitude, longitude):
+    return name, GeocodeResult.found(name, latitude, longitude, name)
+
+
+def test_extraction_keeps_the_printed_numbers():
+    assert [(item.number, item.name) for item in extract_attractions(SKIPPED_NUMBERING)] == [
+        (1, "Shaniwar Wada"), (2, "Aga Khan Palace"), (4, "Sinhagad Fort"), (5, "Osho Teerth Park")]
+
+
+def test_selection_is_looked_up_by_printed_number():
+    context = {
+        "suggested_places": stored(extract_attractions(SKIPPED_NUMBERING)),
+        "suggested_hotels": stored(extract_hotels(HOTELS)),
+        "selected_places": "4, 5, 3",
+        "selected_hotel": "3",
+    }
+
+    places, hotel = route_lookups(context)
+
+    assert places == [("Sinhagad Fort", "Sinhagad Fort, Pune"), ("Osho Teerth Park", "Osho Teerth Park, Pune")]
+    assert hotel == ("Zostel Pune", "Zostel Pune, Pune")
+
+
+def test_sessions_stored_without_numbers_fall_back_to_positions():
+    context = {
+        "suggested_places": [{"name": "Fort", "location_query": "Fort, Pune"},
+                             {"name": "Palace", "location_query": "Palace, Pune"}],
+        "selected_places": [2],
+    }
+
+    assert route_lookups(context) == ([("Palace", "Palace, Pune")], None)
+
+
+def test_no_stored_suggestions_or_no_match_gives_none():
+    assert route_lookups({"selected_places": "1"}) is None
+    assert route_lookups({"suggested_places": stored(extract_attractions(SKIPPED_NUMBERING)),
+                          "selected_places": "3, 9"}) is None
+
+
+@pytest.mark.parametrize("selection, numbers", [
+    ("1, 3, 5", [1, 3, 5]),
+    ("3 and 1, then 3 again", [3, 1]),
+    (["2", 4, "x"], [2, 4]),
+    (None, []),
+])
+def test_parse_selection(selection, numbers):
+    assert parse_selection(selection) == numbers
+
+
+@pytest.mark.parametrize("duration, days", [("3 days", 3), ("2 nights", 2), ("1 week", 7), ("5", 5), ("a weekend", 1)])
+def test_parse_day_count(duration, days):
+    assert parse_day_count(duration) == days
+
+
+def test_haversine_matches_a_known_distance():
+    # Pune to Mumbai is about 120 km in a straight line
+    distances = haversine_matrix([18.5204, 19.0760], [73.8567, 72.8777])
+
+    assert distances[0, 1] == pytest.approx(120, abs=3)
+    assert distances[0, 0] == 0
+
+
+def test_two_opt_finds_the_shortest_loop_on_a_small_set():
+    rng = np.random.default_rng(7)
+    points = rng.uniform(0, 1, size=(7, 2))
+    distances = np.sqrt(((points[:, None] - points[None, :]) ** 2).sum(-1))
+
+    def length(tour):
+        return sum(distances[tour[i], tour[(i + 1) % len(tour)]] for i in range(len(tour)))
+
+    best = min(length([0, *rest]) for rest in itertools.permutations(range(1, 7)))
+    shuffled = [0, 4, 1, 6, 2, 5, 3]
+    assert length(two_opt(shuffled, distances)) <= length(shuffled)
+    assert length(two_opt(shuffled, distances)) == pytest.approx(best, rel=0.05)
+
+
+def test_plan_splits_days_into_loops_from_the_hotel():
+    places = [found("North A", 18.60, 73.85), found("North B", 18.61, 73.86),
+              found("South A", 18.40, 73.85), found("South B", 18.41, 73.86)]
+    hotel = found("Hotel", 18.50, 73.85)
+
+    plan = plan_route(places + [("Nowhere", GeocodeResult.not_found("Nowhere", "offline"))], 2, hotel)
+
+    day_names = [sorted(stop["name"] for stop in day["stops"]) for day in plan.days]
+    assert sorted(day_names) == [["North A", "North B"], ["South A", "South B"]]
+    assert plan.unplaced == ["Nowhere"]
+    for day in plan.days:
+        assert day["distance_km"] == pytest.approx(sum(stop["leg_km"] for stop in day["stops"]) + day["return_km"], abs=0.02)
+    assert plan.to_prompt().startswith("Day 1: Hotel -> ")
+
+
+def test_plan_without_located_places_is_empty():
+    plan = plan_route([("Nowhere", GeocodeResult.not_found("Nowhere", "offline"))], 2)
+
+    assert plan.days == [] and plan.unplaced == ["Nowhere"]
@@ -0,0 +1,184 @@
+import time
+
+import pytest
+
+from chatHistory import ChatHistory
+from sessionStore import (FakeRedis, InMemorySessionStore, RedisSessionStore, SessionStore,
+                          SQLiteSessionStore)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore(ttl_seconds=60, max_sessions=3)
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl_seconds=60, max_sessions=3)
+    return RedisSessionStore(FakeRedis(), ttl_seconds=60, max_sessions=3)
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def shared_store(request, tmp_path):
+    """Stores whose get() returns a copy, so two requests can hold diverging versions"""
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    return RedisSessionStore(FakeRedis())
+
+
+def new_session():
+    history = ChatHistory()
+    history.append("user", "Plan a trip to Pune")
+    return {"chat_history": history, "travel_context": {"destination": "Pune"}, "current_itinerary": []}
+
+
+def load(store, session_id):
+    session = store.get(session_id)
+    session["chat_history"] = ChatHistory.from_state(session["chat_history"])
+    return session
+
+
+def test_round_trip(store):
+    store.save("a", new_session())
+
+    session = load(store, "a")
+
+    assert session["travel_context"] == {"destination": "Pune"}
+    assert [entry["message"] for entry in session["chat_history"].page()["entries"]] == ["Plan a trip to Pune"]
+    assert "a" in store and "b" not in store
+
+
+def test_delete(store):
+    store.save("a", new_session())
+
+    assert store.delete("a")
+    assert not store.delete("a")
+    assert store.get("a") is None
+
+
+def test_least_recently_active_sessions_are_evicted(store):
+    for session_id in "abcd":
+        store.save(session_id, new_session())
+    # SQLite enforces the cap in the sweep rather than on every save
+    store.expire_idle()
+
+    assert store.get("a") is None
+    assert sorted(session_id for session_id, _ in store.items()) == ["b", "c", "d"]
+
+
+def test_expire_idle_removes_only_idle_sessions(store):
+    store.save("old", new_session())
+    time.sleep(0.05)
+    store.save("new", new_session())
+
+    assert store.expire_idle(max_idle_seconds=0.03) == ["old"]
+    assert store.get("new") is not None
+
+
+def test_concurrent_saves_keep_both_changes(shared_store):
+    shared_store.save("a", new_session())
+    first = load(shared_store, "a")
+    second = load(shared_store, "a")
+
+    first["travel_context"]["selected_places"] = ["Shaniwar Wada"]
+    first["chat_history"].append("user", "Selected places")
+    shared_store.save("a", first)
+    second["current_itinerary"] = [{"time": "10:00", "name": "Aga Khan Palace"}]
+    second["chat_history"].append("system", "Itinerary updated")
+    shared_store.save("a", second)
+
+    session = load(shared_store, "a")
+    assert session["travel_context"] == {"destination": "Pune", "selected_places": ["Shaniwar Wada"]}
+    assert session["current_itinerary"] == [{"time": "10:00", "name": "Aga Khan Palace"}]
+    entries = session["chat_history"].page()["entries"]
+    assert [entry["message"] for entry in entries] == ["Plan a trip to Pune", "Selected places", "Itinerary updated"]
+    assert [entry["id"] for entry in entries] == [0, 1, 2]
+    assert session["chat_history"].total == 3
+
+
+def test_later_save_of_the_same_object_wins_on_a_shared_field(shared_store):
+    shared_store.save("a", new_session())
+    first = load(shared_store, "a")
+    second = load(shared_store, "a")
+
+    first["travel_context"]["destination"] = "Mumbai"
+    shared_store.save("a", first)
+    second["travel_context"]["destination"] = "Goa"
+    shared_store.save("a", second)
+    # Saving again only writes what changed since the last save
+    first["current_itinerary"] = [{"time": "09:00", "name": "Beach"}]
+    shared_store.save("a", first)
+
+    session = load(shared_store, "a")
+    assert session["travel_context"]["destination"] == "Goa"
+    assert session["current_itinerary"] == [{"time": "09:00", "name": "Beach"}]
+
+
+def test_removed_keys_stay_removed(shared_store):
+    shared_store.save("a", new_session())
+    session = load(shared_store, "a")
+
+    del session["travel_context"]["destination"]
+    shared_store.save("a", session)
+
+    assert load(shared_store, "a")["travel_context"] == {}
+
+
+def test_saving_a_stale_copy_does_not_resurrect_a_deleted_session(shared_store):
+    shared_store.save("a", new_session())
+    stale = load(shared_store, "a")
+    shared_store.delete("a")
+
+    shared_store.save("a", stale)
+
+    assert shared_store.get("a") is None
+
+
+def test_saving_a_stale_copy_does_not_resurrect_an_expired_session(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl_seconds=0.05)
+    store.save("a", new_session())
+    stale = load(store, "a")
+    time.sleep(0.1)
+
+    store.save("a", stale)
+
+    assert store.get("a") is None
+    # A new session may still take the ID
+    store.save("a", new_session())
+    assert store.get("a") is not None
+
+
+def test_redis_save_retries_when_the_key_changes_mid_save():
+    client = FakeRedis()
+    store = RedisSessionStore(client)
+    store.save("a", new_session())
+    session = load(store, "a")
+    session["current_itinerary"] = [{"time": "10:00", "name": "Aga Khan Palace"}]
+
+    pipeline = client.pipeline
+
+    def interfering_pipeline():
+        pipe = pipeline()
+        watch = pipe.watch
+
+        def watch_then_write(*keys):
+            watch(*keys)
+            # Another worker saves between this save's WATCH and EXEC, once
+            if not interfering.get("done"):
+                interfering["done"] = True
+                other = load(store, "a")
+                other["travel_context"]["budget"] = "moderate"
+                store.save("a", other)
+        pipe.watch = watch_then_write
+        return pipe
+
+    interfering = {}
+    client.pipeline = interfering_pipeline
+    store.save("a", session)
+
+    stored = load(store, "a")
+    assert stored["travel_context"] == {"destination": "Pune", "budget": "moderate"}
+    assert stored["current_itinerary"] == [{"time": "10:00", "name": "Aga Khan Palace"}]
+
+
+def test_base_store_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        SessionStore()
@@ -0,0 +1,97 @@
+import pytest
+
+from venueIndex import VenueIndex, parse_coordinates
+
+
+def fill_distant_cells(index, count=50):
+    """Populate more cells than a small query spans, so within() walks the grid instead of every cell"""
+    for number in range(count):
+        index.add(f"Filler {number}", -40.0, number * index.cell_degrees * 2)
+
+
+@pytest.fixture
+def pune():
+    index = VenueIndex()
+    index.add("Shaniwar Wada", 18.5195, 73.8553)
+    index.add("Dagdusheth Temple", 18.5164, 73.8561)
+    index.add("Aga Khan Palace", 18.5524, 73.9015)
+    index.add("Sinhagad Fort", 18.3664, 73.7559)
+    return index
+
+
+def names(venues):
+    return [venue["name"] for venue in venues]
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_radius_filters_and_sorts_by_distance(pune, dense):
+    if dense:
+        fill_distant_cells(pune)
+
+    assert names(pune.within(18.5195, 73.8553, 1)) == ["Shaniwar Wada", "Dagdusheth Temple"]
+    assert names(pune.within(18.5195, 73.8553, 7)) == ["Shaniwar Wada", "Dagdusheth Temple", "Aga Khan Palace"]
+    assert names(pune.within(18.5195, 73.8553, 25))[-1] == "Sinhagad Fort"
+
+
+def test_distances_are_reported(pune):
+    venues = pune.within(18.5195, 73.8553, 1)
+
+    assert venues[0]["distance_km"] == 0
+    assert venues[1]["distance_km"] == 0.35
+
+
+def test_exclude_leaves_out_the_named_place(pune):
+    assert names(pune.within(18.5195, 73.8553, 1, exclude="  shaniwar wada ")) == ["Dagdusheth Temple"]
+
+
+def test_limit_keeps_the_nearest(pune):
+    assert names(pune.within(18.5195, 73.8553, 25, limit=2)) == ["Shaniwar Wada", "Dagdusheth Temple"]
+
+
+def test_large_radius_walks_only_populated_cells(pune):
+    pune.add("Colombo Fort", 6.9344, 79.8428)
+
+    # 1500 km spans tens of thousands of cells but only five are populated
+    venues = pune.within(18.5195, 73.8553, 1500)
+
+    assert names(venues)[-1] == "Colombo Fort"
+    assert pune.stats()["candidates_measured"] == 5
+
+
+def test_moved_venue_is_found_at_its_new_place(pune):
+    pune.add("Sinhagad Fort", 18.52, 73.856)
+
+    assert "Sinhagad Fort" in names(pune.within(18.5195, 73.8553, 1))
+    assert pune.within(18.3664, 73.7559, 1) == []
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_search_crosses_the_antimeridian(dense):
+    index = VenueIndex()
+    if dense:
+        fill_distant_cells(index)
+    index.add("East", 15, 179.99)
+    index.add("West", 15, -179.99)
+
+    assert names(index.within(15, 179.99, 5)) == ["East", "West"]
+    assert names(index.within(15, -179.99, 5)) == ["West", "East"]
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_polar_search_returns_each_venue_once(dense):
+    # Near the pole the search spans every column, an even number of them here
+    index = VenueIndex(cell_degrees=10)
+    if dense:
+        for latitude in range(-80, 0, 10):
+            for longitude in range(-180, 180, 10):
+                index.add(f"Filler {latitude} {longitude}", latitude, longitude)
+    index.add("Station", 89.99, 10)
+    index.add("Camp", 89.99, -170)
+
+    assert names(index.within(89.99, 10, 5)) == ["Station", "Camp"]
+
+
+def test_parse_coordinates():
+    assert tuple(parse_coordinates(" 12.9716, 77.5946 ")) == (12.9716, 77.5946)
+    assert parse_coordinates("91, 0") is None
+    assert parse_coordinates("Shaniwar Wada") is None
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from geocodeCache import normalize_location_key
+from promptEncoding import remaining_activities
+from routePlanner import haversine_row
+
+load_dotenv()
+
+# Travel times between the places of a live itinerary, worked out once per place from
+# straight-line distance and a speed profile instead of asking the agent on every
+# re-route. The matrix lives in the session and only gains or loses rows as the
+# activities change.
+
+# mode -> (average speed in km/h, road distance per straight-line km, fixed minutes per trip)
+SPEED_PROFILES = {
+    "walking": (4.5, 1.2, 0),
+    "cycling": (14.0, 1.25, 2),
+    "transit": (18.0, 1.3, 10),
+    "driving": (22.0, 1.35, 6),
+}
+# "auto" walks short hops and uses TRAVEL_TIME_MODE for the rest
+DEFAULT_MODE = os.getenv("TRAVEL_TIME_MODE", "driving")
+WALKING_MAX_KM = float(os.getenv("TRAVEL_TIME_WALKING_MAX_KM", 1.5))
+# Larger itineraries only list their first places in prompts
+MAX_PROMPT_LOCATIONS = 12
+
+_stats_lock = threading.Lock()
+_stats = {"rows_added": 0, "rows_removed": 0, "total_seconds": 0.0, "updates": 0}
+
+
+def travel_minutes(distance_km: float, mode: str = "auto") -> int:
+    """Door-to-door minutes for a straight-line distance under a speed profile"""
+    if mode == "auto":
+        mode = "walking" if distance_km <= WALKING_MAX_KM else DEFAULT_MODE
+    speed, detour, fixed = SPEED_PROFILES.get(mode, SPEED_PROFILES["driving"])
+    if distance_km <= 0:
+        return 0
+    return int(round(fixed + distance_km * detour / speed * 60))
+
+
+class TravelTimeMatrix:
+    """
+    Pairwise straight-line distances between named places, grown one row at a time.
+
+    Adding a place computes a single NumPy row against the places already known;
+    removing one drops its row and column. Minutes are derived from distances on
+    lookup, so the mode can change without rebuilding anything.
+    """
+
+    def __init__(self, names=None, points=None, distances=None):
+        self.names = list(names or [])
+        self._index = {normalize_location_key(name): position for position, name in enumerate(self.names)}
+        self.points = np.asarray(points if points is not None else np.empty((0, 2)), dtype=float).reshape(-1, 2)
+        if distances is None:
+            distances = np.zeros((len(self.names), len(self.names)))
+        self.distances = np.asarray(distances, dtype=float).reshape(len(self.names), len(self.names))
+
+    def __contains__(self, name) -> bool:
+        return normalize_location_key(str(name)) in self._index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def missing(self, names: Iterable[str]) -> List[str]:
+        """Names not in the matrix yet, without repeats, in first-seen order"""
+        missing, seen = [], set()
+        for name in names:
+            key = normalize_location_key(str(name))
+            if key not in self._index and key not in seen:
+                seen.add(key)
+                missing.append(name)
+        return missing
+
+    def add(self, name: str, latitude: float, longitude: float) -> None:
+        """Add a place, computing only its own row and column"""
+        if name in self:
+            return
+        row = haversine_row(latitude, longitude, self.points[:, 0], self.points[:, 1])
+        size = len(self.names)
+        distances = np.zeros((size + 1, size + 1))
+        distances[:size, :size] = self.distances
+        distances[size, :size] = row
+        distances[:size, size] = row
+        self.distances = distances
+        self.points = np.vstack([self.points, [latitude, longitude]])
+        self._index[normalize_location_key(name)] = size
+        self.names.append(name)
+
+    def retain(self, names: Iterable[str]) -> int:
+        """Drop every place not in names; returns how many were dropped"""
+        keep_keys = {normalize_location_key(str(name)) for name in names}
+        keep = [position for position, name in enumerate(self.names) if normalize_location_key(name) in keep_keys]
+        dropped = len(self.names) - len(keep)
+        if dropped:
+            self.names = [self.names[position] for position in keep]
+            self.points = self.points[keep]
+            self.distances = self.distances[np.ix_(keep, keep)]
+            self._index = {normalize_location_key(name): position for position, name in enumerate(self.names)}
+        return dropped
+
+    def km(self, origin: str, destination: str) -> Optional[float]:
+        """Straight-line kilometres between two known places, or None if either is unknown"""
+        a = self._index.get(normalize_location_key(str(origin)))
+        b = self._index.get(normalize_location_key(str(destination)))
+        if a is None or b is None:
+            return None
+        return float(self.distances[a, b])
+
+    def minutes(self, origin: str, destination: str, mode: str = "auto") -> Optional[int]:
+        """Estimated travel minutes between two known places, or None if either is unknown"""
+        distance = self.km(origin, destination)
+        return travel_minutes(distance, mode) if distance is not None else None
+
+    def to_prompt(self, names: List[str], mode: str = "auto") -> str:
+        """
+        A minutes table over the given places for a prompt, or "" if fewer than two are known.
+
+        Places are numbered in a legend row so the table itself stays narrow.
+        """
+        known = []
+        for name in names:
+            if name in self and name not in known:
+                known.append(name)
+        known = known[:MAX_PROMPT_LOCATIONS]
+        if len(known) < 2:
+            return ""
+        legend = "; ".join(f"{number}={name}" for number, name in enumerate(known, 1))
+        header = "from\\to|" + "|".join(str(number) for number in range(1, len(known) + 1))
+        rows = [
+            f"{number}|" + "|".join("-" if origin == destination else str(self.minutes(origin, destination, mode))
+                                    for destination in known)
+            for number, origin in enumerate(known, 1)
+        ]
+        return "\n".join([legend, header] + rows)
+
+    def to_state(self) -> Dict[str, Any]:
+        """Compact JSON-safe form for session stores"""
+        return {
+            "names": self.names,
+            "points": np.round(self.points, 6).tolist(),
+            "distances": np.round(self.distances, 3).tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state) -> "TravelTimeMatrix":
+        """Rebuild from to_state() output; a live matrix is returned as is and None gives an empty one"""
+        if isinstance(state, TravelTimeMatrix):
+            return state
+        if not state:
+            return cls()
+        return cls(state.get("names"), state.get("points"), state.get("distances"))
+
+
+def itinerary_locations(itinerary) -> List[str]:
+    """Distinct activity locations worth geocoding, in itinerary order"""
+    if isinstance(itinerary, dict):
+        itinerary = itinerary.get("activities", itinerary.get("schedule"))
+    if not isinstance(itinerary, list):
+        return []
+    locations = []
+    for activity in itinerary:
+        location = activity.get("location") if isinstance(activity, dict) else None
+        if location and location not in ("See details", "To be determined") and location not in locations:
+            locations.append(location)
+    return locations
+
+
+def route_locations(itinerary, current_time=None, current_location=None) -> List[str]:
+    """The current location followed by the locations of the activities still ahead"""
+    locations = itinerary_locations(itinerary)
+    if isinstance(itinerary, list) and all(isinstance(activity, dict) for activity in itinerary):
+        locations = itinerary_locations(remaining_activities(itinerary, current_time))
+    if current_location and current_location != "Current location" and current_location not in locations:
+        locations.insert(0, current_location)
+    return locations
+
+
+def location_query(location: str, destination: Optional[str]) -> str:
+    """Geocoding query for an activity location, qualified by the trip destination when it lacks one"""
+    if destination and destination.lower() not in location.lower():
+        return f"{location}, {destination}"
+    return location
+
+
+def update_matrix(matrix: TravelTimeMatrix, locations: List[str], results) -> TravelTimeMatrix:
+    """
+    Bring a matrix in line with the itinerary's locations.
+
+    Args:
+        matrix: Matrix from the session
+        locations: itinerary_locations() of the new itinerary
+        results: Geocoding results for matrix.missing(locations), in the same order; None
+            for a place that was not looked up, which a later update can add
+
+    Returns:
+        The same matrix, updated in place
+    """
+    started = time.perf_counter()
+    dropped = matrix.retain(locations)
+    added = 0
+    for location, result in zip(matrix.missing(locations), results):
+        if result is not None and result.ok:
+            matrix.add(location, result.latitude, result.longitude)
+            added += 1
+    with _stats_lock:
+        _stats["updates"] += 1
+        _stats["rows_added"] += added
+        _stats["rows_removed"] += dropped
+        _stats["total_seconds"] += time.perf_counter() - started
+    return matrix
+
+
+def annotate_travel_times(schedule, matrix: TravelTimeMatrix, mode: str = "auto"):
+    """Add travel_minutes from the previous active activity to each entry whose locations are both known"""
+    previous = None
+    for activity in schedule or []:
+        if not isinstance(activity, dict) or activity.get("status") == "cancelled":
+            continue
+        location = activity.get("location")
+        if previous is not None:
+            minutes = matrix.minutes(previous, location, mode)
+            if minutes is not None:
+                activity["travel_minutes"] = minutes
+        previous = location
+    return schedule
+
+
+def travel_time_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_seconds"] = round(stats["total_seconds"] / stats["updates"], 6) if stats["updates"] else 0.0
+    stats["total_seconds"] = round(stats["total_seconds"], 6)
+    stats["mode"] = DEFAULT_MODE
+    return stats
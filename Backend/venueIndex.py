@@ -0,0 +1,210 @@
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from geocodeCache import geocode_cache, normalize_location_key
+from geocodeTypes import GeocodeResult, GeoPoint, haversine_km
+
+load_dotenv()
+
+# Grid cell size in degrees of latitude and longitude; 0.05 is about 5.5 km north-south
+DEFAULT_CELL_DEGREES = 0.05
+KM_PER_DEGREE = 111.195
+
+# "12.9716, 77.5946" typed in place of a place name
+_COORDINATES_RE = re.compile(r"^\s*(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*$")
+
+
+def parse_coordinates(text) -> Optional[GeoPoint]:
+    """A GeoPoint if text is a "latitude, longitude" pair, otherwise None"""
+    match = _COORDINATES_RE.match(str(text or ""))
+    if not match:
+        return None
+    latitude, longitude = float(match.group(1)), float(match.group(2))
+    if abs(latitude) > 90 or abs(longitude) > 180:
+        return None
+    return GeoPoint(latitude, longitude)
+
+
+class Venue:
+    """A geocoded place known to the index"""
+
+    __slots__ = ("key", "name", "address", "latitude", "longitude", "cell")
+
+    def __init__(self, key: str, name: str, address: Optional[str], latitude: float, longitude: float, cell):
+        self.key = key
+        self.name = name
+        self.address = address
+        self.latitude = latitude
+        self.longitude = longitude
+        self.cell = cell
+
+    def to_dict(self, distance_km: Optional[float] = None) -> Dict[str, Any]:
+        venue = {
+            "name": self.name,
+            "address": self.address,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+        }
+        if distance_km is not None:
+            venue["distance_km"] = round(distance_km, 2)
+        return venue
+
+
+class VenueIndex:
+    """
+    Fixed-size latitude/longitude grid over every place the service has geocoded.
+
+    A radius query only measures venues in the cells overlapping the circle's
+    bounding box, so it stays fast however many places have been seen. Column
+    numbers wrap around the antimeridian, so a search near ±180° longitude also
+    finds venues on the other side of it. The index fills itself from the geocode
+    cache on first use and then follows cache writes.
+    """
+
+    def __init__(self, cache=None, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        # Columns around the globe; 180° and -180° fall in the same one
+        self._columns = math.ceil(360 / cell_degrees)
+        self._cache = cache
+        self._loaded = cache is None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # (row, column) -> {key: Venue}
+        self._cells = {}
+        # key -> Venue
+        self._venues = {}
+        self._counters = {"queries": 0, "total_seconds": 0.0, "max_seconds": 0.0, "candidates_measured": 0}
+        if cache is not None:
+            cache.add_listener(self.add_result)
+
+    def _cell(self, latitude: float, longitude: float):
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees) % self._columns)
+
+    def add(self, name: str, latitude: float, longitude: float, address: Optional[str] = None) -> None:
+        """Insert or move a venue"""
+        key = normalize_location_key(name)
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            self._discard(key)
+            venue = Venue(key, name, address, latitude, longitude, cell)
+            self._venues[key] = venue
+            self._cells.setdefault(cell, {})[key] = venue
+
+    def add_result(self, result: GeocodeResult) -> None:
+        """Index a geocoding result if it found coordinates"""
+        if result.ok:
+            self.add(result.query, result.latitude, result.longitude, result.address)
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            self._discard(normalize_location_key(name))
+
+    def within(self, latitude: float, longitude: float, radius_km: float,
+               limit: Optional[int] = None, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Venues within radius_km of a point, nearest first.
+
+        Args:
+            latitude, longitude: Centre of the search in decimal degrees
+            radius_km: Search radius in kilometres
+            limit: Return at most this many venues
+            exclude: Name of a place to leave out, usually the one being searched around
+
+        Returns:
+            Venue dicts with a distance_km field
+        """
+        self._ensure_loaded()
+        started = time.perf_counter()
+        radius_km = max(float(radius_km), 0.0)
+        excluded_key = normalize_location_key(exclude) if exclude else None
+
+        # Cells overlapping the circle's bounding box; longitude degrees shrink towards the poles
+        row, column = self._cell(latitude, longitude)
+        rows = math.ceil(radius_km / KM_PER_DEGREE / self.cell_degrees)
+        longitude_km = KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6)
+        columns = min(math.ceil(radius_km / longitude_km / self.cell_degrees), self._columns // 2)
+
+        found = []
+        measured = 0
+        with self._lock:
+            # Very large radii cover more grid cells than are populated; walk the populated ones instead
+            if (2 * rows + 1) * (2 * columns + 1) > len(self._cells):
+                cells = [cell for (cell_row, cell_column), cell in self._cells.items()
+                         if abs(cell_row - row) <= rows and self._column_distance(cell_column, column) <= columns]
+            else:
+                # A set, so a span covering the whole globe visits each column once
+                column_span = {cell_column % self._columns for cell_column in range(column - columns, column + columns + 1)}
+                cells = [self._cells.get((cell_row, cell_column))
+                         for cell_row in range(row - rows, row + rows + 1)
+                         for cell_column in column_span]
+            for cell in cells:
+                if not cell:
+                    continue
+                for venue in cell.values():
+                    measured += 1
+                    if venue.key == excluded_key:
+                        continue
+                    distance = haversine_km(latitude, longitude, venue.latitude, venue.longitude)
+                    if distance <= radius_km:
+                        found.append((distance, venue))
+
+            found.sort(key=lambda item: item[0])
+            if limit is not None:
+                found = found[:limit]
+
+            elapsed = time.perf_counter() - started
+            self._counters["queries"] += 1
+            self._counters["total_seconds"] += elapsed
+            self._counters["max_seconds"] = max(self._counters["max_seconds"], elapsed)
+            self._counters["candidates_measured"] += measured
+
+        return [venue.to_dict(distance) for distance, venue in found]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["venues"] = len(self._venues)
+            stats["cells"] = len(self._cells)
+        queries = stats["queries"]
+        stats["avg_seconds"] = round(stats["total_seconds"] / queries, 6) if queries else 0.0
+        stats["total_seconds"] = round(stats["total_seconds"], 6)
+        stats["max_seconds"] = round(stats["max_seconds"], 6)
+        stats["cell_degrees"] = self.cell_degrees
+        return stats
+
+    def _column_distance(self, a: int, b: int) -> int:
+        """Columns between a and b, the short way around the globe"""
+        distance = abs(a - b) % self._columns
+        return min(distance, self._columns - distance)
+
+    def _ensure_loaded(self) -> None:
+        """Index everything already in the geocode cache, once"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for result in self._cache.positive_results():
+                self.add_result(result)
+            self._loaded = True
+
+    def _discard(self, key) -> None:
+        """Remove a venue from its cell (lock held)"""
+        venue = self._venues.pop(key, None)
+        if venue is None:
+            return
+        cell = self._cells.get(venue.cell)
+        if cell is not None:
+            cell.pop(key, None)
+            if not cell:
+                del self._cells[venue.cell]
+
+
+# Follows the shared geocode cache, so both apps see every place either of them resolved
+venue_index = VenueIndex(geocode_cache, float(os.getenv("VENUE_INDEX_CELL_DEGREES", DEFAULT_CELL_DEGREES)))